@@ -1,5 +1,8 @@
 from ..Objects.objects import Products, Assemblies, Building, Relations, LCAh
-from ..utils.helper import yearsRemain, randomChoiceArray, mc_por_impact
+from ..Objects.model import ModelScoped
+from ..Objects.impacts import ImpactStore, ATTRIBUTES, RESULT_SCALAR_MODULES, RESULT_ARRAY_MODULES, aggregate, touch, reset_totals
+from .kernels import ActivityTable, draw_picks, stack, linear_stage, add_stage, zero_stage
+from ..utils.helper import yearsRemain, seed_sequence, child_seed
 import logging
 import numpy as np
 import copy
@@ -16,12 +19,19 @@ EOL_YEARS_REMAIN_CONST = 0.25 # 25% of the product's life is left when it reache
 REPLACEMENT_BUFFER_FACTOR = 0.9 # 10% of the building's life is left when it is replaced
 AMOUNT_MC_SIM = 100 # 
 
-class Analysis:
+class Analysis(metaclass=ModelScoped):
+    # result stores of the products and assemblies, see Objects/impacts.py, kept per model
+    model_attributes = ("product_store", "assembly_store")
+    product_store: ImpactStore = None
+    assembly_store: ImpactStore = None
+
     def reset():
         Products.delete_all_instances()
         Assemblies.delete_all_instances()
         Building.delete_all_instances()
         Relations.delete_all_instances()
+        Analysis.product_store = None
+        Analysis.assembly_store = None
     print("resetting all objects")
 
     @classmethod
@@ -39,7 +49,9 @@ class Analysis:
                        default_rel: float = 1, mf_mcs: int = 100,
                         constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362),
                         assembly_list = None, mode_assembly = None,
-                        tl_mode: str = None):
+                        tl_mode: str = None, seed=None):
+        '''seed can be None, an int, a SeedSequence or a numpy Generator, every random stage gets its own child stream of it'''
+        seed = seed_sequence(seed)
         if reset_objects:
             Analysis.reset()
             Analysis.generate_objects(
@@ -50,13 +62,13 @@ class Analysis:
         Products.connect_to_assembly()
         if update_connection:
             Relations.update_connections_to_relations_objects(
-                filename=filename, mode=mode, assembly=assemblyMC)
+                filename=filename, mode=mode, assembly=assemblyMC, seed=child_seed(seed, "relations"))
         if export_excel:
             Relations.output_relations_dataframe_to_excel(
                 df=Relations.relations_dataframe(), filename=filename, write_output=True)
         if mode_assembly is not None:
             Products.connect_products_to_relations()
-            Relations.mc_for_assemblies(assemblies=assembly_list, mode=mode_assembly)
+            Relations.mc_for_assemblies(assemblies=assembly_list, mode=mode_assembly, seed=child_seed(seed, "assemblies"))
         if mode_assembly is None:
             Products.connect_products_to_relations()
         Products.add_replacement_cycles()
@@ -68,292 +80,151 @@ class Analysis:
         Products.detachment_analysis()
         Products.generate_rpc()
         Products.update_years_of_replacements_based_on_detachability()
-        Products.material_flow_and_replacements(mf_mcs=mf_mcs, constants=constants)
+        Products.material_flow_and_replacements(mf_mcs=mf_mcs, constants=constants, seed=child_seed(seed, "reuse"))
         Assemblies.generate_rpc()
         Building.generate_rpc()
 
-    def add_a1a3_a4(mc_pick: int = 50):
-        '''this will generate a1a3 and a4 impacts for each product'''
+    def add_a1a3_a4(mc_pick: int = 50, seed=None):
+        '''this will generate a1a3 and a4 impacts for each product, seed gives every product its own stream for picking the MC iterations'''
+        seed = seed_sequence(seed)
         if len(Products.instances) == 0:
             raise Exception("No products have been generated")
         if len(LCAh.instances) == 0:
             raise Exception("No LCAh instances have been generated")
-        for product in Products.instances:
-            # find the a1a3 activity
-            a1a3_Act = LCAh.instances[0].activityLib.get(f"{product.id}")
-            if a1a3_Act is None:
-                logging.error(
-                    f"Could not find a1a3 activity for {product.id}")
-                continue
-            # look up the a1a3 activity in the impact library
-            impacts_a1a3_arr = LCAh.instances[0].lcaLib.get(str(a1a3_Act))
-            impactsMC_a1a3 = LCAh.instances[0].mclcaLib.get(str(a1a3_Act))
-            impactsMC_a1a3 = randomChoiceArray(impactsMC_a1a3, mc_pick)
-            # multiply the impact by the amount of the product
-            product.impacts_a1a3 = np.multiply(
-                impacts_a1a3_arr, (product.total_starting_amount*(1-product.recycled_content)))
-            product.impactsMC_a1a3 = np.multiply(
-                impactsMC_a1a3, (product.total_starting_amount*(1-product.recycled_content)))
-            # find the a4 activity
-            a4_Act = LCAh.instances[0].activityLib.get(f"{product.id}_a4")
-            if a4_Act is None:
-                logging.error(
-                    f"Could not find a4 activity for {product.id}")
-                continue
-            # look up the a4 activity in the impact library
-            impacts_a4_arr = LCAh.instances[0].lcaLib.get(str(a4_Act))
-            impactsMC_a4 = LCAh.instances[0].mclcaLib.get(str(a4_Act))
-            impactsMC_a4 = randomChoiceArray(impactsMC_a4, mc_pick)
-            # multiply the impact by the amount of the product
-            product.impacts_a4 = np.multiply(
-                impacts_a4_arr, product.total_starting_amount)
-            product.impactsMC_a4 = np.multiply(
-                impactsMC_a4, product.total_starting_amount)
+        store = Analysis.results_store(mc_pick)
+        products = store.objects
+        table = ActivityTable.of(LCAh.instances[0])
+        # find the a1a3 and a4 activities, a4 is only looked at for products that have a1a3
+        a1a3_act, a1a3_found = table.lookup(
+            products, lambda product: f"{product.id}", "Could not find a1a3 activity for {product.id}")
+        a4_act, a4_found = table.lookup(
+            products, lambda product: f"{product.id}_a4", "Could not find a4 activity for {product.id}", within=a1a3_found)
+        a1a3_picks, a4_picks = draw_picks(seed, products, [a1a3_found, a4_found], table.n_iterations, mc_pick)
+        amount = stack(products, "total_starting_amount", a1a3_found)
+        recycled_content = stack(products, "recycled_content", a1a3_found)
+        # multiply the impact by the amount of the product
+        impacts_a1a3, impactsMC_a1a3 = table.gather(a1a3_act, a1a3_picks)
+        linear_stage(store.module_views("a1a3"), impacts_a1a3, impactsMC_a1a3,
+                     amount*(1-recycled_content), None, a1a3_found)
+        impacts_a4, impactsMC_a4 = table.gather(a4_act, a4_picks)
+        linear_stage(store.module_views("a4"), impacts_a4, impactsMC_a4, amount, None, a4_found)
         print("a1a3 and a4 added!")
 
-    def add_b4(use_updated=False, mc_pick: int = 50, mf_mcs: int = 100):
+    def add_b4(use_updated=False, mc_pick: int = 50, mf_mcs: int = 100, seed=None):
         '''this will generate the b4 impacts for each product'''
-
-        for product in Products.instances:
-            # if the product has number_of_reuse = 0 and number_of_replacements = 0, and number_of_replacements_updated = 0, then skip
-            if product.number_of_reuses == 0 and product.number_of_replacements == 0 and product.number_of_replacements_updated == 0:
-                # set impacts b4 to 0
-                product.impacts_b4 = np.zeros(
-                    len(LCAh.instances[0].get_list_of_methods))
-                # an array with zeros with (1,len methods,50) shape
-                product.impactsMC_b4 = np.zeros(
-                    (1, len(LCAh.instances[0].get_list_of_methods), mc_pick))
-                # set the impacts_b4_array and impactsMC_b4_array to zeros taking into account the const MC_sim number
-                product.impacts_b4_array = np.zeros(
-                    (mf_mcs, len(LCAh.instances[0].get_list_of_methods)))
-                product.impactsMC_b4_array = np.zeros(
-                    (mf_mcs, len(LCAh.instances[0].get_list_of_methods),mc_pick)
-)
-                continue
-                # use the updated replacement years if use_updated is true
-            else:
-                if use_updated:
-                    amount = product.replaced_amount_updated
-                else:
-                    amount = product.replaced_amount
-                amount_array = product.replaced_amount_updated_array
-                # find the material impacts activity
-                material_Act = LCAh.instances[0].activityLib.get(f"{product.id}")
-                if material_Act is None:
-                    logging.error(
-                        f"Could not find material b4 activity for {product.id}")
-                    continue
-                # look up the material impacts activity in the impact library
-                impacts_material_arr = LCAh.instances[0].lcaLib.get(
-                    str(material_Act))
-                impactsMC_material = LCAh.instances[0].mclcaLib.get(
-                    str(material_Act))
-                impactsMC_material = randomChoiceArray(impactsMC_material, mc_pick)
-                # multiply the impact by the amount of the product
-                product.impacts_b4_materials = np.multiply(
-                    impacts_material_arr, (amount*(1-product.recycled_content)))
-                product.impactsMC_b4_materials = np.multiply(
-                    impactsMC_material, amount*(1-product.recycled_content))
-                
-                # get the b4 impacts for the array of amount
-                impacts_material_arr_reshaped = impacts_material_arr.reshape(1, -1)
-                product.impacts_b4_materials_array = np.multiply(
-                    impacts_material_arr_reshaped, (amount_array.reshape(-1,1)*(1-product.recycled_content)))
-                product.impactsMC_b4_materials_array = np.multiply(
-                    impactsMC_material, (amount_array.reshape(-1, 1, 1)*(1-product.recycled_content)))
-                # find the transport impacts activity
-                transport_Act = LCAh.instances[0].activityLib.get(
-                    f"{product.id}_a4")
-                if transport_Act is None:
-                    logging.error(
-                        f"Could not find transport b4 activity for {product.id}")
-                    continue
-                # look up the transport impacts activity in the impact library
-                impacts_transport_arr = LCAh.instances[0].lcaLib.get(
-                    str(transport_Act))
-                impactsMC_transport = LCAh.instances[0].mclcaLib.get(
-                    str(transport_Act))
-                impactsMC_transport = randomChoiceArray(impactsMC_transport, mc_pick)
-                # multiply the impact by the amount of the product
-                product.impacts_b4_transport = np.multiply(
-                    impacts_transport_arr, amount)
-                product.impactsMC_b4_transport = np.multiply(
-                    impactsMC_transport, amount)
-                # get the b4 impacts for the array of amount
-                impacts_transport_arr_reshaped = impacts_transport_arr.reshape(1,-1)
-                product.impacts_b4_transport_array = np.multiply(
-                    impacts_transport_arr_reshaped, amount_array.reshape(-1,1))
-                product.impactsMC_b4_transport_array = np.multiply(
-                    impactsMC_transport, amount_array.reshape(-1, 1, 1))
-                # add the material and transport impacts
-                product.impacts_b4 = np.add(
-                    product.impacts_b4_materials, product.impacts_b4_transport)
-                product.impactsMC_b4 = np.add(
-                    product.impactsMC_b4_materials, product.impactsMC_b4_transport)
-                # add the material and transport impacts for the array of amount
-                product.impacts_b4_array = np.add(
-                    product.impacts_b4_materials_array, product.impacts_b4_transport_array)
-                product.impactsMC_b4_array = np.add(
-                    product.impactsMC_b4_materials_array, product.impactsMC_b4_transport_array)
+        seed = seed_sequence(seed)
+        store = Analysis.results_store(mc_pick, mf_mcs)
+        products = store.objects
+        table = ActivityTable.of(LCAh.instances[0])
+        # products without reuses and replacements have no b4 impacts
+        replaced = np.array([not (product.number_of_reuses == 0 and product.number_of_replacements == 0 and product.number_of_replacements_updated == 0)
+                             for product in products], dtype=bool)
+        zero_stage(store.module_views("b4"), ~replaced)
+        # find the material and transport impacts activities
+        material_act, material_found = table.lookup(
+            products, lambda product: f"{product.id}", "Could not find material b4 activity for {product.id}", within=replaced)
+        transport_act, transport_found = table.lookup(
+            products, lambda product: f"{product.id}_a4", "Could not find transport b4 activity for {product.id}", within=material_found)
+        material_picks, transport_picks = draw_picks(
+            seed, products, [material_found, transport_found], table.n_iterations, mc_pick)
+        # use the updated replacement years if use_updated is true
+        amount = stack(products, "replaced_amount_updated" if use_updated else "replaced_amount", material_found)
+        amount_array = stack(products, "replaced_amount_updated_array", material_found, store.mf_mcs)
+        recycled_content = stack(products, "recycled_content", material_found)
+        # multiply the impact by the amount of the product, for the amount and the array of amounts
+        impacts_material, impactsMC_material = table.gather(material_act, material_picks)
+        linear_stage(store.module_views("b4_materials"), impacts_material, impactsMC_material,
+                     amount*(1-recycled_content), amount_array*(1-recycled_content)[:, None], material_found)
+        impacts_transport, impactsMC_transport = table.gather(transport_act, transport_picks)
+        linear_stage(store.module_views("b4_transport"), impacts_transport, impactsMC_transport,
+                     amount, amount_array, transport_found)
+        # add the material and transport impacts
+        add_stage(store.module_views("b4"), store.module_views("b4_materials"),
+                  store.module_views("b4_transport"), transport_found)
         print("B4 added!")
 
-    def add_c2(use_updated=False, mc_pick: int = 50):
+    def add_c2(use_updated=False, mc_pick: int = 50, seed=None):
         '''this will generate the c2 impacts for each product assuming that everything is transported at the end of life'''
+        seed = seed_sequence(seed)
+        store = Analysis.results_store(mc_pick)
+        products = store.objects
+        table = ActivityTable.of(LCAh.instances[0])
+        # find the c2 activity
+        c2_act, found = table.lookup(
+            products, lambda product: "c2_transport", "Could not find c2 activity for {product.id}")
+        (c2_picks,) = draw_picks(seed, products, [found], table.n_iterations, mc_pick)
         # use the updated replacement years if use_updated is true
-        for product in Products.instances:
-            if use_updated:
-                amount = product.total_amount_with_replacements_updated
-            else:
-                amount = product.total_amount_with_replacements
-            # find the c2 activity
-            c2_Act = LCAh.instances[0].activityLib.get("c2_transport")
-            if c2_Act is None:
-                logging.error(
-                    f"Could not find c2 activity for {product.id}")
-                continue
-            amount_array = product.total_amount_with_replacements_array_updated
-            # look up the c2 activity in the impact library
-            impacts_c2_arr = LCAh.instances[0].lcaLib.get(str(c2_Act))
-            impactsMC_c2 = LCAh.instances[0].mclcaLib.get(str(c2_Act))
-            impactsMC_c2 = randomChoiceArray(impactsMC_c2, mc_pick)
-            # multiply the impact by the amount of the product
-            product.impacts_c2 = np.multiply(
-                impacts_c2_arr, ((amount*product.eol_transport_distance)/1000))
-            product.impactsMC_c2 = np.multiply(
-                impactsMC_c2, ((amount*product.eol_transport_distance)/1000))
-            # get the c2 impacts for the array of amount
-            impacts_c2_arr_reshaped = impacts_c2_arr.reshape(1, -1)
-            product.impacts_c2_array = np.multiply(
-                impacts_c2_arr_reshaped, ((amount_array.reshape(-1,1)*product.eol_transport_distance)/1000))
-            product.impactsMC_c2_array = np.multiply(
-                impactsMC_c2, ((amount_array.reshape(-1,1,1)*product.eol_transport_distance)/1000))
+        amount = stack(products, "total_amount_with_replacements_updated" if use_updated else "total_amount_with_replacements", found)
+        amount_array = stack(products, "total_amount_with_replacements_array_updated", found, store.mf_mcs)
+        distance = stack(products, "eol_transport_distance", found)
+        # multiply the impact by the amount of the product and the distance in km
+        impacts_c2, impactsMC_c2 = table.gather(c2_act, c2_picks)
+        linear_stage(store.module_views("c2"), impacts_c2, impactsMC_c2,
+                     (amount*distance)/1000, (amount_array*distance[:, None])/1000, found)
         print("C2 added!")
 
-    def add_c3(use_updated=False, mc_pick: int = 50):
+    def add_c3(use_updated=False, mc_pick: int = 50, seed=None):
         '''this will generate the c3 impacts for each product assuming that everything is sorted at the end of life'''
-        for product in Products.instances:
-            # set the biogenic content to 0
-            biogenic_content = 0
-            # use the updated replacement years if use_updated is true
-            if use_updated:
-                amount = product.total_amount_with_replacements_updated
-                number_of_replacements = product.number_of_replacements_updated
-            else:
-                amount = product.total_amount_with_replacements
-                number_of_replacements = product.number_of_replacements
-            amount_array = product.total_amount_with_replacements_array_updated
-
-            # find the c3 activity
-            c3_Act = LCAh.instances[0].activityLib.get(f"{product.id}_c3")
-            if c3_Act is None:
-                logging.error(
-                    f"Could not find c3 activity for {product.id}")
-                continue
-            # look up the c3 activity in the impact library
-            impacts_c3_arr = LCAh.instances[0].lcaLib.get(str(c3_Act))
-            impactsMC_c3 = LCAh.instances[0].mclcaLib.get(str(c3_Act))
-            impactsMC_c3 = randomChoiceArray(impactsMC_c3, mc_pick)
-            # multiply the impact by the amount of the product
-            product.impacts_c3 = np.multiply(impacts_c3_arr, amount)
-            product.impactsMC_c3 = np.multiply(impactsMC_c3, amount)
-            # get the c3 impacts for the array of amount
-            impacts_c3_arr_reshaped = impacts_c3_arr.reshape(1, -1)
-            product.impacts_c3_array = np.multiply(
-                impacts_c3_arr_reshaped, amount_array.reshape(-1,1))
-            product.impactsMC_c3_array = np.multiply(
-                impactsMC_c3, amount_array.reshape(-1,1,1))
-
-            # DO THIS FOR THE ARRAY OF AMOUNT
-            # DO THIS FOR THE ARRAY OF AMOUNT
-            # DO THIS FOR THE ARRAY OF AMOUNT
-            # DO THIS FOR THE ARRAY OF AMOUNT
-            # DO THIS FOR THE ARRAY OF AMOUNT
-            
-            # get the biogenic content of the product at a1a3 multiplied by the number of replacements + 1 (i.e. the number of total placements)
-            biogenic_content = product.impacts_a1a3[2] * \
-                (number_of_replacements+1)
-            biogenic_contentMC = np.multiply(
-                product.impactsMC_a1a3[0][2], number_of_replacements)
-            # if the product contained biogenic carbon at a1a3 then add it to the impacts
-            if biogenic_content > 0:
-                continue
-            else:
-                product.impacts_c3[1] = np.subtract(
-                    product.impacts_c3[1], biogenic_content)
-                product.impacts_c3[2] = np.subtract(
-                    product.impacts_c3[2], biogenic_content)
-                product.impactsMC_c3[0][1] = np.subtract(
-                    product.impactsMC_c3[0][1], biogenic_contentMC)
-                product.impactsMC_c3[0][2] = np.subtract(
-                    product.impactsMC_c3[0][2], biogenic_contentMC)
+        seed = seed_sequence(seed)
+        store = Analysis.results_store(mc_pick)
+        products = store.objects
+        table = ActivityTable.of(LCAh.instances[0])
+        # find the c3 activity
+        c3_act, found = table.lookup(
+            products, lambda product: f"{product.id}_c3", "Could not find c3 activity for {product.id}")
+        (c3_picks,) = draw_picks(seed, products, [found], table.n_iterations, mc_pick)
+        # use the updated replacement years if use_updated is true
+        if use_updated:
+            amount = stack(products, "total_amount_with_replacements_updated", found)
+            number_of_replacements = stack(products, "number_of_replacements_updated", found)
+        else:
+            amount = stack(products, "total_amount_with_replacements", found)
+            number_of_replacements = stack(products, "number_of_replacements", found)
+        amount_array = stack(products, "total_amount_with_replacements_array_updated", found, store.mf_mcs)
+        # multiply the impact by the amount of the product
+        c3 = store.module_views("c3")
+        impacts_c3, impactsMC_c3 = table.gather(c3_act, c3_picks)
+        linear_stage(c3, impacts_c3, impactsMC_c3, amount, amount_array, found)
+
+        # get the biogenic content of the product at a1a3 multiplied by the number of replacements + 1 (i.e. the number of total placements)
+        a1a3 = store.module_views("a1a3")
+        biogenic_content = a1a3["impacts"][:, 2] * (number_of_replacements+1)
+        biogenic_contentMC = a1a3["impactsMC"][:, 0, 2] * number_of_replacements[:, None]
+        # if the product contained biogenic carbon at a1a3 then add it to the impacts
+        subtract = found & ~(biogenic_content > 0)
+        for category in (1, 2):
+            c3["impacts"][subtract, category] -= biogenic_content[subtract]
+            c3["impactsMC"][subtract, 0, category] -= biogenic_contentMC[subtract]
         print("C3 added!")
 
-    def add_c4(use_updated=False, mc_pick: int = 50):
+    def add_c4(use_updated=False, mc_pick: int = 50, seed=None):
         '''this will generate the c4 impacts for each product assuming that everything is landfilled at the end of life'''
-        # loop through all the products
-        for product in Products.instances:
-            # use the updated replacement years if use_updated is true
-            if use_updated:
-                amount = product.total_amount_with_replacements_updated
-            else:
-                amount = product.total_amount_with_replacements
-            amount_array = product.total_amount_with_replacements_array_updated
-            # find the c4 activity
-            c4_landfill_Act = LCAh.instances[0].activityLib.get(
-                f"{product.id}_c4")
-            c4_incineration_Act = LCAh.instances[0].activityLib.get(
-                f"{product.id}_Incineration")
-            if c4_landfill_Act is None:
-                logging.error(
-                    f"Could not find c4 activity for {product.id}")
-                continue
-            if c4_incineration_Act is None:
-                logging.error(
-                    f"Could not find c4 activity for {product.id}")
-                continue
-            # look up the c4 activity landfill in the impact library
-            impacts_c4_arr_landfill = LCAh.instances[0].lcaLib.get(
-                str(c4_landfill_Act))
-            impactsMC_c4_landfill = LCAh.instances[0].mclcaLib.get(
-                str(c4_landfill_Act))
-            impactsMC_c4_landfill = randomChoiceArray(
-                impactsMC_c4_landfill, mc_pick)
-            # look up the c4 activity incineration in the impact library
-            impacts_c4_arr_incineration = LCAh.instances[0].lcaLib.get(
-                str(c4_incineration_Act))
-            impactsMC_c4_incineration = LCAh.instances[0].mclcaLib.get(
-                str(c4_incineration_Act))
-            impactsMC_c4_incineration = randomChoiceArray(
-                impactsMC_c4_incineration, mc_pick)
-            # multiply the impact by the amount of the product and multiply by -1 to make it positive
-            product.impacts_c4_landfill = np.multiply(
-                impacts_c4_arr_landfill, amount * -1)
-            product.impactsMC_c4_landfill = np.multiply(
-                impactsMC_c4_landfill, amount * -1)
-            # multiply the impact by the amount of the product and multiply by -1 to make it positive
-            product.impacts_c4_incineration = np.multiply(
-                impacts_c4_arr_incineration, amount * -1)
-            product.impactsMC_c4_incineration = np.multiply(
-                impactsMC_c4_incineration, amount * -1)
-            # get the c4 impacts for the array of amount
-            impacts_c4_landfill_arr_reshaped = impacts_c4_arr_landfill.reshape(1, -1)
-            product.impacts_c4_array_landfill = np.multiply(
-                impacts_c4_landfill_arr_reshaped, amount_array.reshape(-1,1) * -1)
-            product.impactsMC_c4_array_landfill = np.multiply(
-                impactsMC_c4_landfill, amount_array.reshape(-1,1,1) * -1)
-            # get the incineration impacts for the array of amount
-            impacts_c4_incineration_arr_reshaped = impacts_c4_arr_incineration.reshape(1, -1)
-            product.impacts_c4_array_incineration = np.multiply(
-                impacts_c4_incineration_arr_reshaped, amount_array.reshape(-1,1) * -1)
-            product.impactsMC_c4_array_incineration = np.multiply(
-                impactsMC_c4_incineration, amount_array.reshape(-1,1,1) * -1)
-
+        seed = seed_sequence(seed)
+        store = Analysis.results_store(mc_pick)
+        products = store.objects
+        table = ActivityTable.of(LCAh.instances[0])
+        # find the c4 activities, a product needs both landfill and incineration
+        landfill_act, found = table.lookup(
+            products, lambda product: f"{product.id}_c4", "Could not find c4 activity for {product.id}")
+        incineration_act, found = table.lookup(
+            products, lambda product: f"{product.id}_Incineration", "Could not find c4 activity for {product.id}", within=found)
+        landfill_picks, incineration_picks = draw_picks(seed, products, [found, found], table.n_iterations, mc_pick)
+        # use the updated replacement years if use_updated is true
+        amount = stack(products, "total_amount_with_replacements_updated" if use_updated else "total_amount_with_replacements", found)
+        amount_array = stack(products, "total_amount_with_replacements_array_updated", found, store.mf_mcs)
+        # multiply the impact by the amount of the product and multiply by -1 to make it positive
+        impacts_landfill, impactsMC_landfill = table.gather(landfill_act, landfill_picks)
+        linear_stage(store.module_views("c4_landfill"), impacts_landfill, impactsMC_landfill,
+                     amount * -1, amount_array * -1, found)
+        impacts_incineration, impactsMC_incineration = table.gather(incineration_act, incineration_picks)
+        linear_stage(store.module_views("c4_incineration"), impacts_incineration, impactsMC_incineration,
+                     amount * -1, amount_array * -1, found)
         print("C4 added!")
 
     def add_d1(use_updated: bool = False):
         '''this will generate the d1 impacts for each product assuming that everything is reused 100% at the end of life'''
         # loop through all the products
-        for product in Products.instances:
+        for product in Analysis.stage_products():
             # find the d1 activity
             impacts_a1a3 = product.impacts_a1a3.copy()
             if impacts_a1a3[1] < 0:
@@ -362,125 +233,184 @@ class Analysis:
                 impacts_a1a3[2] = impacts_a1a3[2] * -1
                 product.impactsMC_c3[0][1] = product.impactsMC_c3[0][1] * -1
                 product.impactsMC_c3[0][2] = product.impactsMC_c3[0][2] * -1
+                touch(product, "c3")
             # multiply the impact by -1 to make it negative
             product.impacts_d1 = np.multiply(impacts_a1a3, -1)
             product.impactsMC_d1 = np.multiply(
                 product.impactsMC_a1a3, -1)
         print("D1 added!")
 
-    def add_d2(use_updated: bool = False, mc_pick: int = 50):
+    def add_d2(use_updated: bool = False, mc_pick: int = 50, seed=None):
         '''this will generate the d2 impacts for each product assuming that everything is recycled 100% at the end of life'''
-        # loop through all the products
-        for product in Products.instances:
-            # use the updated replacement years if use_updated is true
-            if use_updated:
-                amount = product.total_amount_with_replacements_updated
-                
-            else:
-                amount = product.total_amount_with_replacements
-            amount_array = product.total_amount_with_replacements_array_updated
-            # find the d2 activity
-            d2_rep_Act = LCAh.instances[0].activityLib.get(
-                f"{product.id}_d2_rep")
-            if d2_rep_Act is None:
-                logging.error(
-                    f"Could not find d2 replacement activity for {product.id}")
-                continue
-            # look up the d2 replacement activity in the impact library
-            impacts_d2_rep_arr = LCAh.instances[0].lcaLib.get(str(d2_rep_Act))
-            impactsMC_d2_rep = LCAh.instances[0].mclcaLib.get(str(d2_rep_Act))
-            impactsMC_d2_rep = randomChoiceArray(impactsMC_d2_rep, mc_pick)
-            # multiply the impact by the amount of the product and multiply by -1 to make it negative
-            product.impacts_d2_rep = np.multiply(
-                impacts_d2_rep_arr, amount * -1)
-            product.impactsMC_d2_rep = np.multiply(
-                impactsMC_d2_rep, amount * -1)
-            # find the d2 recycling activity
-            d2_rec_Act = LCAh.instances[0].activityLib.get(
-                f"{product.id}_d2_rec")
-            if d2_rec_Act is None:
-                logging.error(
-                    f"Could not find d2 recycling activity for {product.id}")
-                continue
-            # look up the d2 recycling activity in the impact library
-            impacts_d2_rec_arr = LCAh.instances[0].lcaLib.get(str(d2_rec_Act))
-            impactsMC_d2_rec = LCAh.instances[0].mclcaLib.get(str(d2_rec_Act))
-            impactsMC_d2_rec = randomChoiceArray(impactsMC_d2_rec, mc_pick)
-            # multiply the impact by the amount of the product
-            product.impacts_d2_rec = np.multiply(impacts_d2_rec_arr, amount)
-            product.impactsMC_d2_rec = np.multiply(impactsMC_d2_rec, amount)
-            # add the recycling and replacement impacts together this should produce a negative result to make sense only in very specific cases it can be positive
-            impacts_total_arr = np.add(
-                product.impacts_d2_rec, product.impacts_d2_rep)
-            product.impactsMC_d2 = np.add(
-                product.impactsMC_d2_rec, product.impactsMC_d2_rep)
-            product.impacts_d2 = impacts_total_arr
-            # get the d2_rec and d2_rep impacts for the array of amount
-            impacts_d2_rec_arr_reshaped = impacts_d2_rec_arr.reshape(1, -1)
-            impacts_d2_rep_arr_reshaped = impacts_d2_rep_arr.reshape(1, -1)
-            product.impacts_d2_array = np.add(
-                np.multiply(impacts_d2_rec_arr_reshaped, amount_array.reshape(-1,1)), np.multiply(impacts_d2_rep_arr_reshaped, amount_array.reshape(-1,1) * -1))
-            # impactsmc
-            product.impactsMC_d2_array = np.add(
-                np.multiply(impactsMC_d2_rec, amount_array.reshape(-1,1,1)), np.multiply(impactsMC_d2_rep, amount_array.reshape(-1,1,1) * -1))
-
+        seed = seed_sequence(seed)
+        store = Analysis.results_store(mc_pick)
+        products = store.objects
+        table = ActivityTable.of(LCAh.instances[0])
+        # find the d2 replacement and recycling activities
+        rep_act, rep_found = table.lookup(
+            products, lambda product: f"{product.id}_d2_rep", "Could not find d2 replacement activity for {product.id}")
+        rec_act, rec_found = table.lookup(
+            products, lambda product: f"{product.id}_d2_rec", "Could not find d2 recycling activity for {product.id}", within=rep_found)
+        rep_picks, rec_picks = draw_picks(seed, products, [rep_found, rec_found], table.n_iterations, mc_pick)
+        # use the updated replacement years if use_updated is true
+        amount = stack(products, "total_amount_with_replacements_updated" if use_updated else "total_amount_with_replacements", rep_found)
+        amount_array = stack(products, "total_amount_with_replacements_array_updated", rec_found, store.mf_mcs)
+        # multiply the replacement impact by the amount of the product and multiply by -1 to make it negative
+        impacts_rep, impactsMC_rep = table.gather(rep_act, rep_picks)
+        linear_stage(store.module_views("d2_rep"), impacts_rep, impactsMC_rep, amount * -1, None, rep_found)
+        # multiply the recycling impact by the amount of the product
+        impacts_rec, impactsMC_rec = table.gather(rec_act, rec_picks)
+        linear_stage(store.module_views("d2_rec"), impacts_rec, impactsMC_rec, amount, None, rec_found)
+        # add the recycling and replacement impacts together this should produce a negative result to make sense only in very specific cases it can be positive
+        d2 = store.module_views("d2")
+        add_stage(d2, store.module_views("d2_rec"), store.module_views("d2_rep"), rec_found)
+        # for the array of amount the recycled minus the replaced impact per unit is multiplied once
+        linear_stage(d2, impacts_rec - impacts_rep, impactsMC_rec - impactsMC_rep, None, amount_array, rec_found)
         print("D2 added!")
 
-    def add_d3(use_updated: bool = False, mc_pick: int = 50):
+    def add_d3(use_updated: bool = False, mc_pick: int = 50, seed=None):
         '''this will generate the d3 impacts for each product assuming that everything is incinerated 100% at the end of life'''
+        seed = seed_sequence(seed)
+        rng = np.random.default_rng(seed)
+        store = Analysis.results_store(mc_pick)
+        products = store.objects
+        table = ActivityTable.of(LCAh.instances[0])
         # get d3 heat and electricity activities
-        d3_heat_Act = LCAh.instances[0].activityLib.get("d3_elec")
-        d3_elec_Act = LCAh.instances[0].activityLib.get("d3_heat")
-        # get d3 heat and electricity impacts
-        impacts_d3_heat_arr = LCAh.instances[0].lcaLib.get(str(d3_heat_Act))
-        impactsMC_d3_heat = LCAh.instances[0].mclcaLib.get(str(d3_heat_Act))
-        impactsMC_d3_heat = randomChoiceArray(impactsMC_d3_heat, mc_pick)
-        impacts_d3_elec_arr = LCAh.instances[0].lcaLib.get(str(d3_elec_Act))
-        impactsMC_d3_elec = LCAh.instances[0].mclcaLib.get(str(d3_elec_Act))
-        impactsMC_d3_elec = randomChoiceArray(impactsMC_d3_elec, mc_pick)
-        # loop through all the products
-        for product in Products.instances:
-            # use the updated replacement years if use_updated is true
-            if use_updated:
-                amount = product.total_amount_with_replacements_updated
-            else:
-                amount = product.total_amount_with_replacements
-            amount_array = product.total_amount_with_replacements_array_updated
-            #  multiply the heat impact by the amount of the product, the lhv, 0.2 and multiply by -1 to make it negative
-            product.impacts_d3_heat = np.multiply(
-                impacts_d3_heat_arr, amount * -1 * 0.2*product.lhv)
-            product.impactsMC_d3_heat = np.multiply(
-                impactsMC_d3_heat, amount * -1 * 0.2*product.lhv)
-            # multiply the electricity impact by the amount of the product, the lhv, 0.1 and multiply by -1 to make it negative
-            product.impacts_d3_elec = np.multiply(
-                impacts_d3_elec_arr, amount * -1 * 0.1*product.lhv)
-            product.impactsMC_d3_elec = np.multiply(
-                impactsMC_d3_elec, amount * -1 * 0.1*product.lhv)
-            # add the electricity and heat impacts together this should produce a negative
-            impacts_total_arr = np.add(
-                product.impacts_d3_elec, product.impacts_d3_heat)
-            product.impactsMC_d3 = np.add(
-                product.impactsMC_d3_elec, product.impactsMC_d3_heat)
-            product.impacts_d3 = impacts_total_arr
-            # get the d3_elec and d3_heat impacts for the array of amount
-            impacts_d3_elec_arr_reshaped = impacts_d3_elec_arr.reshape(1, -1)
-            impacts_d3_heat_arr_reshaped = impacts_d3_heat_arr.reshape(1, -1)
-            product.impacts_d3_array = np.add(
-                np.multiply(impacts_d3_elec_arr_reshaped, amount_array.reshape(-1,1) * -1 * 0.1*product.lhv), np.multiply(impacts_d3_heat_arr_reshaped, amount_array.reshape(-1,1) * -1 * 0.2*product.lhv))
-            # impactsmc
-            product.impactsMC_d3_array = np.add(
-                np.multiply(impactsMC_d3_elec, amount_array.reshape(-1,1,1) * -1 * 0.1*product.lhv), np.multiply(impactsMC_d3_heat, amount_array.reshape(-1,1,1) * -1 * 0.2*product.lhv))
+        d3_heat_act = table.activity("d3_elec")
+        d3_elec_act = table.activity("d3_heat")
+        if d3_heat_act is None or d3_elec_act is None:
+            logging.error("Could not find the d3 heat and electricity activities")
+            return
+        # get d3 heat and electricity impacts, they are the same for all products
+        impacts_d3_heat = table.impacts[d3_heat_act]
+        impactsMC_d3_heat = table.impactsMC[d3_heat_act][:, rng.choice(table.n_iterations, mc_pick, replace=False)]
+        impacts_d3_elec = table.impacts[d3_elec_act]
+        impactsMC_d3_elec = table.impactsMC[d3_elec_act][:, rng.choice(table.n_iterations, mc_pick, replace=False)]
+        # use the updated replacement years if use_updated is true
+        every_product = np.ones(len(products), dtype=bool)
+        amount = stack(products, "total_amount_with_replacements_updated" if use_updated else "total_amount_with_replacements", every_product)
+        amount_array = stack(products, "total_amount_with_replacements_array_updated", every_product, store.mf_mcs)
+        lhv = stack(products, "lhv", every_product)
+        #  multiply the heat impact by the amount of the product, the lhv, 0.2 and multiply by -1 to make it negative
+        linear_stage(store.module_views("d3_heat"), impacts_d3_heat, impactsMC_d3_heat, amount * -1 * 0.2*lhv, None, every_product)
+        # multiply the electricity impact by the amount of the product, the lhv, 0.1 and multiply by -1 to make it negative
+        linear_stage(store.module_views("d3_elec"), impacts_d3_elec, impactsMC_d3_elec, amount * -1 * 0.1*lhv, None, every_product)
+        # add the electricity and heat impacts together this should produce a negative
+        d3 = store.module_views("d3")
+        add_stage(d3, store.module_views("d3_elec"), store.module_views("d3_heat"), every_product)
+        # for the array of amount the weighted heat and electricity impact per unit is multiplied once
+        linear_stage(d3, 0.1*impacts_d3_elec + 0.2*impacts_d3_heat, 0.1*impactsMC_d3_elec + 0.2*impactsMC_d3_heat,
+                     None, amount_array * -1 * lhv[:, None], every_product)
         print("D3 added!")
 
-    def product_lca(include_circularity: bool = True, mc_simulations: int = 50, mf_mcs: int = 100):
-        Analysis.add_a1a3_a4(mc_pick=mc_simulations)
-        Analysis.add_b4(use_updated=include_circularity, mc_pick=mc_simulations, mf_mcs=mf_mcs)
-        Analysis.add_c2(use_updated=include_circularity, mc_pick=mc_simulations)
-        Analysis.add_c3(use_updated=include_circularity, mc_pick=mc_simulations)
-        Analysis.add_c4(use_updated=include_circularity, mc_pick=mc_simulations)
+    def results_store(mc_pick: int = 50, mf_mcs: int = None) -> ImpactStore:
+        '''the product result store the stages write to, allocated on first use'''
+        store = Analysis.product_store
+        if store is None:
+            if mf_mcs is None:
+                mf_mcs = len(Products.instances[0].total_amount_with_replacements_array_updated)
+            return Analysis.allocate_results(mc_pick=mc_pick, mf_mcs=mf_mcs)
+        if store.mc_pick != mc_pick or (mf_mcs is not None and store.mf_mcs != mf_mcs):
+            raise ValueError(f"the product results were allocated for mc_pick={store.mc_pick} and mf_mcs={store.mf_mcs}, "
+                             f"call Analysis.allocate_results(mc_pick={mc_pick}) first")
+        return store
+
+    def allocate_results(mc_pick: int = 50, mf_mcs: int = 100, products: list = None):
+        '''creates the product result store, the products are laid out assembly by assembly so the
+        assembly results are sums over contiguous slots. Results already set on the products are kept.
+        products limits the store to a chunk of products that is already laid out (see product_chunks)'''
+        if len(LCAh.instances) == 0:
+            raise Exception("No LCAh instances have been generated")
+        n_methods = len(next(iter(LCAh.instances[0].lcaLib.values())))
+        if products is None:
+            products = [product for assembly in Assemblies.instances for product in assembly.products]
+            in_assembly = set(products)
+            products += [product for product in Products.instances if product not in in_assembly]
+        loose = [{attribute: product.__dict__[attribute] for attribute in ATTRIBUTES if attribute in product.__dict__}
+                 for product in products]
+        store = ImpactStore(len(products), mf_mcs, n_methods, mc_pick)
+        store.bind(products)
+        for product, results in zip(products, loose):
+            for attribute, value in results.items():
+                setattr(product, attribute, value)
+        Analysis.product_store = store
+        Analysis.assembly_store = None
+        return store
+
+    def stage_products() -> list:
+        '''the products the stages and scenarios work on, the ones in the result store (a chunk of them when streaming)'''
+        store = Analysis.product_store
+        return Products.instances if store is None else store.objects
+
+    def product_chunks(chunk_size: int = 500):
+        '''splits the products into chunks of whole assemblies with at least chunk_size products (except the last one),
+        yields the assembly positions of the chunk and its products laid out assembly by assembly.
+        Products that are not part of an assembly come in the last chunk'''
+        positions, products = [], []
+        for a, assembly in enumerate(Assemblies.instances):
+            positions.append(a)
+            products += assembly.products
+            if len(products) >= chunk_size:
+                yield positions, products
+                positions, products = [], []
+        in_assembly = set(product for assembly in Assemblies.instances for product in assembly.products)
+        products += [product for product in Products.instances if product not in in_assembly]
+        if positions or products:
+            yield positions, products
+
+    def get_product_store() -> ImpactStore:
+        '''the product result store, products loaded from a save file bring their own, the products of a streamed run
+        with a spill_folder are gathered from their chunk stores into one and products from old save files with loose
+        results get one'''
+        if Analysis.product_store is not None or len(Products.instances) == 0:
+            return Analysis.product_store
+        stores = {id(store): store for store in (product.__dict__.get("_impact_store") for product in Products.instances)}
+        if len(stores) == 1 and None not in stores.values():
+            Analysis.product_store = next(iter(stores.values()))
+            return Analysis.product_store
+        if None not in stores.values():
+            return Analysis.gather_results()
+        if any(product.__dict__.get("_impact_store") is None and "impactsMC_b4_array" not in product.__dict__ for product in Products.instances):
+            raise ValueError("the products have no results, run the product lca first. A streamed run (aggregation='stream') "
+                             "drops them unless it is given a spill_folder")
+        mf_mcs, _, mc_pick = Products.instances[0].impactsMC_b4_array.shape
+        return Analysis.allocate_results(mc_pick=mc_pick, mf_mcs=mf_mcs)
+
+    def gather_results() -> ImpactStore:
+        '''allocates the product result store and copies the results of the stores the products are bound to into it,
+        e.g. the chunk stores of a streamed run'''
+        # the slots of the products in their stores, allocate_results binds them to the new one
+        sources = {}
+        for product in Products.instances:
+            source = product.__dict__["_impact_store"]
+            sources.setdefault(id(source), (source, [], []))
+            sources[id(source)][1].append(product)
+            sources[id(source)][2].append(product.__dict__["_impact_index"])
+        first = next(iter(sources.values()))[0]
+        if any((source.mf_mcs, source.n_methods, source.mc_pick) != (first.mf_mcs, first.n_methods, first.mc_pick) for source, _, _ in sources.values()):
+            raise ValueError("the products are bound to result stores of different shapes")
+        store = Analysis.allocate_results(mc_pick=first.mc_pick, mf_mcs=first.mf_mcs)
+        for source, products, source_slots in sources.values():
+            slots = [product.__dict__["_impact_index"] for product in products]
+            for kind, tensor in store.tensors.items():
+                for m, module in enumerate(tensor.modules):
+                    if module in source.tensors[kind]:
+                        tensor.data[m, slots] = source.tensors[kind].module(module)[source_slots]
+        return store
+
+    def product_lca(include_circularity: bool = True, mc_simulations: int = 50, mf_mcs: int = 100, seed=None, products: list = None):
+        '''seed can be None, an int, a SeedSequence or a numpy Generator, every stage gets its own child stream of it.
+        products runs the stages for a chunk of the products only (see streamed_lca)'''
+        seed = seed_sequence(seed)
+        Analysis.allocate_results(mc_pick=mc_simulations, mf_mcs=mf_mcs, products=products)
+        Analysis.add_a1a3_a4(mc_pick=mc_simulations, seed=child_seed(seed, "a1a3_a4"))
+        Analysis.add_b4(use_updated=include_circularity, mc_pick=mc_simulations, mf_mcs=mf_mcs, seed=child_seed(seed, "b4"))
+        Analysis.add_c2(use_updated=include_circularity, mc_pick=mc_simulations, seed=child_seed(seed, "c2"))
+        Analysis.add_c3(use_updated=include_circularity, mc_pick=mc_simulations, seed=child_seed(seed, "c3"))
+        Analysis.add_c4(use_updated=include_circularity, mc_pick=mc_simulations, seed=child_seed(seed, "c4"))
         Analysis.add_d1(use_updated=include_circularity)
-        Analysis.add_d2(use_updated=include_circularity, mc_pick=mc_simulations)
-        Analysis.add_d3(use_updated=include_circularity, mc_pick=mc_simulations)
+        Analysis.add_d2(use_updated=include_circularity, mc_pick=mc_simulations, seed=child_seed(seed, "d2"))
+        Analysis.add_d3(use_updated=include_circularity, mc_pick=mc_simulations, seed=child_seed(seed, "d3"))
 
     def sen_d_standard():
         '''this will simulate the D benefits assuming all products are recycled or incinerated or landfilled at the end of life'''
@@ -489,7 +419,7 @@ class Analysis:
         its stored in product.impacts_d_standard'''
         if len(Products.instances) == 0:
             raise Exception("No products have been added yet")
-        for product in Products.instances:
+        for product in Analysis.stage_products():
             # copy the needed impacts into a temporary variables
             recycling = None
             incineration = None
@@ -588,10 +518,15 @@ class Analysis:
             product.impactsMC_c4_sen1_array = np.add(
                 impacts_landfillMC_arr, impacts_incinerationMC_arr)
             
-    def sen_d_standard_plus_reuse_plus_rpc(mfa_mcs: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362)):
-        ''' This section is the same as the one above but with the rpc multiplication. Its stored in product.d_rpc'''
+    def sen_d_standard_plus_reuse_plus_rpc(mfa_mcs: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362), seed=None):
+        ''' This section is the same as the one above but with the rpc multiplication. Its stored in product.d_rpc
+        seed is only used if the material flow drew the reuse matrix with other settings, see Products.get_reuse_matrix'''
         # STANDARD + REUSE + RPC
-        for product in Products.instances:
+        # the end of life column of the reuse matrix drawn with the material flow, 1 means not reused
+        reuse_matrix = Products.get_reuse_matrix(mf_mcs=mfa_mcs, constants=constants, seed=seed)
+        rows = {id(product): i for i, product in enumerate(Products.instances)}
+        for product in Analysis.stage_products():
+            not_reused = 1 - reuse_matrix[rows[id(product)], -1]
             # create a copy of the impacts
             temp_d1 = copy.deepcopy(product.impacts_d1)
             temp_d1MC = copy.deepcopy(product.impactsMC_d1)
@@ -616,19 +551,19 @@ class Analysis:
             temp_c4_not_reused = np.multiply(temp_c4, portion_not_reused)
             temp_c4MC_not_reused = np.multiply(temp_c4MC, portion_not_reused)
             # multiply the impacts with the reuse losses
-            deter_temp_d1 = np.multiply(temp_d1, np.median(mc_por_impact(product, mfa_mcs, constants)))
+            deter_temp_d1 = np.multiply(temp_d1, np.median(not_reused))
             # add the recycling benefits of the losses
             deter_temp_d1 = np.add(deter_temp_d1, temp_d2d3_reuse)
             # multiply the impacts with the reuse losses
-            deter_temp_d1MC = np.multiply(temp_d1MC, np.median(mc_por_impact(product, mfa_mcs, constants)))
+            deter_temp_d1MC = np.multiply(temp_d1MC, np.median(not_reused))
             # add the recycling benefits of the losses
             deter_temp_d1MC = np.add(deter_temp_d1MC, temp_d2d3MC_reuse)
             # if product can be detached and has enough tl, reuse it
 
             # do the same but for the arrays
 
-            temp_d1_array = np.multiply(product.impacts_d1.reshape(1,-1), mc_por_impact(product, mfa_mcs, constants).reshape(-1,1))
-            temp_d1MC_array = np.multiply(product.impactsMC_d1, mc_por_impact(product, mfa_mcs, constants).reshape(-1,1,1))
+            temp_d1_array = np.multiply(product.impacts_d1.reshape(1,-1), not_reused.reshape(-1,1))
+            temp_d1MC_array = np.multiply(product.impactsMC_d1, not_reused.reshape(-1,1,1))
 
             # make sure no zero division
             portion_not_reused_array = np.divide(product.replaced_amount_updated_array, product.total_amount_with_replacements_array_updated)
@@ -671,272 +606,77 @@ class Analysis:
                     product.route = "downcycle_no_years_remain"
 
     def export_result_to_product_objs():
+        '''the totals are computed when they are first read (see TotalView in Objects/impacts.py),
+        this only drops totals that products from old save files carry so they are computed again'''
         for product in Products.instances:
-            # reset values
-            product.total_impact_without_d = None
-            product.total_impactMC_without_d = None
-            product.total_impact_with_d_standard = None
-            product.total_impactMC_with_d_standard = None
-            product.total_impact_with_d_rpc = None
-            product.total_impactMC_with_d_rpc = None
-            product.total_impact_without_d = product.impacts_a1a3 + product.impacts_a4 + \
-                product.impacts_b4 + product.impacts_c2 + \
-                product.impacts_c3 + product.impacts_c4_sen1
-            product.total_impactMC_without_d = product.impactsMC_a1a3 + product.impactsMC_a4 + \
-                product.impactsMC_b4 + product.impactsMC_c2 + \
-                product.impactsMC_c3 + product.impactsMC_c4_sen1
-            product.total_impact_with_d_standard = np.add(
-                product.impacts_d_standard, product.total_impact_without_d)
-            product.total_impactMC_with_d_standard = np.add(
-                product.impactsMC_d_standard, product.total_impactMC_without_d)
-            product.total_impact_with_d_rpc = product.impacts_d_rpc + product.impacts_a1a3 + product.impacts_a4 + \
-                product.impacts_b4 + product.impacts_c2 + \
-                product.impacts_c3 + product.impacts_c4_sen3
-            product.total_impactMC_with_d_rpc = product.impactsMC_d_rpc + product.impactsMC_a1a3 + product.impactsMC_a4 + \
-                product.impactsMC_b4 + product.impactsMC_c2 + \
-                product.impactsMC_c3 + product.impactsMC_c4_sen3
-            # arrays
-            product.total_impact_without_d_array = product.impacts_a1a3.reshape(1,-1) + product.impacts_a4.reshape(1,-1) + \
-                product.impacts_b4_array + product.impacts_c2_array + \
-                product.impacts_c3_array + product.impacts_c4_sen1_array
-            product.total_impactMC_without_d_array = product.impactsMC_a1a3 + product.impactsMC_a4 + \
-                product.impactsMC_b4_array + product.impactsMC_c2_array + \
-                product.impactsMC_c3_array + product.impactsMC_c4_sen1_array
-            product.total_impact_with_d_standard_array = product.impacts_d_standard_array + product.total_impact_without_d_array
-            product.total_impactMC_with_d_standard_array = product.impactsMC_d_standard_array + product.total_impactMC_without_d_array
-            product.total_impact_with_d_rpc_array = product.impacts_d_rpc_array + product.impacts_a1a3.reshape(1,-1) + product.impacts_a4.reshape(1,-1) + \
-                product.impacts_b4_array + product.impacts_c2_array + \
-                product.impacts_c3_array + product.impacts_c4_sen3_array
-            product.total_impactMC_with_d_rpc_array = product.impactsMC_d_rpc_array + product.impactsMC_a1a3 + product.impactsMC_a4 + \
-                product.impactsMC_b4_array + product.impactsMC_c2_array + \
-                product.impactsMC_c3_array + product.impactsMC_c4_sen3_array
-            
+            reset_totals(product, memo=False)
         print("Exported results to product objects")
 
     def export_result_to_assembly_objs():
-        for assembly in Assemblies.instances:
-            assembly.impacts_a1a3 = np.sum(
-                [product.impacts_a1a3 for product in assembly.products], axis=0)
-            assembly.impactsMC_a1a3 = np.sum(
-                [product.impactsMC_a1a3 for product in assembly.products], axis=0)
-            assembly.impacts_a4 = np.sum(
-                [product.impacts_a4 for product in assembly.products], axis=0)
-            assembly.impactsMC_a4 = np.sum(
-                [product.impactsMC_a4 for product in assembly.products], axis=0)
-            assembly.impacts_b4 = np.sum(
-                [product.impacts_b4 for product in assembly.products], axis=0)
-            assembly.impactsMC_b4 = np.sum(
-                [product.impactsMC_b4 for product in assembly.products], axis=0)
-            assembly.impacts_c2 = np.sum(
-                [product.impacts_c2 for product in assembly.products], axis=0)
-            assembly.impactsMC_c2 = np.sum(
-                [product.impactsMC_c2 for product in assembly.products], axis=0)
-            assembly.impacts_c3 = np.sum(
-                [product.impacts_c3 for product in assembly.products], axis=0)
-            assembly.impactsMC_c3 = np.sum(
-                [product.impactsMC_c3 for product in assembly.products], axis=0)
-            assembly.impacts_c4_sen1 = np.sum(
-                [product.impacts_c4_sen1 for product in assembly.products], axis=0)
-            assembly.impactsMC_c4_sen1 = np.sum(
-                [product.impactsMC_c4_sen1 for product in assembly.products], axis=0)
-            assembly.impacts_c4_sen3 = np.sum(
-                [product.impacts_c4_sen3 for product in assembly.products], axis=0)
-            assembly.impactsMC_c4_sen3 = np.sum(
-                [product.impactsMC_c4_sen3 for product in assembly.products], axis=0)
-            assembly.impacts_d_standard = np.sum(
-                [product.impacts_d_standard for product in assembly.products], axis=0)
-            assembly.impactsMC_d_standard = np.sum(
-                [product.impactsMC_d_standard for product in assembly.products], axis=0)
-            assembly.impacts_d_rpc = np.sum(
-                [product.impacts_d_rpc for product in assembly.products], axis=0)
-            assembly.impactsMC_d_rpc = np.sum(
-                [product.impactsMC_d_rpc for product in assembly.products], axis=0)
-            assembly.total_impact_without_d = np.sum(
-                [product.total_impact_without_d for product in assembly.products], axis=0)
-            assembly.total_impactMC_without_d = np.sum(
-                [product.total_impactMC_without_d for product in assembly.products], axis=0)
-            assembly.total_impact_with_d_standard = np.sum(
-                [product.total_impact_with_d_standard for product in assembly.products], axis=0)
-            assembly.total_impactMC_with_d_standard = np.sum(
-                [product.total_impactMC_with_d_standard for product in assembly.products], axis=0)
-            assembly.total_impact_with_d_rpc = np.sum(
-                [product.total_impact_with_d_rpc for product in assembly.products], axis=0)
-            assembly.total_impactMC_with_d_rpc = np.sum(
-                [product.total_impactMC_with_d_rpc for product in assembly.products], axis=0)
-            # arrays
-            assembly.impacts_b4_array = np.sum(
-                [product.impacts_b4_array for product in assembly.products], axis=0)
-            assembly.impactsMC_b4_array = np.sum(
-                [product.impactsMC_b4_array for product in assembly.products], axis=0)
-            assembly.impacts_c2_array = np.sum(
-                [product.impacts_c2_array for product in assembly.products], axis=0)
-            assembly.impactsMC_c2_array = np.sum(
-                [product.impactsMC_c2_array for product in assembly.products], axis=0)
-            assembly.impacts_c3_array = np.sum(
-                [product.impacts_c3_array for product in assembly.products], axis=0)
-            assembly.impactsMC_c3_array = np.sum(
-                [product.impactsMC_c3_array for product in assembly.products], axis=0)
-            assembly.impacts_c4_sen1_array = np.sum(
-                [product.impacts_c4_sen1_array for product in assembly.products], axis=0)
-            assembly.impactsMC_c4_sen1_array = np.sum(
-                [product.impactsMC_c4_sen1_array for product in assembly.products], axis=0)
-            assembly.impacts_c4_sen3_array = np.sum(
-                [product.impacts_c4_sen3_array for product in assembly.products], axis=0)
-            assembly.impactsMC_c4_sen3_array = np.sum(
-                [product.impactsMC_c4_sen3_array for product in assembly.products], axis=0)
-            assembly.impacts_d_standard_array = np.sum(
-                [product.impacts_d_standard_array for product in assembly.products], axis=0)
-            assembly.impactsMC_d_standard_array = np.sum(
-                [product.impactsMC_d_standard_array for product in assembly.products], axis=0)
-            assembly.impacts_d_rpc_array = np.sum(
-                [product.impacts_d_rpc_array for product in assembly.products], axis=0)
-            assembly.impactsMC_d_rpc_array = np.sum(
-                [product.impactsMC_d_rpc_array for product in assembly.products], axis=0)
-            assembly.total_impact_without_d_array = np.sum(
-                [product.total_impact_without_d_array for product in assembly.products], axis=0)
-            assembly.total_impactMC_without_d_array = np.sum(
-                [product.total_impactMC_without_d_array for product in assembly.products], axis=0)
-            assembly.total_impact_with_d_standard_array = np.sum(
-                [product.total_impact_with_d_standard_array for product in assembly.products], axis=0)
-            assembly.total_impactMC_with_d_standard_array = np.sum(
-                [product.total_impactMC_with_d_standard_array for product in assembly.products], axis=0)
-            assembly.total_impact_with_d_rpc_array = np.sum(
-                [product.total_impact_with_d_rpc_array for product in assembly.products], axis=0)
-            assembly.total_impactMC_with_d_rpc_array = np.sum(
-                [product.total_impactMC_with_d_rpc_array for product in assembly.products], axis=0)
-            
+        '''sums the product store into an assembly store, one segment per assembly. When the products were already summed
+        only the modules written since then are summed again, the others and the totals that use them are kept'''
+        product_store = Analysis.get_product_store()
+        groups = [[product.__dict__["_impact_index"] for product in assembly.products] for assembly in Assemblies.instances]
+        store = aggregate(product_store, groups, previous=Analysis.assembly_store)
+        if store.objects != Assemblies.instances:
+            store.bind(Assemblies.instances)
+        Analysis.assembly_store = store
         print("Exported results to assembly objects")
 
     def export_result_to_building_objs(building: Building):
-        # set all values to zero
-        building.impacts_a1a3 = None
-        building.impactsMC_a1a3 = None
-        building.impacts_a4 = None
-        building.impactsMC_a4 = None
-        building.impacts_b4 = None
-        building.impactsMC_b4 = None
-        building.impacts_c2 = None
-        building.impactsMC_c2 = None
-        building.impacts_c3 = None
-        building.impactsMC_c3 = None
-        building.impacts_c4_sen1 = None
-        building.impactsMC_c4_sen1 = None
-        building.impacts_c4_sen3 = None
-        building.impactsMC_c4_sen3 = None
-        building.impacts_d_standard = None
-        building.impactsMC_d_standard = None
-        building.impacts_d_rpc = None
-        building.impactsMC_d_rpc = None
-        building.total_impact_without_d = None
-        building.total_impactMC_without_d = None
-        building.total_impact_with_d_standard = None
-        building.total_impactMC_with_d_standard = None
-        building.total_impact_with_d_rpc = None
-        building.total_impactMC_with_d_rpc = None
-        # sum up all impacts
-        building.impacts_a1a3 = np.sum(
-            [assembly.impacts_a1a3 for assembly in building.assemblies], axis=0)
-        building.impactsMC_a1a3 = np.sum(
-            [assembly.impactsMC_a1a3 for assembly in building.assemblies], axis=0)
-        building.impacts_a4 = np.sum(
-            [assembly.impacts_a4 for assembly in building.assemblies], axis=0)
-        building.impactsMC_a4 = np.sum(
-            [assembly.impactsMC_a4 for assembly in building.assemblies], axis=0)
-        building.impacts_b4 = np.sum(
-            [assembly.impacts_b4 for assembly in building.assemblies], axis=0)
-        building.impactsMC_b4 = np.sum(
-            [assembly.impactsMC_b4 for assembly in building.assemblies], axis=0)
-        building.impacts_c2 = np.sum(
-            [assembly.impacts_c2 for assembly in building.assemblies], axis=0)
-        building.impactsMC_c2 = np.sum(
-            [assembly.impactsMC_c2 for assembly in building.assemblies], axis=0)
-        building.impacts_c3 = np.sum(
-            [assembly.impacts_c3 for assembly in building.assemblies], axis=0)
-        building.impactsMC_c3 = np.sum(
-            [assembly.impactsMC_c3 for assembly in building.assemblies], axis=0)
-        building.impacts_c4_sen1 = np.sum(
-            [assembly.impacts_c4_sen1 for assembly in building.assemblies], axis=0)
-        building.impactsMC_c4_sen1 = np.sum(
-            [assembly.impactsMC_c4_sen1 for assembly in building.assemblies], axis=0)
-        building.impacts_c4_sen3 = np.sum(
-            [assembly.impacts_c4_sen3 for assembly in building.assemblies], axis=0)
-        building.impactsMC_c4_sen3 = np.sum(
-            [assembly.impactsMC_c4_sen3 for assembly in building.assemblies], axis=0)
-        building.impacts_d_standard = np.sum(
-            [assembly.impacts_d_standard for assembly in building.assemblies], axis=0)
-        building.impactsMC_d_standard = np.sum(
-            [assembly.impactsMC_d_standard for assembly in building.assemblies], axis=0)
-        building.impacts_d_rpc = np.sum(
-            [assembly.impacts_d_rpc for assembly in building.assemblies], axis=0)
-        building.impactsMC_d_rpc = np.sum(
-            [assembly.impactsMC_d_rpc for assembly in building.assemblies], axis=0)
-        building.total_impact_without_d = np.sum(
-            [assembly.total_impact_without_d for assembly in building.assemblies], axis=0)
-        building.total_impactMC_without_d = np.sum(
-            [assembly.total_impactMC_without_d for assembly in building.assemblies], axis=0)
-        building.total_impact_with_d_standard = np.sum(
-            [assembly.total_impact_with_d_standard for assembly in building.assemblies], axis=0)
-        building.total_impactMC_with_d_standard = np.sum(
-            [assembly.total_impactMC_with_d_standard for assembly in building.assemblies], axis=0)
-        building.total_impact_with_d_rpc = np.sum(
-            [assembly.total_impact_with_d_rpc for assembly in building.assemblies], axis=0)
-        building.total_impactMC_with_d_rpc = np.sum(
-            [assembly.total_impactMC_with_d_rpc for assembly in building.assemblies], axis=0)
-        
-        # ARRAYS
-        building.impacts_b4_array = np.sum(
-            [assembly.impacts_b4_array for assembly in building.assemblies], axis=0)
-        building.impactsMC_b4_array = np.sum(
-            [assembly.impactsMC_b4_array for assembly in building.assemblies], axis=0)
-        building.impacts_c2_array = np.sum(
-            [assembly.impacts_c2_array for assembly in building.assemblies], axis=0)
-        building.impactsMC_c2_array = np.sum(
-            [assembly.impactsMC_c2_array for assembly in building.assemblies], axis=0)
-        building.impacts_c3_array = np.sum(
-            [assembly.impacts_c3_array for assembly in building.assemblies], axis=0)
-        building.impactsMC_c3_array = np.sum(
-            [assembly.impactsMC_c3_array for assembly in building.assemblies], axis=0)
-        building.impacts_c4_sen1_array = np.sum(
-            [assembly.impacts_c4_sen1_array for assembly in building.assemblies], axis=0)
-        building.impactsMC_c4_sen1_array = np.sum(
-            [assembly.impactsMC_c4_sen1_array for assembly in building.assemblies], axis=0)
-        building.impacts_c4_sen3_array = np.sum(
-            [assembly.impacts_c4_sen3_array for assembly in building.assemblies], axis=0)
-        building.impactsMC_c4_sen3_array = np.sum(
-            [assembly.impactsMC_c4_sen3_array for assembly in building.assemblies], axis=0)
-        building.impacts_d_standard_array = np.sum(
-            [assembly.impacts_d_standard_array for assembly in building.assemblies], axis=0)
-        building.impactsMC_d_standard_array = np.sum(
-            [assembly.impactsMC_d_standard_array for assembly in building.assemblies], axis=0)
-        building.impacts_d_rpc_array = np.sum(
-            [assembly.impacts_d_rpc_array for assembly in building.assemblies], axis=0)
-        building.impactsMC_d_rpc_array = np.sum(
-            [assembly.impactsMC_d_rpc_array for assembly in building.assemblies], axis=0)
-        building.total_impact_without_d_array = np.sum(
-            [assembly.total_impact_without_d_array for assembly in building.assemblies], axis=0)
-        building.total_impactMC_without_d_array = np.sum(
-            [assembly.total_impactMC_without_d_array for assembly in building.assemblies], axis=0)
-        building.total_impact_with_d_standard_array = np.sum(
-            [assembly.total_impact_with_d_standard_array for assembly in building.assemblies], axis=0)
-        building.total_impactMC_with_d_standard_array = np.sum(
-            [assembly.total_impactMC_with_d_standard_array for assembly in building.assemblies], axis=0)
-        building.total_impact_with_d_rpc_array = np.sum(
-            [assembly.total_impact_with_d_rpc_array for assembly in building.assemblies], axis=0)
-        building.total_impactMC_with_d_rpc_array = np.sum(
-            [assembly.total_impactMC_with_d_rpc_array for assembly in building.assemblies], axis=0)
-
+        '''sums the assembly store of the assemblies of the building, like the assemblies only what changed is summed again'''
+        if Analysis.assembly_store is None:
+            Analysis.export_result_to_assembly_objs()
+        group = [assembly.__dict__["_impact_index"] for assembly in building.assemblies]
+        store = aggregate(Analysis.assembly_store, [group], previous=building.__dict__.get("_impact_store"))
+        if store.objects != [building]:
+            store.bind([building])
         print("Exported results to building objects")
 
-    def generate_scenarios(mfa_mcs: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362)):
+    def generate_scenarios(mfa_mcs: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362), seed=None):
         Analysis.sen_d_standard()
-        Analysis.sen_d_standard_plus_reuse_plus_rpc(mfa_mcs, constants)
+        Analysis.sen_d_standard_plus_reuse_plus_rpc(mfa_mcs, constants, seed=seed)
+
+    def streamed_lca(building: Building, include_circularity: bool = True, mc_simulations: int = 50, mf_mcs: int = 100,
+                     constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362), seed=None,
+                     chunk_size: int = 500, spill_folder: str = None):
+        '''runs product_lca, generate_scenarios and generate_results chunk by chunk of assemblies. The product results of a chunk are
+        summed into the assembly results as soon as they are produced and then dropped, so only one chunk of product arrays is held
+        in memory at a time. With a spill_folder the product results are written there and kept as memory mapped views instead.
+        The results are the same as the in memory run with the same seed'''
+        seed = seed_sequence(seed)
+        Analysis.assembly_store = None
+        assembly_store = None
+        for k, (positions, products) in enumerate(Analysis.product_chunks(chunk_size)):
+            print(f"streaming chunk {k}: {len(positions)} assemblies, {len(products)} products")
+            Analysis.product_lca(include_circularity=include_circularity, mc_simulations=mc_simulations, mf_mcs=mf_mcs,
+                                 seed=seed, products=products)
+            Analysis.generate_scenarios(mfa_mcs=mf_mcs, constants=constants, seed=child_seed(seed, "scenarios"))
+            chunk = Analysis.product_store
+            if assembly_store is None:
+                assembly_store = ImpactStore(len(Assemblies.instances), chunk.mf_mcs, chunk.n_methods, chunk.mc_pick,
+                                             RESULT_SCALAR_MODULES, RESULT_ARRAY_MODULES)
+            # the chunk holds whole assemblies so their sums are final
+            segment_ids = [j for j, a in enumerate(positions) for _ in Assemblies.instances[a].products]
+            assembly_store.assign(positions, chunk.segment_sum(segment_ids, len(positions)))
+            if spill_folder:
+                chunk.spill(spill_folder, f"chunk{k}")
+            else:
+                chunk.release()
+            Analysis.product_store = None
+        if assembly_store is None:
+            raise Exception("No products have been generated")
+        assembly_store.bind(Assemblies.instances)
+        Analysis.assembly_store = assembly_store
+        print("Exported results to assembly objects")
+        Analysis.export_result_to_building_objs(building)
 
     def generate_results(building: Building, assembly_results: bool = True, building_results: bool = True):
         Analysis.export_result_to_product_objs()
-        if assembly_results:
+        # the building is summed from the assemblies so they are needed either way
+        if assembly_results or building_results:
             Analysis.export_result_to_assembly_objs()
         if building_results:
-            Analysis.export_result_to_assembly_objs()
             Analysis.export_result_to_building_objs(building)
     def clean_up():
         pass
@@ -0,0 +1,143 @@
+'''
+Batched kernels for the life cycle stages. Instead of looking up and multiplying the impacts product by product,
+a stage gathers the unit impacts of all products through an activity index array and writes
+(products x mf_mcs x methods x mc_pick) results straight into the product result store (see Objects/impacts.py).
+Products whose activity is missing are masked, their results are left untouched like the loops used to do.
+'''
+
+import logging
+import weakref
+import numpy as np
+from ..utils.helper import child_rng
+
+logging.basicConfig(format='%(asctime)s %(message)s',
+                    datefmt='%m/%d/%Y %I:%M:%S %p',
+                    filename='logs.log', filemode='a',
+                    level=logging.ERROR)
+
+
+def address(array: np.ndarray) -> int:
+    return array.__array_interface__["data"][0]
+
+
+def stacked_rows(arrays: list) -> np.ndarray:
+    '''np.stack of the arrays as floats. Arrays that are consecutive rows of one float array, like the mclcaLib of a store
+    loaded with a mmap_mode, give a view of those rows instead, so a mapped library is not copied into every process'''
+    base = arrays[0].base if arrays and isinstance(arrays[0], np.ndarray) else None
+    if isinstance(base, np.ndarray) and base.dtype == float and base.ndim == arrays[0].ndim + 1 and base.strides[0] > 0:
+        step = base.strides[0]
+        offset = address(arrays[0]) - address(base)
+        if offset % step == 0 and all(isinstance(array, np.ndarray) and array.base is base and array.shape == base.shape[1:]
+                                      and array.strides == base.strides[1:] and address(array) == address(arrays[0]) + k * step
+                                      for k, array in enumerate(arrays)):
+            start = offset // step
+            return np.asarray(base[start:start + len(arrays)])
+    return np.stack([np.asarray(array, dtype=float) for array in arrays])
+
+
+class ActivityTable:
+    '''the impact libraries of a LCAh object stacked into arrays, row i holds the activity with index i'''
+    # the table of every LCAh object, dropped with the object
+    _tables = weakref.WeakKeyDictionary()
+
+    def __init__(self, lcah):
+        # a proxy, so the table does not keep its LCAh object and its entry alive
+        self.lcah = weakref.proxy(lcah)
+        self.lcaLib = lcah.lcaLib
+        self.mclcaLib = lcah.mclcaLib
+        # in the order of the mclcaLib, the order of the rows of its dataset in a store
+        keys = [key for key in lcah.mclcaLib if key in lcah.lcaLib]
+        self.index = {key: i for i, key in enumerate(keys)}
+        # (activities, methods)
+        self.impacts = np.stack([np.asarray(lcah.lcaLib[key], dtype=float) for key in keys])
+        # (activities, methods, iterations)
+        self.impactsMC = stacked_rows([lcah.mclcaLib[key][0] for key in keys])
+        self.n_iterations = self.impactsMC.shape[2]
+
+    @classmethod
+    def of(cls, lcah):
+        '''the table of the lcah object, rebuilt only when its libraries were replaced. Every LCAh object keeps its own
+        table, so models on different lcas do not rebuild each other's'''
+        cached = cls._tables.get(lcah)
+        if cached is None or cached.lcaLib is not lcah.lcaLib or cached.mclcaLib is not lcah.mclcaLib:
+            cached = cls._tables[lcah] = cls(lcah)
+        return cached
+
+    def lookup(self, products: list, key, message: str = None, within=None):
+        '''the activity index of every product and a mask of the products that have one, key gives the activityLib key
+        of a product. Only the products in within are looked up, the missing ones are logged with message'''
+        act = np.zeros(len(products), dtype=int)
+        found = np.zeros(len(products), dtype=bool)
+        for j, product in enumerate(products):
+            if within is not None and not within[j]:
+                continue
+            activity = self.lcah.activityLib.get(key(product))
+            i = None if activity is None else self.index.get(str(activity))
+            if i is None:
+                if message is not None:
+                    logging.error(message.format(product=product))
+                continue
+            act[j] = i
+            found[j] = True
+        return act, found
+
+    def activity(self, key: str):
+        '''the index of a single activity of the activityLib or None'''
+        activity = self.lcah.activityLib.get(key)
+        return None if activity is None else self.index.get(str(activity))
+
+    def gather(self, act, picks):
+        '''unit impacts (products, methods) and the picked MC iterations (products, 1, methods, mc_pick)'''
+        methods = np.arange(self.impactsMC.shape[1])
+        impactsMC = self.impactsMC[act[:, None, None], methods[None, :, None], picks[:, None, :]]
+        return self.impacts[act], impactsMC[:, None]
+
+
+def draw_picks(seed, products: list, masks: list, n_iterations: int, mc_pick: int) -> list:
+    '''the MC iterations picked for each product and activity of a stage, (products, mc_pick) per mask.
+    Every product draws from its own stream in the order of the masks, the same draws randomChoiceArray made'''
+    picks = [np.zeros((len(products), mc_pick), dtype=int) for _ in masks]
+    for j, product in enumerate(products):
+        rng = child_rng(seed, product.id)
+        for mask, pick in zip(masks, picks):
+            if mask[j]:
+                pick[j] = rng.choice(n_iterations, mc_pick, replace=False)
+    return picks
+
+
+def stack(products: list, attribute: str, mask=None, length: int = None) -> np.ndarray:
+    '''one value or array per product stacked into (products,) or (products, length), masked products get zeros'''
+    if mask is None:
+        return np.array([np.asarray(getattr(product, attribute), dtype=float) for product in products])
+    shape = (len(products),) if length is None else (len(products), length)
+    out = np.zeros(shape)
+    for j, product in enumerate(products):
+        if mask[j]:
+            out[j] = getattr(product, attribute)
+    return out
+
+
+def linear_stage(views: dict, unit, unitMC, factor, factor_array, mask):
+    '''writes a module that is linear in the amount: unit impacts times factor (products,) for the scalar results
+    and times factor_array (products, mf_mcs) for the array results, only for the products in mask. The unit impacts
+    are (products, methods) and (products, 1, methods, mc_pick) or shared by all products as (methods,) and (methods, mc_pick)'''
+    if factor is not None:
+        np.multiply(unit, factor[:, None], out=views["impacts"], where=mask[:, None])
+        np.multiply(unitMC, factor[:, None, None, None], out=views["impactsMC"], where=mask[:, None, None, None])
+    if factor_array is not None and "impacts_array" in views:
+        np.multiply(unit[..., None, :], factor_array[:, :, None], out=views["impacts_array"], where=mask[:, None, None])
+        np.multiply(unitMC, factor_array[:, :, None, None], out=views["impactsMC_array"], where=mask[:, None, None, None])
+
+
+def add_stage(views: dict, first: dict, second: dict, mask):
+    '''writes the sum of two modules into a third one for the products in mask'''
+    for kind, view in views.items():
+        if kind in first and kind in second:
+            where = mask.reshape((-1,) + (1,) * (view.ndim - 1))
+            np.add(first[kind], second[kind], out=view, where=where)
+
+
+def zero_stage(views: dict, mask):
+    '''sets a module to zero for the products in mask'''
+    for view in views.values():
+        view[mask] = 0
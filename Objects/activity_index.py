@@ -0,0 +1,238 @@
+'''
+Indexes over the activities of a brightway database, used by LCAh.get_activity instead of scanning the whole
+database for every code and search. Every database is read once, then each code or (name, location, reference product)
+search is answered from an exact code index and a trigram index over the searched fields. The candidates of the trigram
+index are checked with the same substring tests the scans used and keep the database order, so the first match and the
+duplicate matches are the same as before.
+The answers can be kept in a sqlite ResolutionCache, then a new LCA only looks up the codes and searches that were not
+resolved before against the same version of the databases.
+'''
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import brightway2 as bw
+
+logging.basicConfig(format='%(asctime)s %(message)s',
+                    datefmt='%m/%d/%Y %I:%M:%S %p',
+                    filename='logs.log', filemode='a',
+                    level=logging.ERROR)
+
+SEARCH_FIELDS = ("name", "location", "reference product")
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def field(activity, key: str) -> str:
+    try:
+        return str(activity[key])
+    except KeyError:
+        return ""
+
+
+class ActivityIndex:
+    '''the activities of one database with an exact code index and a trigram index per searched field'''
+    _cache = {}
+
+    def __init__(self, database, name: str = ""):
+        self.name = name
+        self.activities = list(database)
+        self.codes = [field(activity, "code") for activity in self.activities]
+        self.code_index = {}
+        for position, code in enumerate(self.codes):
+            self.code_index.setdefault(code, []).append(position)
+        self.code_lengths = {len(code) for code in self.codes}
+        self.fields = {key: [field(activity, key) for activity in self.activities] for key in SEARCH_FIELDS + ("code",)}
+        self.grams = {}
+        for key, values in self.fields.items():
+            index = {}
+            for position, value in enumerate(values):
+                for gram in trigrams(value):
+                    index.setdefault(gram, set()).add(position)
+            self.grams[key] = index
+
+    @classmethod
+    def of(cls, database, name: str = None):
+        '''the index of a database, built the first time it is asked for and again whenever the fingerprint of the database
+        changed, like the entries of the ResolutionCache'''
+        name = name if name is not None else getattr(database, "name", str(database))
+        version = fingerprint(database)
+        index = cls._cache.get(name)
+        if index is None or index.fingerprint != version:
+            print(f"indexing the activities of {name}...")
+            index = cls._cache[name] = cls(database, name)
+            index.fingerprint = version
+        return index
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cache = {}
+
+    def candidates(self, key: str, text: str):
+        '''positions that can contain text in the field, None when every position can (text shorter than a trigram)'''
+        grams = trigrams(text)
+        if not grams:
+            return None
+        postings = sorted((self.grams[key].get(gram, set()) for gram in grams), key=len)
+        found = set(postings[0])
+        for posting in postings[1:]:
+            found &= posting
+            if not found:
+                break
+        return found
+
+    def match(self, query: dict) -> list:
+        '''activities in database order whose fields contain the query texts, {field: text}'''
+        positions = None
+        for key, text in query.items():
+            found = self.candidates(key, text)
+            if found is None:
+                continue
+            positions = found if positions is None else positions & found
+        if positions is None:
+            positions = range(len(self.activities))
+        return [self.activities[position] for position in sorted(positions)
+                if all(text in self.fields[key][position] for key, text in query.items())]
+
+    def find_code(self, code: str) -> list:
+        '''activities whose code contains code, the exact index answers it when all codes have its length (e.g. ecoinvent uuids)'''
+        if self.code_lengths == {len(code)}:
+            return [self.activities[position] for position in self.code_index.get(code, [])]
+        return self.match({"code": code})
+
+    def find_search(self, search: tuple) -> list:
+        '''activities matching a (name, location, reference product) search, missing parts match everything'''
+        search = tuple(search) + ("",) * (3 - len(search))
+        return self.match({key: str(text) for key, text in zip(SEARCH_FIELDS, search)})
+
+
+def fingerprint(database) -> str:
+    '''changes whenever the database changes, from its number of activities and its modified time in the brightway metadata'''
+    name = getattr(database, "name", str(database))
+    modified = bw.databases[name].get("modified", "") if name in bw.databases else ""
+    return hashlib.sha1(f"{name}|{len(database)}|{modified}".encode()).hexdigest()
+
+
+class ResolutionCache:
+    '''resolved codes and searches kept in a sqlite file, an entry is only used while the databases it was resolved in
+    have the same fingerprint. Activities are stored by their brightway key so the file works offline with the local project'''
+
+    def __init__(self, path: str):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with sqlite3.connect(self.path) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS resolutions (kind TEXT, query TEXT, fingerprint TEXT, result TEXT, PRIMARY KEY (kind, query))")
+
+    def load(self, kind: str, fingerprint: str) -> dict:
+        '''{query: result} of every entry of kind that was resolved in databases with this fingerprint'''
+        with sqlite3.connect(self.path) as connection:
+            rows = connection.execute(
+                "SELECT query, result FROM resolutions WHERE kind = ? AND fingerprint = ?", (kind, fingerprint)).fetchall()
+        return {query: json.loads(result) for query, result in rows}
+
+    def store(self, kind: str, fingerprint: str, results: dict):
+        with sqlite3.connect(self.path) as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?)",
+                [(kind, query, fingerprint, json.dumps(result)) for query, result in results.items()])
+
+
+class Resolver:
+    '''answers codes from the main database and searches from the search databases, each answer is the first match and
+    the number of matches per database. With a cache only what is not in it is looked up and the indexes are only built then'''
+
+    def __init__(self, main, search_databases: list, cache: ResolutionCache = None):
+        self.main = main
+        self.search_databases = search_databases
+        self.cache = cache
+
+    @staticmethod
+    def answer(matches: list) -> tuple:
+        return (matches[0] if matches else None, len(matches))
+
+    def codes(self, codes: list) -> dict:
+        '''{code: (activity, count)} of the main database'''
+        return self.lookup("code", codes, [self.main], lambda index, code: index.find_code(code), str)
+
+    def searches(self, searches: list) -> dict:
+        '''{search: [(activity, count) per search database]}'''
+        return self.lookup("search", searches, self.search_databases, lambda index, search: index.find_search(search),
+                           lambda search: json.dumps([str(text) for text in search]))
+
+    def lookup(self, kind: str, queries: list, databases: list, find, encode) -> dict:
+        queries = list(dict.fromkeys(queries))
+        answers = {}
+        missing = queries
+        if self.cache is not None:
+            databases_fingerprint = "|".join(fingerprint(database) for database in databases)
+            cached = self.cache.load(kind, databases_fingerprint)
+            missing = []
+            for query in queries:
+                result = cached.get(encode(query))
+                if result is None:
+                    missing.append(query)
+                    continue
+                answers[query] = [(None if key is None else bw.get_activity(tuple(key)), count) for key, count in result]
+            print(f"{len(queries) - len(missing)} of {len(queries)} {kind} lookups found in the resolution cache")
+        if missing:
+            indexes = [ActivityIndex.of(database) for database in databases]
+            new = {}
+            for query in missing:
+                answers[query] = [self.answer(find(index, query)) for index in indexes]
+                new[encode(query)] = [(None if activity is None else list(activity.key), count) for activity, count in answers[query]]
+            if self.cache is not None:
+                self.cache.store(kind, databases_fingerprint, new)
+        if kind == "code":
+            return {query: answer[0] for query, answer in answers.items()}
+        return answers
+
+
+def resolve(codeLib: dict, searchLib: dict, resolver: Resolver) -> tuple:
+    '''resolves every code of codeLib and every search of searchLib in one pass. A search is looked up in every search
+    database in turn and the last one with a match wins, the first match of a database is used and more than one is logged.
+    Returns the {key: activity} found and the code and search items that were not found'''
+    activityLib = {}
+    not_found_code = []
+    not_found_search = []
+    codes = resolver.codes([str(code) for code in codeLib.values()])
+    code_found = {}
+    for code in codeLib.items():
+        if code[1] in code_found:
+            activityLib[f"{code[0]}"] = code_found[code[1]]
+            continue
+        activity, count = codes[str(code[1])]
+        if count > 1:
+            logging.error(
+                f"found more than one activity for code: {code} in the main database")
+        if count == 0:
+            not_found_code.append(code)
+            continue
+        activityLib[f"{code[0]}"] = activity
+        code_found[code[1]] = activity
+    # searches are remembered by their name like the scans did
+    searches = resolver.searches([tuple(search) + ("",) * (3 - len(search)) for search in searchLib.values()])
+    search_found = {}
+    for search in searchLib.items():
+        if search[1][0] in search_found:
+            activityLib[f"{search[0]}"] = search_found[search[1][0]]
+            continue
+        found = None
+        for activity, count in searches[tuple(search[1]) + ("",) * (3 - len(search[1]))]:
+            if count > 1:
+                logging.error(
+                    f"found more than one activity for search: {search} in the main database")
+            if count > 0:
+                found = activity
+        if found is None:
+            not_found_search.append(search)
+            continue
+        activityLib[f"{search[0]}"] = found
+        search_found[search[1][0]] = found
+    return activityLib, not_found_code, not_found_search
@@ -0,0 +1,378 @@
+'''
+Columnar storage of the LCA results. Instead of every product carrying its own arrays, the results of a group of objects
+(products, assemblies or buildings) live in four contiguous tensors with the axes (module, object, mf_mcs, method, mc_pick),
+one for each kind of result:
+    impacts          deterministic results, object view of shape (methods,)
+    impactsMC        Monte Carlo results, object view of shape (1, methods, mc_pick)
+    impacts_array    deterministic results per material flow simulation, object view of shape (mf_mcs, methods)
+    impactsMC_array  Monte Carlo results per material flow simulation, object view of shape (mf_mcs, methods, mc_pick)
+The objects keep their usual attributes (e.g. product.impactsMC_b4_array) which are now views into these tensors,
+assigning to them writes in place.
+The totals (e.g. building.total_impactMC_with_d_rpc_array) are computed when they are first read and kept until one
+of the modules they add up is written again, every module has a version that is raised on each write.
+'''
+
+import os
+import numpy as np
+
+# life cycle modules stored for every kind of result
+SCALAR_MODULES = ("a1a3", "a4", "b4", "b4_materials", "b4_transport", "c2", "c3", "c4_landfill", "c4_incineration",
+                  "c4_sen1", "c4_sen3", "d1", "d2", "d2_rec", "d2_rep", "d3", "d3_heat", "d3_elec", "d_standard", "d_rpc")
+# life cycle modules that also have results per material flow simulation
+ARRAY_MODULES = ("b4", "b4_materials", "b4_transport", "c2", "c3", "c4_landfill", "c4_incineration",
+                 "c4_sen1", "c4_sen3", "d2", "d3", "d_standard", "d_rpc")
+# modules that are summed up to the assemblies and the building
+RESULT_SCALAR_MODULES = ("a1a3", "a4", "b4", "c2", "c3", "c4_sen1", "c4_sen3", "d_standard", "d_rpc")
+RESULT_ARRAY_MODULES = ("b4", "c2", "c3", "c4_sen1", "c4_sen3", "d_standard", "d_rpc")
+
+KINDS = ("impacts", "impactsMC", "impacts_array", "impactsMC_array")
+
+
+def attribute_name(kind: str, module: str) -> str:
+    '''the name of the object attribute holding the result of a module, e.g. ("impactsMC_array", "b4") -> impactsMC_b4_array'''
+    prefix = "impactsMC" if kind.startswith("impactsMC") else "impacts"
+    if not kind.endswith("_array"):
+        return f"{prefix}_{module}"
+    if module in ("c4_landfill", "c4_incineration"):
+        # these two were always named with the array in the middle
+        return f"{prefix}_c4_array_{module[3:]}"
+    return f"{prefix}_{module}_array"
+
+
+ATTRIBUTES = {attribute_name(kind, module): (kind, module)
+              for kind in KINDS for module in (ARRAY_MODULES if kind.endswith("_array") else SCALAR_MODULES)}
+
+# the modules each total adds up, without d, with the standard d and with the reuse and rpc d
+SCENARIOS = {
+    "without_d": ("a1a3", "a4", "b4", "c2", "c3", "c4_sen1"),
+    "with_d_standard": ("d_standard", "a1a3", "a4", "b4", "c2", "c3", "c4_sen1"),
+    "with_d_rpc": ("d_rpc", "a1a3", "a4", "b4", "c2", "c3", "c4_sen3"),
+}
+TOTALS = {f"total_{'impactMC' if kind.startswith('impactsMC') else 'impact'}_{scenario}{'_array' if kind.endswith('_array') else ''}": (kind, modules)
+          for scenario, modules in SCENARIOS.items() for kind in KINDS}
+
+
+class ImpactTensor:
+    '''one contiguous array with the axes (module, object, mf_mcs, method, mc_pick)'''
+
+    def __init__(self, modules: tuple, n_objects: int, mf_mcs: int, n_methods: int, mc_pick: int, data: np.ndarray = None):
+        self.modules = tuple(modules)
+        self.module_index = {module: i for i, module in enumerate(self.modules)}
+        if data is None:
+            data = np.zeros((len(self.modules), n_objects, mf_mcs, n_methods, mc_pick))
+        self.data = data
+
+    def __getstate__(self):
+        # spilled tensors are pickled as the file they are mapped from
+        state = self.__dict__.copy()
+        if isinstance(self.data, np.memmap) and self.data.filename:
+            state["data"] = None
+            state["filename"] = self.data.filename
+        return state
+
+    def __setstate__(self, state):
+        filename = state.pop("filename", None)
+        self.__dict__.update(state)
+        if filename is not None:
+            self.data = np.load(filename, mmap_mode="r")
+
+    def __contains__(self, module) -> bool:
+        return module in self.module_index
+
+    def module(self, module: str) -> np.ndarray:
+        '''(object, mf_mcs, method, mc_pick) view of one module'''
+        return self.data[self.module_index[module]]
+
+    def segment_sum(self, segment_ids, n_segments: int, modules: tuple = None):
+        '''sums the objects into n_segments groups, segment_ids gives the group of every object and has to be sorted'''
+        modules = self.modules if modules is None else tuple(modules)
+        segment_ids = np.asarray(segment_ids, dtype=int)
+        if len(segment_ids) > 1 and np.any(np.diff(segment_ids) < 0):
+            raise ValueError("segment_ids have to be sorted")
+        out = ImpactTensor(modules, n_segments, *self.data.shape[2:])
+        if n_segments == 0:
+            return out
+        counts = np.bincount(segment_ids, minlength=n_segments)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        not_empty = counts > 0
+        if not not_empty.any():
+            return out
+        for i, module in enumerate(modules):
+            # objects after the last segment (not part of any group) are left out
+            out.data[i, not_empty] = np.add.reduceat(self.module(module)[:len(segment_ids)], starts[not_empty], axis=0)
+        return out
+
+    def group_sum(self, groups: list, modules: tuple = None):
+        '''sums the objects into one entry per group, groups is a list of lists of object indices that may overlap'''
+        modules = self.modules if modules is None else tuple(modules)
+        out = ImpactTensor(modules, len(groups), *self.data.shape[2:])
+        for g, group in enumerate(groups):
+            if len(group) == 0:
+                continue
+            for i, module in enumerate(modules):
+                out.data[i, g] = self.module(module)[list(group)].sum(axis=0)
+        return out
+
+
+class ImpactStore:
+    '''the four result tensors of a group of objects (products, assemblies or buildings), object i has the views of slot i'''
+
+    def __init__(self, n_objects: int, mf_mcs: int, n_methods: int, mc_pick: int,
+                 scalar_modules: tuple = SCALAR_MODULES, array_modules: tuple = ARRAY_MODULES, tensors: dict = None):
+        self.n_objects = n_objects
+        self.mf_mcs = mf_mcs
+        self.n_methods = n_methods
+        self.mc_pick = mc_pick
+        if tensors is None:
+            tensors = {
+                "impacts": ImpactTensor(scalar_modules, n_objects, 1, n_methods, 1),
+                "impactsMC": ImpactTensor(scalar_modules, n_objects, 1, n_methods, mc_pick),
+                "impacts_array": ImpactTensor(array_modules, n_objects, mf_mcs, n_methods, 1),
+                "impactsMC_array": ImpactTensor(array_modules, n_objects, mf_mcs, n_methods, mc_pick),
+            }
+        self.tensors = tensors
+        self.objects = []
+        self.versions = {module: 0 for tensor in tensors.values() for module in tensor.modules}
+        # set by aggregate, the store and groups this one was summed from and the versions of their modules at that time
+        self.source = None
+        self.layout = None
+        self.source_versions = None
+
+    def touch(self, *modules):
+        '''raises the version of the modules, the totals that use them are computed again when read'''
+        for module in modules:
+            self.versions[module] = self.versions.get(module, 0) + 1
+
+    def has(self, attribute: str) -> bool:
+        kind, module = ATTRIBUTES[attribute]
+        return module in self.tensors[kind]
+
+    def view(self, attribute: str, i: int) -> np.ndarray:
+        '''the view of the result attribute of object i, with the same shape the attribute always had'''
+        kind, module = ATTRIBUTES[attribute]
+        data = self.tensors[kind].module(module)
+        if kind == "impacts":
+            return data[i, 0, :, 0]
+        if kind == "impacts_array":
+            return data[i, :, :, 0]
+        return data[i]
+
+    def module_views(self, module: str, touch: bool = True) -> dict:
+        '''the views of one module for all objects by kind, shaped like the attribute with the objects in front.
+        The views are handed out for writing so the module is touched unless touch is False'''
+        if touch:
+            self.touch(module)
+        views = {}
+        for kind, tensor in self.tensors.items():
+            if module not in tensor:
+                continue
+            data = tensor.module(module)
+            if kind == "impacts":
+                views[kind] = data[:, 0, :, 0]
+            elif kind == "impacts_array":
+                views[kind] = data[..., 0]
+            else:
+                views[kind] = data
+        return views
+
+    def bind(self, objects: list):
+        '''attaches the objects to the store, object k of the list gets slot k'''
+        if len(objects) != self.n_objects:
+            raise ValueError(f"the store has {self.n_objects} slots but {len(objects)} objects were given")
+        self.objects = list(objects)
+        for i, obj in enumerate(self.objects):
+            # drop results that were set before the object had a store
+            for attribute in ATTRIBUTES:
+                obj.__dict__.pop(attribute, None)
+            reset_totals(obj)
+            obj.__dict__["_impact_store"] = self
+            obj.__dict__["_impact_index"] = i
+
+    def assign(self, slots: list, other):
+        '''copies the slots of another store with the same modules into the given slots of this one'''
+        for kind, tensor in self.tensors.items():
+            for i, module in enumerate(tensor.modules):
+                tensor.data[i, slots] = other.tensors[kind].module(module)
+            self.touch(*tensor.modules)
+
+    def assign_modules(self, other):
+        '''copies every module of another store with the same slots into this one'''
+        for kind, tensor in other.tensors.items():
+            for module in tensor.modules:
+                self.tensors[kind].module(module)[...] = tensor.module(module)
+            self.touch(*tensor.modules)
+
+    def release(self):
+        '''detaches the objects and drops the results'''
+        for obj in self.objects:
+            obj.__dict__.pop("_impact_store", None)
+            obj.__dict__.pop("_impact_index", None)
+            reset_totals(obj)
+        self.objects = []
+        self.tensors = {}
+
+    def spill(self, folder: str, name: str):
+        '''writes the tensors to folder and maps them back read only, the objects keep their (read only) views'''
+        os.makedirs(folder, exist_ok=True)
+        for kind, tensor in self.tensors.items():
+            path = os.path.join(folder, f"{name}_{kind}.npy")
+            np.save(path, tensor.data)
+            tensor.data = np.load(path, mmap_mode="r")
+
+    def segment_sum(self, segment_ids, n_segments: int, scalar_modules: tuple = RESULT_SCALAR_MODULES,
+                    array_modules: tuple = RESULT_ARRAY_MODULES):
+        '''a new store with the objects summed into n_segments groups, segment_ids gives the (sorted) group of every slot'''
+        tensors = {kind: tensor.segment_sum(segment_ids, n_segments, array_modules if kind.endswith("_array") else scalar_modules)
+                   for kind, tensor in self.tensors.items()}
+        return ImpactStore(n_segments, self.mf_mcs, self.n_methods, self.mc_pick, tensors=tensors)
+
+    def group_sum(self, groups: list, scalar_modules: tuple = RESULT_SCALAR_MODULES, array_modules: tuple = RESULT_ARRAY_MODULES):
+        '''a new store with one slot per group of slots, the groups may overlap'''
+        tensors = {kind: tensor.group_sum(groups, array_modules if kind.endswith("_array") else scalar_modules)
+                   for kind, tensor in self.tensors.items()}
+        return ImpactStore(len(groups), self.mf_mcs, self.n_methods, self.mc_pick, tensors=tensors)
+
+
+def aggregate(source: ImpactStore, groups: list, previous: ImpactStore = None) -> ImpactStore:
+    '''sums the slots of source into one slot per group (lists of slots). Groups that follow each other in the layout of source
+    are summed as segments, otherwise slot by slot. If previous was aggregated from the same source and groups only the modules
+    written since then are summed again into previous, which is returned; when nothing changed it is returned as is'''
+    layout = tuple(tuple(group) for group in groups)
+    scalar_modules = [module for module in RESULT_SCALAR_MODULES if module in source.tensors["impacts"]]
+    array_modules = [module for module in RESULT_ARRAY_MODULES if module in source.tensors["impacts_array"]]
+    if previous is not None and getattr(previous, "source", None) is source and previous.layout == layout:
+        changed = {module for module, version in previous.source_versions.items() if source.versions.get(module) != version}
+        if not changed:
+            return previous
+        scalar_modules = [module for module in scalar_modules if module in changed]
+        array_modules = [module for module in array_modules if module in changed]
+    else:
+        previous = None
+    slots = [slot for group in layout for slot in group]
+    if slots == list(range(len(slots))):
+        segment_ids = [g for g, group in enumerate(layout) for _ in group]
+        store = source.segment_sum(segment_ids, len(layout), scalar_modules, array_modules)
+    else:
+        store = source.group_sum(layout, scalar_modules, array_modules)
+    versions = {module: source.versions[module] for module in set(scalar_modules) | set(array_modules)}
+    if previous is not None:
+        previous.assign_modules(store)
+        previous.source_versions.update(versions)
+        return previous
+    store.source = source
+    store.layout = layout
+    store.source_versions = versions
+    return store
+
+
+class ImpactView:
+    '''class attribute that turns a result attribute into a view of the store the object is bound to.
+    Objects without a store (e.g. loaded from an old pickle) keep the attribute in their __dict__ as before'''
+
+    def __init__(self, attribute: str):
+        self.attribute = attribute
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        store = obj.__dict__.get("_impact_store")
+        if store is None or not store.has(self.attribute):
+            try:
+                return obj.__dict__[self.attribute]
+            except KeyError:
+                raise AttributeError(f"{type(obj).__name__} has no results for {self.attribute} yet")
+        return store.view(self.attribute, obj.__dict__["_impact_index"])
+
+    def __set__(self, obj, value):
+        store = obj.__dict__.get("_impact_store")
+        if store is None or not store.has(self.attribute):
+            obj.__dict__[self.attribute] = value
+            touch(obj, ATTRIBUTES[self.attribute][1])
+            return
+        store.view(self.attribute, obj.__dict__["_impact_index"])[...] = value
+        touch(obj, ATTRIBUTES[self.attribute][1])
+
+    def __delete__(self, obj):
+        # results in a store can not be deleted one by one, only loose ones
+        try:
+            del obj.__dict__[self.attribute]
+        except KeyError:
+            raise AttributeError(self.attribute)
+        touch(obj, ATTRIBUTES[self.attribute][1])
+
+
+def touch(obj, module: str):
+    '''marks a module of an object as written, use it after changing a result in place (e.g. product.impactsMC_c3[0][1] = ...)'''
+    store = obj.__dict__.get("_impact_store")
+    if store is not None and module in store.versions:
+        store.touch(module)
+    else:
+        versions = obj.__dict__.setdefault("_impact_versions", {})
+        versions[module] = versions.get(module, 0) + 1
+
+
+def module_versions(obj, modules: tuple) -> tuple:
+    store = obj.__dict__.get("_impact_store")
+    loose = obj.__dict__.get("_impact_versions", {})
+    if store is None:
+        return tuple(loose.get(module, 0) for module in modules)
+    return tuple(store.versions[module] if module in store.versions else loose.get(module, 0) for module in modules)
+
+
+def reset_totals(obj, memo: bool = True):
+    '''drops totals that were set on an object directly (e.g. by an old save file) and unless memo is False the memoised ones'''
+    if memo:
+        obj.__dict__.pop("_totals", None)
+    for name in TOTALS:
+        obj.__dict__.pop(name, None)
+
+
+class TotalView:
+    '''class attribute for a total, it adds up the modules when read and keeps the result until one of them changes'''
+
+    def __init__(self, name: str):
+        self.name = name
+        kind, self.modules = TOTALS[name]
+        # the results per material flow simulation come first so the sum gets their shape,
+        # a1a3 and a4 have no arrays and broadcast along them
+        scalar_kind = kind.replace("_array", "")
+        attributes = [attribute_name(kind, module) if module in ARRAY_MODULES or kind == scalar_kind else attribute_name(scalar_kind, module)
+                      for module in self.modules]
+        self.attributes = sorted(attributes, key=lambda attribute: not ATTRIBUTES[attribute][0].endswith("_array"))
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        if self.name in obj.__dict__:
+            return obj.__dict__[self.name]
+        versions = module_versions(obj, self.modules)
+        memo = obj.__dict__.setdefault("_totals", {})
+        cached = memo.get(self.name)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+        total = np.add(getattr(obj, self.attributes[0]), getattr(obj, self.attributes[1]))
+        for attribute in self.attributes[2:]:
+            total += getattr(obj, attribute)
+        # the memoised array is shared by every reader
+        total.flags.writeable = False
+        memo[self.name] = (versions, total)
+        return total
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+    def __delete__(self, obj):
+        memo = obj.__dict__.get("_totals", {})
+        if self.name not in obj.__dict__ and self.name not in memo:
+            raise AttributeError(self.name)
+        obj.__dict__.pop(self.name, None)
+        memo.pop(self.name, None)
+
+
+def add_impact_views(cls):
+    '''class decorator adding a view for every result attribute and every total'''
+    for attribute in ATTRIBUTES:
+        setattr(cls, attribute, ImpactView(attribute))
+    for name in TOTALS:
+        setattr(cls, name, TotalView(name))
+    return cls
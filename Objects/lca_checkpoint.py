@@ -0,0 +1,71 @@
+'''
+Checkpoints of the LCA libraries of a LCAh object. Every activity is written to its own file as soon as its results are
+computed, a file is written next to its final name and renamed over it so a run stopped at any point only leaves whole
+files behind. LCAh.resume reads them back, then only the activities without results are computed again.
+'''
+
+import hashlib
+import os
+import pickle
+import numpy as np
+
+LIBRARIES = ("lca", "mclca")
+
+
+def atomic_write(path: str, write):
+    '''calls write(file) on a temporary file next to path and renames it to path once it is on disk'''
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class LCACheckpoint:
+    '''one .npz file per activity and library ("lca" for the lcaLib, "mclca" for the mclcaLib) and the state of the
+    Monte Carlo blocks in a folder'''
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        for library in LIBRARIES:
+            os.makedirs(os.path.join(folder, library), exist_ok=True)
+
+    def path(self, library: str, key: str) -> str:
+        return os.path.join(self.folder, library, hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
+    def write(self, library: str, key: str, results: np.ndarray, blocks: int = 0):
+        '''keeps the results of the activity key, blocks is the number of Monte Carlo blocks they hold'''
+        atomic_write(self.path(library, key),
+                     lambda file: np.savez(file, key=np.array(key), results=results, blocks=np.array(blocks)))
+
+    def read(self, library: str) -> dict:
+        '''{key: (results, blocks)} of every activity kept for the library'''
+        entries = {}
+        folder = os.path.join(self.folder, library)
+        for name in sorted(os.listdir(folder)):
+            # .tmp files are writes that were stopped
+            if not name.endswith(".npz"):
+                continue
+            with np.load(os.path.join(folder, name)) as data:
+                entries[str(data["key"])] = (data["results"], int(data["blocks"]))
+        return entries
+
+    def write_state(self, state: dict):
+        atomic_write(os.path.join(self.folder, "state.p"), lambda file: pickle.dump(state, file))
+
+    def read_state(self) -> dict:
+        '''the state of the last Monte Carlo run or None'''
+        path = os.path.join(self.folder, "state.p")
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as file:
+            return pickle.load(file)
+
+    def clear(self, library: str):
+        '''removes the files of the library, and the Monte Carlo state with the mclca library'''
+        folder = os.path.join(self.folder, library)
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+        if library == "mclca" and os.path.isfile(os.path.join(self.folder, "state.p")):
+            os.remove(os.path.join(self.folder, "state.p"))
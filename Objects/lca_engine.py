@@ -0,0 +1,154 @@
+'''
+Batched LCA of the activities of a LCAh object. The technosphere and biosphere matrices are built once for the demand of
+all activities and the technosphere is factorised once, then the supplies of the activities are solved block by block as
+a multi-column right-hand side and characterised for every method with one sparse product. The score of an activity and
+a method is the same (characterization matrix * inventory).sum() a bw.LCA of the activity alone gave.
+The Monte Carlo runs use the same stacked characterisation once per iteration. They either sample the matrices for every
+activity on its own, possibly over a process pool, or sample them once per iteration and solve all activities on that
+sample (shared sampling), which correlates the draws of the activities like the draws of one building are.
+The Monte Carlo iterations are run in blocks with a seed per block, more iterations are added as a new block so the
+iterations already computed are kept and the draws continue from them.
+'''
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse as sparse
+from scipy.sparse.linalg import splu
+import brightway2 as bw
+from ..utils.helper import child_seed
+
+logging.basicConfig(format='%(asctime)s %(message)s',
+                    datefmt='%m/%d/%Y %I:%M:%S %p',
+                    filename='logs.log', filemode='a',
+                    level=logging.ERROR)
+
+
+def characterization_stack(lca, methods: list):
+    '''(methods, biosphere flows) sparse matrix, row m holds the column sums of the characterization matrix of method m,
+    so characterization_stack @ (biosphere_matrix @ supply) gives the score of every method'''
+    rows = []
+    for method in methods:
+        lca.switch_method(method)
+        rows.append(sparse.csr_matrix(lca.characterization_matrix.sum(axis=0)))
+    return sparse.vstack(rows).tocsr()
+
+
+class BatchLCA:
+    '''deterministic LCA of many activities on one factorised technosphere'''
+
+    def __init__(self, activities: list, methods: list, block_size: int = 256):
+        self.methods = methods
+        self.block_size = block_size
+        # one LCA over the demand of every activity loads the matrices of all the databases they need
+        self.lca = bw.LCA({act: 1 for act in activities}, methods[0])
+        self.lca.load_lci_data()
+        self.characterization = characterization_stack(self.lca, methods)
+        self.solver = splu(sparse.csc_matrix(self.lca.technosphere_matrix))
+
+    def scores(self, activities: list) -> np.ndarray:
+        '''(methods, activities) scores of one unit of each activity'''
+        return block_scores(self.lca, self.solver, self.characterization, activities, self.block_size)
+
+
+def demand_columns(lca, activities: list) -> np.ndarray:
+    '''(products, activities) demand columns of one unit of each activity'''
+    columns = np.zeros((lca.technosphere_matrix.shape[0], len(activities)))
+    for j, act in enumerate(activities):
+        lca.build_demand_array({act: 1})
+        columns[:, j] = lca.demand_array
+    return columns
+
+
+def block_scores(lca, solver, characterization, activities: list, block_size: int) -> np.ndarray:
+    '''(methods, activities) scores of one unit of each activity on the factorised technosphere solver of lca,
+    block_size activities are solved at a time'''
+    out = np.empty((characterization.shape[0], len(activities)))
+    for start in range(0, len(activities), block_size):
+        block = activities[start:start + block_size]
+        supply = solver.solve(demand_columns(lca, block))
+        out[:, start:start + len(block)] = characterization @ (lca.biosphere_matrix @ supply)
+    return out
+
+
+def activity_seed(seed, act, block: int = 0):
+    '''the int seed of block block of the Monte Carlo iterations of an activity, None without seed. It only depends on seed,
+    the activity and the block so the draws do not change with the number of workers or the order of the activities, and a
+    new block continues the draws of the earlier ones'''
+    if seed is None:
+        return None
+    keys = ("mc", str(act)) + ((block,) if block else ())
+    return int(child_seed(seed, *keys).generate_state(1)[0])
+
+
+def shared_seed(seed, block: int = 0):
+    '''the int seed of block block of the shared sampling Monte Carlo iterations, None without seed'''
+    if seed is None:
+        return None
+    keys = ("mc shared",) + ((block,) if block else ())
+    return int(child_seed(seed, *keys).generate_state(1)[0])
+
+
+def monte_carlo_scores(act, methods: list, iterations: int, seed: int = None) -> np.ndarray:
+    '''(methods, iterations) Monte Carlo scores of one unit of act, the characterization matrices are taken before the
+    first iteration like before and applied as one stacked product per iteration'''
+    MC_lca = bw.MonteCarloLCA({act: 1}, seed=seed)
+    MC_lca.lci()
+    characterization = characterization_stack(MC_lca, methods)
+    results = np.empty((len(methods), iterations))
+    for iteration in range(iterations):
+        next(MC_lca)
+        results[:, iteration] = characterization @ (MC_lca.biosphere_matrix @ MC_lca.supply_array)
+    return results
+
+
+def monte_carlo_blocks(act, methods: list, blocks: list) -> np.ndarray:
+    '''(methods, iterations) scores of the blocks [(iterations, seed)] of act one after the other'''
+    return np.concatenate([monte_carlo_scores(act, methods, iterations, block_seed) for iterations, block_seed in blocks], axis=1)
+
+
+def _monte_carlo_worker(task: tuple) -> np.ndarray:
+    project, key, methods, blocks = task
+    bw.projects.set_current(project)
+    return monte_carlo_blocks(bw.get_activity(key), methods, blocks)
+
+
+def monte_carlo_runs(activities: list, methods: list, plan: list, done: dict, workers: int = 1, seed=None):
+    '''runs the blocks of plan (iterations per block) the activities miss, done gives the number of blocks an activity
+    already has by str(act). Yields (act, first block run, (methods, iterations) scores) when an activity is done, in this
+    process with workers=1 or spread over a pool of workers processes that load the activities from the brightway project'''
+    todo = [(act, done.get(str(act), 0)) for act in activities if done.get(str(act), 0) < len(plan)]
+    blocks = [[(plan[block], activity_seed(seed, act, block)) for block in range(first, len(plan))] for act, first in todo]
+    if workers > 1 and len(todo) > 1:
+        tasks = [(bw.projects.current, act.key, methods, act_blocks) for (act, _), act_blocks in zip(todo, blocks)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for (act, first), result in zip(todo, executor.map(_monte_carlo_worker, tasks)):
+                print("Monte Carlo LCA finished for: ", act)
+                yield act, first, result
+        return
+    for (act, first), act_blocks in zip(todo, blocks):
+        print("running Monte Carlo LCA for: ", act)
+        yield act, first, monte_carlo_blocks(act, methods, act_blocks)
+
+
+def shared_monte_carlo_runs(activities: list, methods: list, plan: list, done: dict, seed=None, block_size: int = 256):
+    '''runs the blocks of plan the activities miss (see monte_carlo_runs) with shared sampling: every iteration of a block
+    samples the technosphere and biosphere matrices once, factorises the sampled technosphere once and solves all the
+    activities that miss the block on it. Yields (act, block, (methods, iterations) scores) for every activity of a block'''
+    first = {str(act): done.get(str(act), 0) for act in activities}
+    for block, iterations in enumerate(plan):
+        todo = [act for act in activities if first[str(act)] <= block]
+        if not todo:
+            continue
+        MC_lca = bw.MonteCarloLCA({act: 1 for act in todo}, seed=shared_seed(seed, block))
+        MC_lca.load_data()
+        characterization = characterization_stack(MC_lca, methods)
+        results = np.empty((len(todo), len(methods), iterations))
+        for iteration in range(iterations):
+            print(f"running shared Monte Carlo LCA iteration {iteration + 1} of {iterations} of block {block}")
+            MC_lca.rebuild_technosphere_matrix(MC_lca.tech_rng.next())
+            MC_lca.rebuild_biosphere_matrix(MC_lca.bio_rng.next())
+            solver = splu(sparse.csc_matrix(MC_lca.technosphere_matrix))
+            results[:, :, iteration] = block_scores(MC_lca, solver, characterization, todo, block_size).T
+        for j, act in enumerate(todo):
+            yield act, block, results[j]
@@ -0,0 +1,135 @@
+'''
+Models own the registries of the buildings, assemblies, products, relations, LCA objects and result stores. The classes
+keep their registries as class attributes (Products.instances, Relations.instances_by_id, Products.reuse_matrix, ...)
+but these are read from and written to the current model, so the classmethods work unchanged against whichever model is
+active. Without an active model the default model is used, which is the old global behaviour.
+The current model is kept in a context variable, every thread starts in the default model and a model is made current
+with model.active() or model.run(...), so several models can be built and analysed side by side in one process.
+'''
+
+import contextvars
+import copy
+import functools
+from contextlib import contextmanager
+
+# {class name: class} of the classes whose registries belong to a model
+SCOPED_CLASSES = {}
+
+
+class ModelAttribute:
+    '''class attribute whose value is kept in the registries of the current model'''
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, cls, metaclass=None):
+        if cls is None:
+            return self
+        registry = Model.current().registry(cls.__name__)
+        if self.name not in registry:
+            raise AttributeError(f"type object '{cls.__name__}' has no attribute '{self.name}'")
+        return registry[self.name]
+
+    def __set__(self, cls, value):
+        Model.current().registry(cls.__name__)[self.name] = value
+
+
+class ModelScoped(type):
+    '''metaclass of the classes with registries, the class attributes named in model_attributes are kept per model and
+    their values in the class body are the values a new model starts with'''
+
+    def __new__(mcs, name, bases, namespace):
+        defaults = {attribute: namespace.pop(attribute) for attribute in namespace.get("model_attributes", ()) if attribute in namespace}
+        cls = super().__new__(mcs, name, bases, namespace)
+        cls.model_defaults = defaults
+        for attribute in defaults:
+            if not isinstance(mcs.__dict__.get(attribute), ModelAttribute):
+                setattr(mcs, attribute, ModelAttribute(attribute))
+        SCOPED_CLASSES[name] = cls
+        return cls
+
+    def indexed(cls, key):
+        '''the instance with key in the instances_by_id index of the class, None if there is none. Instances can be added
+        without going through __init__ (e.g. load_project), so the index is rebuilt once before a key is given up on'''
+        instance = cls.instances_by_id.get(key)
+        if instance is None:
+            cls.rebuild_index()
+            instance = cls.instances_by_id.get(key)
+        return instance
+
+
+class Model:
+    '''the registries of one analysis, {class name: {attribute: value}}. lcas are LCAh objects the model starts with,
+    e.g. the LCA library of another model that is shared read only'''
+
+    _current = contextvars.ContextVar("model")
+    default = None
+
+    def __init__(self, name: str = "model", lcas: list = None):
+        self.name = name
+        self.registries = {}
+        if lcas is not None:
+            self.registry("LCAh")["instances"] = list(lcas)
+
+    def __repr__(self) -> str:
+        return f"Model({self.name!r})"
+
+    @classmethod
+    def current(cls) -> "Model":
+        '''the active model of this context, the default model when none is active'''
+        return cls._current.get(cls.default)
+
+    def registry(self, name: str) -> dict:
+        '''the registries of the class name in this model, created from the class defaults the first time they are used'''
+        registry = self.registries.get(name)
+        if registry is None:
+            registry = self.registries[name] = copy.deepcopy(SCOPED_CLASSES[name].model_defaults)
+        return registry
+
+    @contextmanager
+    def active(self):
+        '''makes this model the current one inside the with block'''
+        token = self._current.set(self)
+        try:
+            yield self
+        finally:
+            self._current.reset(token)
+
+    def run(self, function, *args, **kwargs):
+        '''calls function in this model'''
+        with self.active():
+            return function(*args, **kwargs)
+
+    @property
+    def buildings(self) -> list:
+        return self.registry("Building")["instances"]
+
+    @property
+    def assemblies(self) -> list:
+        return self.registry("Assemblies")["instances"]
+
+    @property
+    def products(self) -> list:
+        return self.registry("Products")["instances"]
+
+    @property
+    def relations(self) -> list:
+        return self.registry("Relations")["instances"]
+
+    @property
+    def lcas(self) -> list:
+        return self.registry("LCAh")["instances"]
+
+
+Model.default = Model("default")
+
+
+def in_model(function):
+    '''runs function in the model passed as its model keyword, in the current model without it'''
+    @functools.wraps(function)
+    def wrapper(*args, model: Model = None, **kwargs):
+        if model is None:
+            return function(*args, **kwargs)
+        with model.active():
+            return function(*args, **kwargs)
+    return wrapper
@@ -4,8 +4,14 @@ import brightway2 as bw
 import logging
 import sys
 import networkx as nx
-from ..utils.helper import networkx_path_list, mc_por
-import random
+from ..utils.helper import networkx_path_list, merge_frozensets, mc_por_matrix
+from .impacts import add_impact_views
+from .activity_index import Resolver, ResolutionCache, resolve
+from .lca_engine import BatchLCA, monte_carlo_runs, shared_monte_carlo_runs
+from .lca_checkpoint import LCACheckpoint
+from .model import ModelScoped
+from .workbook import read_sheet, SheetIndex
+from .relation_table import RelationTable, column_property, flag_property, type_property, python_min, TYPES, UNSET, B2B, A2B, B2A, A2A
 import os
 
 RECYCLING_LOSS = 0 # not used anymore
@@ -23,7 +29,10 @@ logging.basicConfig(format='%(asctime)s %(message)s',
                     level=logging.ERROR)
 
 
-class Building:
+@add_impact_views
+class Building(metaclass=ModelScoped):
+    # kept per model, see Objects/model.py
+    model_attributes = ("instances",)
     instances = []
 
     def __init__(self, givenname: str = "default", givenID: str = "IDXXX", location: str = "Over the rainbow", yearBuilt: int = 1948, givenlife: int = 50, givenarea: str = "100 m2", giventype: str = "residential", assemblies: list = []):
@@ -41,7 +50,7 @@ class Building:
     def generate(cls, filename: str = "default") -> list:
         '''each row of the products df will become a class instance (object) in the products class'''
         try:
-            df = pd.read_excel(filename, "Buildings", engine="openpyxl")
+            df = read_sheet(filename, "Buildings")
         except FileNotFoundError:
             raise FileNotFoundError(
                 "the file you are trying to read from does not exist or you entered the wrong name")
@@ -75,8 +84,11 @@ class Building:
         cls.instances = []
 
 
-class Assemblies(object):
+@add_impact_views
+class Assemblies(object, metaclass=ModelScoped):
+    model_attributes = ("instances", "instances_by_id", "number_of_assemblies")
     instances = []
+    instances_by_id = {}
     number_of_assemblies = 0
 
     def __init__(self, assembly_name: str = "", assembly_type: str = "",
@@ -90,12 +102,21 @@ class Assemblies(object):
         self.products = []
         Assemblies.number_of_assemblies += 0
         self.__class__.instances.append(self)
+        self.__class__.instances_by_id.setdefault(self.id, self)
 
     @classmethod
     def delete_all_instances(cls):
         for instance in cls.instances:
             del instance
         cls.instances = []
+        cls.instances_by_id = {}
+
+    @classmethod
+    def rebuild_index(cls):
+        '''rebuilds the id index from the instances list, the first instance with a given id wins'''
+        cls.instances_by_id = {}
+        for instance in cls.instances:
+            cls.instances_by_id.setdefault(instance.id, instance)
 
     # @classmethod
     # def group_by_type(cls) -> dict:
@@ -113,10 +134,11 @@ class Assemblies(object):
     # get assenblies by id
     @classmethod
     def get_assembly_by_id(cls, id: str):
+        assembly = cls.indexed(id)
         #if assembly not found
-        if len([o for o in cls.instances if o.id == id]) == 0:
+        if assembly is None:
             raise ValueError("assembly not found")
-        return [o for o in cls.instances if o.id == id][0]
+        return assembly
 
     @property
     def brand_layer(self) -> str:
@@ -150,7 +172,7 @@ class Assemblies(object):
     def generate(cls, filename: str = "default") -> list:
         '''each row of the Assemblies df will become a class instance (object) in the Assemblies class'''
         try:
-            df = pd.read_excel(filename, "Assemblies", engine="openpyxl")
+            df = read_sheet(filename, "Assemblies")
         except FileNotFoundError:
             raise FileNotFoundError(
                 "the file you are trying to read from does not exist or you entered the wrong name")
@@ -198,10 +220,16 @@ class Assemblies(object):
         return all([relation.can_be_detached() for relation in to_check])
 
 
-class Products(object):
+@add_impact_views
+class Products(object, metaclass=ModelScoped):
+    model_attributes = ("instances", "instances_by_id", "number_of_products", "list_of_product_ids", "reuse_matrix", "reuse_matrix_settings")
     instances = []
+    instances_by_id = {}
     number_of_products = 0
     list_of_product_ids = []
+    # (products, years, mf_mcs) reuse draws, see sample_reuse
+    reuse_matrix = None
+    reuse_matrix_settings = None
 
     def __init__(self, name: str = "", name_in_lci: str = "", location: str = "", product_id: str = "",
                  part_of_assembly: str = "", base: bool = False,
@@ -237,6 +265,7 @@ class Products(object):
         self.years_of_replacements = years_of_replacements
         self.list_of_associated_activities = []
         self.__class__.instances.append(self)
+        self.__class__.instances_by_id.setdefault(self.id, self)
         Products.number_of_products += 1
         self.log = {
             "replacements": [],
@@ -257,28 +286,41 @@ class Products(object):
     @classmethod
     def get_product_by_id(cls, id):
         '''this method will return the product object by its id'''
+        product = cls.indexed(id)
         # if product is not found
-        if len([product for product in cls.instances if product.id == id]) == 0:
+        if product is None:
             raise Exception(f"the product {id} does not exist")
-        return [product for product in cls.instances if product.id == id][0]
+        return product
+
+    @classmethod
+    def rebuild_index(cls):
+        '''rebuilds the id index from the instances list, the first instance with a given id wins'''
+        cls.instances_by_id = {}
+        for instance in cls.instances:
+            cls.instances_by_id.setdefault(instance.id, instance)
 
     @classmethod
     def connect_to_assembly(cls):
         '''this method will connect the products to the assemblies'''
         if len(Assemblies.instances) == 0:
             raise Exception("you need to generate the assemblies first")
+        # products already attached to each assembly, so that membership checks are not a list scan
+        assembly_members = {}
         for product in cls.instances:
             try:
-                product.assembly = [
-                    assembly for assembly in Assemblies.instances if product.part_of_assembly == assembly.id][0]
-            except IndexError:
+                product.assembly = Assemblies.get_assembly_by_id(product.part_of_assembly)
+            except ValueError:
                 raise IndexError(
                     f"the assembly {product.part_of_assembly} does not exist for the product {product.id}")
             if not hasattr(product, "assembly"):
                 raise Exception(
                     f"the assembly {product.part_of_assembly} does not exist for the product {product.id}")
-            if product not in product.assembly.products:
+            members = assembly_members.get(product.assembly)
+            if members is None:
+                members = assembly_members[product.assembly] = set(product.assembly.products)
+            if product not in members:
                 product.assembly.products.append(product)
+                members.add(product)
 
     @classmethod
     def add_replacement_cycles(cls):
@@ -291,7 +333,7 @@ class Products(object):
     def generate(cls, filename: str = "default") -> list:
         '''each row of the products df will become a class instance (object) in the products class'''
         try:
-            df = pd.read_excel(filename, "Products", engine="openpyxl")
+            df = read_sheet(filename, "Products")
         except FileNotFoundError:
             raise FileNotFoundError(
                 "the file you are trying to read from does not exist or you entered the wrong name")
@@ -305,7 +347,7 @@ class Products(object):
     @classmethod
     def get_tl(cls, tl_mode: str = None):
         '''this will get the technicall life of the products'''
-        df_tl = pd.read_excel(f"{PARENT_DIR}/sen/tl.xlsx", sheet_name="Data")
+        df_tl = read_sheet(f"{PARENT_DIR}/sen/tl.xlsx", "Data")
         # check if table is empty
         if df_tl.empty:
             raise Exception("the table for technical life is empty")
@@ -387,56 +429,64 @@ class Products(object):
                 product.total_starting_amount = product.amount * product.assembly.amount
         print("updated total amount of products")
 
+    @classmethod
+    def relation_rows(cls, products: list, message: str) -> tuple:
+        '''(owners, rows) of the relations of every product in the relation table, owners is the position of the product in
+        products, in the order of the products and of their relations. A product without relations raises message'''
+        rows = []
+        for product in products:
+            if not hasattr(product, "relations"):
+                raise AttributeError(message.format(product=product))
+            rows.append(Relations.rows(product.relations))
+        owners = np.repeat(np.arange(len(rows)), [len(product_rows) for product_rows in rows])
+        return owners, (np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64))
+
     @classmethod
     def detachment_analysis(cls):
-        '''this will generate the detachment analysis for each product'''
-        for product in cls.instances:
-            if hasattr(product, "relations"):
-                pass
-            else:
-                raise AttributeError(
-                    f"Relations have not been generated yet to the product {product}.")
-            relations_can_be_detached: list[bool] = []
-            for relation in product.relations:
-                if not hasattr(relation, "can_be_detached"):
-                    raise AttributeError(
-                        "Relations detachment analysis have not been generated yet. Please run the detachment analysis method first.")
-                # if relation is not connection then skip
-                if relation.is_connection is False or relation.is_connection == 0:
-                    continue
-                elif relation.product1object.base and relation.product2object.base:
-                    relation.type = "B2B"
-                    relations_can_be_detached.append(
-                        relation.can_be_detached)
-                elif not relation.product1object.base and relation.product2object.base and not product.base:
-                    relation.type = "A2B"
-                    relations_can_be_detached.append(
-                        relation.can_be_detached)
-                elif relation.product1object.base and not relation.product2object.base and not product.base:
-                    relation.type = "B2A"
-                    relations_can_be_detached.append(
-                        relation.can_be_detached)
-                else:
-                    relation.type = "A2A"
-                    relations_can_be_detached.append(
-                        relation.can_be_detached)
-                if relation.product1object.assembly.id != relation.product2object.assembly.id:
-                    relation.is_external = True
-            if all(relations_can_be_detached):
-                product.can_be_detached = True
-            else:
-                product.can_be_detached = False
+        '''this will generate the detachment analysis for each product, the types and external flags of the relations and
+        the detachability of the products are computed over the relation table'''
+        table = Relations.table
+        owners, rows = cls.relation_rows(cls.instances, "Relations have not been generated yet to the product {product}.")
+        if (table.can_be_detached[rows] == UNSET).any():
+            raise AttributeError(
+                "Relations detachment analysis have not been generated yet. Please run the detachment analysis method first.")
+        # relations that are not connections are skipped
+        connection = table.is_connection[rows]
+        owners, rows = owners[connection], rows[connection]
+        base = np.array([bool(product.base) for product in table.products], dtype=bool)
+        base1, base2 = base[table.product1[rows]], base[table.product2[rows]]
+        owner_base = np.array([bool(product.base) for product in cls.instances], dtype=bool)[owners]
+        types = np.full(len(rows), A2A, dtype=np.int8)
+        types[base1 & base2] = B2B
+        types[~base1 & base2 & ~owner_base] = A2B
+        types[base1 & ~base2 & ~owner_base] = B2A
+        # a relation is walked from both of its products, the type given by the last one is kept
+        last = len(rows) - 1 - np.unique(rows[::-1], return_index=True)[1]
+        table.type[rows[last]] = types[last]
+        positions = np.unique(np.concatenate([table.product1[rows], table.product2[rows]]))
+        assembly_codes = {}
+        assembly = np.full(len(table.products), -1)
+        for position in positions:
+            assembly[position] = assembly_codes.setdefault(table.products[position].assembly.id, len(assembly_codes))
+        external = assembly[table.product1[rows]] != assembly[table.product2[rows]]
+        table.is_external[rows[external]] = True
+        # a product can be detached when none of its connections is blocked
+        blocked = np.bincount(owners[table.can_be_detached[rows] == 0], minlength=len(cls.instances))
+        for product, count in zip(cls.instances, blocked):
+            product.can_be_detached = bool(count == 0)
     
         
     def get_min_rpc(self, typ: str, weights_list: list = [1, 1, 1, 1]) -> float:
         '''this will returns the min rpc for a given product given the type of relation and the weights based on importance'''
         assert hasattr(self, "relations"), f"Relations have not been generated yet. {self.id}"
-        calc_ca = [relation.ca for relation in self.relations if relation.is_connection and relation.type in typ]
-        calc_ct = [relation.ct for relation in self.relations if relation.is_connection and relation.type in typ]
-        calc_fc = [relation.fc for relation in self.relations if relation.is_connection and relation.type in typ]
-        calc_cr = [relation.cr for relation in self.relations if relation.is_connection and relation.type in typ]
-
-        d = np.column_stack([calc_ca, calc_ct, calc_fc, calc_cr])
+        table = Relations.table
+        rows = Relations.rows(self.relations)
+        rows = rows[table.is_connection[rows]]
+        if (table.type[rows] == 0).any():
+            raise AttributeError("'Relations' object has no attribute 'type'")
+        rows = rows[np.isin(table.type[rows], [code for code, name in enumerate(TYPES) if code and name in typ])]
+
+        d = np.column_stack([table.ca[rows], table.ct[rows], table.fc[rows], table.cr[rows]])
         if len(d) > 0:
             p = np.average(d, axis=1, keepdims=True, weights=weights_list)
             min_rpc = np.min(p)
@@ -448,21 +498,34 @@ class Products(object):
         '''this will generate the min ddf for given product'''
         # assert that self has atr relations
         assert hasattr(self, "relations"), f"Relations have not been generated yet. {self.id}"
-        calc_ca = min([relation.ca for relation in self.relations])
-        calc_ct = min([relation.ct for relation in self.relations])
-        calc_fc = min([relation.fc for relation in self.relations])
-        calc_cr = min([relation.cr for relation in self.relations])
-        return np.array([calc_ca, calc_ct, calc_fc, calc_cr])
+        table = Relations.table
+        rows = Relations.rows(self.relations)
+        if len(rows) == 0:
+            raise ValueError("min() arg is an empty sequence")
+        return python_min(np.column_stack([table.ca[rows], table.ct[rows], table.fc[rows], table.cr[rows]]))
 
 
     @classmethod
     def generate_rpc(cls):
-        '''this will generate the rpc for each product'''
-        for self in cls.instances:
-            if self.base:
-                self.rpc = self.get_min_rpc(typ=["B2B"])
-            else:
-                self.rpc = self.get_min_rpc(typ=["A2A", "A2B", "B2A"])
+        '''this will generate the rpc for each product, the min rpc of the connections of the products (B2B for base
+        products, the others for the rest) computed over the relation table, see get_min_rpc'''
+        for product in cls.instances:
+            assert hasattr(product, "relations"), f"Relations have not been generated yet. {product.id}"
+        table = Relations.table
+        owners, rows = cls.relation_rows(cls.instances, "Relations have not been generated yet to the product {product}.")
+        connection = table.is_connection[rows]
+        owners, rows = owners[connection], rows[connection]
+        if (table.type[rows] == 0).any():
+            raise AttributeError("'Relations' object has no attribute 'type'")
+        owner_base = np.array([bool(product.base) for product in cls.instances], dtype=bool)[owners]
+        counted = np.where(owner_base, table.type[rows] == B2B, table.type[rows] != B2B)
+        owners, rows = owners[counted], rows[counted]
+        rpc = np.average(table.indicators(), axis=1, weights=[1, 1, 1, 1])
+        minimum = np.full(len(cls.instances), np.inf)
+        np.minimum.at(minimum, owners, rpc[rows])
+        found = np.bincount(owners, minlength=len(cls.instances)) > 0
+        for product, min_rpc, has_connections in zip(cls.instances, minimum, found):
+            product.rpc = min_rpc if has_connections else 1.0
         print("product rpc calculated!")
     
     @classmethod
@@ -478,15 +541,13 @@ class Products(object):
                 if relation.is_connection:
                     continue
                 else:
-                    relation.ca = relation.product2object.get_min_ddf()[0]
-                    relation.ct = relation.product2object.get_min_ddf()[1]
-                    relation.fc = relation.product2object.get_min_ddf()[2]
-                    relation.cr = relation.product2object.get_min_ddf()[3]
+                    relation.ca, relation.ct, relation.fc, relation.cr = relation.product2object.get_min_ddf()
                     
                                     
     @classmethod
-    def update_years_of_replacements_based_on_detachability(cls):
+    def update_years_of_replacements_based_on_detachability(cls, engine: str = "topological"):
         '''this will update the years of replacements based on the detachability of the products and the relations
+        engine: "topological" walks the disassembly sequence graph once, "bfs" runs a bfs for every product (the previous implementation, kept for reference)
         '''
         network_data = cls.generateDirectedGraph()
         for product in cls.instances:
@@ -496,6 +557,22 @@ class Products(object):
             product.disassembly_years_log = []
             # initialize the log of the updates
             # product.updates_log = []
+        if engine == "bfs":
+            cls.propagate_replacements_bfs(network_data)
+        elif engine == "topological":
+            cls.propagate_replacements_topological(network_data)
+        else:
+            raise ValueError(f"unknown engine {engine}, use 'topological' or 'bfs'")
+        for product in cls.instances:
+            product.disassembly_years = list(product.disassembly_years)
+            product.disassembly_years.sort()
+            # check if there is any overlap between product.disassembly_years and product.years_of_replacements_updated and remove the years of replacements from reuse years
+            replacement_years = set(product.years_of_replacements_updated)
+            product.disassembly_years = [year for year in product.disassembly_years if year not in replacement_years]
+
+    @classmethod
+    def propagate_replacements_bfs(cls, network_data: nx.DiGraph):
+        '''pushes the replacement years of every product to everything downstream of it, one bfs per product'''
         for product in cls.instances:
             # If the product will not be replaced why check anything but need to be careful because this might change after the loop, thus the list on top
             if len(product.years_of_replacements_updated) == 0:
@@ -517,26 +594,116 @@ class Products(object):
                 else:
                     additional_years = [year for year in product.years_of_replacements_updated if year not in in_the_way_product.years_of_replacements_updated]
                     in_the_way_product.years_of_replacements_updated = in_the_way_product.years_of_replacements_updated + additional_years
-        for product in cls.instances:
-            product.disassembly_years = list(product.disassembly_years)
-            product.disassembly_years.sort()
-            # check if there is any overlap between product.disassembly_years and product.years_of_replacements_updated and remove the years of replacements from reuse years
-            product.disassembly_years = [year for year in product.disassembly_years if year not in product.years_of_replacements_updated]
+
+    @classmethod
+    def propagate_replacements_topological(cls, network_data: nx.DiGraph):
+        '''pushes the replacement years of every product to everything downstream of it in a single topological pass.
+        Every product receives the years of all of its ancestors, if it can be detached they become disassembly years otherwise
+        the new ones are added to its updated years of replacements. Cycles are collapsed into one node first since every
+        member of a cycle is an ancestor of the others.
+        The result is the same as the bfs engine (years, their order and the log) on an acyclic graph whose products are listed
+        in a topological order. Otherwise the bfs engine depends on the order of the products, a product pushes the years it
+        has at its turn, so only the sets of years and the disassembly years are the same: the order of the added years can
+        differ and the log here shows the final years of the replaced products.'''
+        products_by_node = {}
+        position = {}
+        for i, product in enumerate(cls.instances):
+            products_by_node.setdefault(product.id, []).append(product)
+            position.setdefault(product.id, i)
+        condensed = nx.condensation(network_data)
+        # years and replaced products leaving every collapsed node, shared between nodes whenever nothing is added
+        out_years = {}
+        out_sources = {}
+        # the replaced products that cause the disassembly of a product, used for the log
+        log_sources = {}
+        for component in nx.topological_sort(condensed):
+            members = condensed.nodes[component]["members"]
+            predecessors = list(condensed.predecessors(component))
+            in_years = merge_frozensets(out_years[pred] for pred in predecessors)
+            in_sources = merge_frozensets(out_sources[pred] for pred in predecessors)
+            own_years = frozenset(
+                year for node in members for product in products_by_node.get(node, []) for year in product.years_of_replacements)
+            received_years = in_years | own_years if len(members) > 1 else in_years
+            # the members that will have years of replacements once this node is done
+            replaced_members = frozenset(node for node in members if node in products_by_node and (
+                any(len(product.years_of_replacements_updated) > 0 for product in products_by_node[node])
+                or (received_years and not products_by_node[node][0].can_be_detached)))
+            for node in members:
+                if node not in products_by_node:
+                    if received_years:
+                        # raises the usual error for a node that is not a product
+                        cls.get_product_by_id(node)
+                    continue
+                if not received_years:
+                    continue
+                product = products_by_node[node][0]
+                sources = in_sources | (replaced_members - {node}) if len(members) > 1 else in_sources
+                if product.can_be_detached:
+                    product.disassembly_years.update(received_years)
+                    log_sources[node] = sources
+                    continue
+                additional_years = set(received_years.difference(product.years_of_replacements_updated))
+                if not additional_years:
+                    continue
+                # same order as pushing the years of every ancestor one after the other
+                appended_years = []
+                for source in sorted(sources, key=position.get):
+                    for year in products_by_node[source][0].years_of_replacements_updated:
+                        if year in additional_years:
+                            appended_years.append(year)
+                            additional_years.discard(year)
+                    if not additional_years:
+                        break
+                appended_years.extend(sorted(additional_years))
+                product.years_of_replacements_updated = product.years_of_replacements_updated + appended_years
+            out_years[component] = merge_frozensets([in_years, own_years])
+            out_sources[component] = merge_frozensets([in_sources, replaced_members])
+        # the log is written at the end so that it shows the final years of the replaced products
+        for node, sources in log_sources.items():
+            product = products_by_node[node][0]
+            for source in sorted(sources, key=position.get):
+                replaced_product = products_by_node[source][0]
+                product.disassembly_years_log.append(
+                    f"{replaced_product.id} will be replaced at {replaced_product.years_of_replacements_updated} and thus {product.id} will be disassembled")
+
     @classmethod
     def connect_products_to_relations(cls):
         '''this will connect the relations objects with the products objects'''
         for product in cls.instances:
-            product.relations = [relation for relation in Relations.instances if relation.product1object.id ==
-                                 product.id or relation.product2object.id == product.id]
+            product.relations = Relations.get_relations_by_product_id(product.id)
             if len(product.relations) == 0:
                 logging.error(
                     f"Possible error product {product.id} has no relations!")
         print("relations connected with products!")
 
     @classmethod
-    def material_flow_and_replacements(cls, mf_mcs: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362)):
+    def sample_reuse(cls, mf_mcs: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362), seed=None):
+        '''draws the reuse matrix of all products in one go, it has the shape (products, years, mf_mcs) where 1 means reused.
+        Column k of the years axis belongs to the k-th disassembly year of the product and the last column to the end of life
+        of the building, each product gets a view of its own row as product.reuse_draws'''
+        n_years = max([len(product.disassembly_years) for product in cls.instances], default=0) + 1
+        cls.reuse_matrix = mc_por_matrix(
+            [product.rpc for product in cls.instances], n_years=n_years, num_simulations=mf_mcs, constants=constants, seed=seed)
+        cls.reuse_matrix_settings = (mf_mcs, tuple(constants))
+        for i, product in enumerate(cls.instances):
+            product.reuse_draws = cls.reuse_matrix[i]
+
+    @classmethod
+    def get_reuse_matrix(cls, mf_mcs: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362), seed=None):
+        '''returns the reuse matrix drawn by the material flow, rows in the order of the instances. If it was drawn with other
+        settings (or not at all) a matrix with these settings is drawn from seed and returned, the draws of the material flow
+        (reuse_matrix and product.reuse_draws) are left as they are'''
+        if cls.reuse_matrix is not None and cls.reuse_matrix_settings == (mf_mcs, tuple(constants)) and len(cls.reuse_matrix) == len(cls.instances):
+            return cls.reuse_matrix
+        logging.error(f"the material flow drew the reuse matrix with {cls.reuse_matrix_settings}, drawing another one with {(mf_mcs, tuple(constants))}")
+        n_years = max([len(product.disassembly_years) for product in cls.instances], default=0) + 1
+        return mc_por_matrix([product.rpc for product in cls.instances], n_years=n_years, num_simulations=mf_mcs, constants=constants, seed=seed)
+
+    @classmethod
+    def material_flow_and_replacements(cls, mf_mcs: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362), seed=None):
         '''this will generate the replaced amount for each product after the upstreams are considered in terms of if they can be detached or not so if not then the total amount will be added
         if it can be detached then it will add to the (reuse years) which is what we use here to calculate the material flow'''
+        cls.sample_reuse(mf_mcs=mf_mcs, constants=constants, seed=seed)
         for product in cls.instances:
             product.material_flow = {0: product.total_starting_amount}
             product.material_flow_updated = {0: product.total_starting_amount}
@@ -554,9 +721,9 @@ class Products(object):
                 material_flow = {f"{year}": product.total_starting_amount}
                 product.material_flow_updated.update(material_flow)
                 product.replaced_amount_updated = product.replaced_amount_updated + product.total_starting_amount
-            for year in sorted(product.disassembly_years): # replacements from disassembly cycles
+            for k, year in enumerate(sorted(product.disassembly_years)): # replacements from disassembly cycles
                 if year not in product.material_flow_updated:
-                    amount_added_on_reuse_array = mc_por(product, mf_mcs, constants) # previously reuse_prob_array = mc_por(product)
+                    amount_added_on_reuse_array = product.reuse_draws[k] # previously reuse_prob_array = mc_por(product)
                     one_reuse_product_amount_array = amount_added_on_reuse_array * product.total_starting_amount
                     one_reuse_product_median_amount = np.median(one_reuse_product_amount_array)
                     material_flow = {f"{year}": one_reuse_product_median_amount}
@@ -580,41 +747,42 @@ class Products(object):
         '''this will add all the eol information to the products'''
         # read the eol information from the excel file
         # print cwd
-        df_eol = pd.read_excel(f"{PARENT_DIR}/sen/sen-eol.xlsx")
+        df_eol = read_sheet(f"{PARENT_DIR}/sen/sen-eol.xlsx")
         # df_eol = pd.read_excel(f"..sen/sen-eol.xlsx")
+        # the eol rows by name, the information of an eol type is read once and shared by its products
+        eol_index = SheetIndex(df_eol, "Name")
+        eol_info = {}
         # add the eol information to the products
         for product in cls.instances:
-            try:
-                product.sorting_type = df_eol.loc[df_eol['Name'] ==
-                                                  product.eol_type]["Sorting_process_module_C3"].item()
-                product.disposal = tuple(df_eol.loc[df_eol['Name'] ==
-                                                    product.eol_type]["Disposal_module_C4"].item().split(";"))
-                product.replacing_lci = tuple(df_eol.loc[df_eol['Name'] ==
-                                                         product.eol_type]["EoL_module_D2_replacing"].item().split(";"))
-                product.recycling_lci = tuple(df_eol.loc[df_eol['Name'] ==
-                                                         product.eol_type]["EoL_module_D2_recycling"].item().split(";"))
-                product.Incineration_lci = tuple(df_eol.loc[df_eol['Name'] ==
-                                                            product.eol_type]["Incineration_dataset"].item().split(";"))
-                product.lhv = df_eol.loc[df_eol['Name'] ==
-                                         product.eol_type]["EoL_module_D3_LHV"].item()
-                product.landfill_r = df_eol.loc[df_eol['Name']
-                                                == product.eol_type]["landfilling"].item()
-                product.incineration_r = df_eol.loc[df_eol['Name']
-                                                    == product.eol_type]["incineration"].item()
-                product.recycling_r = df_eol.loc[df_eol['Name']
-                                                 == product.eol_type]["recycling"].item()
-                product.eol_transport_distance = df_eol.loc[df_eol['Name']
-                                                            == product.eol_type]["transport distance"].item()
-                product.eol_transport_type = "transport, freight, lorry 16-32 metric ton, EURO5"
-            except ValueError:
-                raise ValueError(
-                    f"Product: {product}, has something wrong with eol type")
+            if product.eol_type not in eol_info:
+                name = product.eol_type
+                try:
+                    eol_info[name] = dict(
+                        sorting_type=eol_index.item(name, "Sorting_process_module_C3"),
+                        disposal=tuple(eol_index.item(name, "Disposal_module_C4").split(";")),
+                        replacing_lci=tuple(eol_index.item(name, "EoL_module_D2_replacing").split(";")),
+                        recycling_lci=tuple(eol_index.item(name, "EoL_module_D2_recycling").split(";")),
+                        Incineration_lci=tuple(eol_index.item(name, "Incineration_dataset").split(";")),
+                        lhv=eol_index.item(name, "EoL_module_D3_LHV"),
+                        landfill_r=eol_index.item(name, "landfilling"),
+                        incineration_r=eol_index.item(name, "incineration"),
+                        recycling_r=eol_index.item(name, "recycling"),
+                        eol_transport_distance=eol_index.item(name, "transport distance"),
+                        eol_transport_type="transport, freight, lorry 16-32 metric ton, EURO5")
+                except ValueError:
+                    raise ValueError(
+                        f"Product: {product}, has something wrong with eol type")
+            for attribute, value in eol_info[product.eol_type].items():
+                setattr(product, attribute, value)
 
     @classmethod
     def delete_all_instances(cls):
         for instance in cls.instances:
             del instance
         cls.instances = []
+        cls.instances_by_id = {}
+        cls.reuse_matrix = None
+        cls.reuse_matrix_settings = None
 
     @classmethod
     def clean_up(cls):
@@ -704,48 +872,120 @@ class Products(object):
                     
 
 
-class Relations(object):
+class Relations(object, metaclass=ModelScoped):
+    model_attributes = ("instances", "instances_by_id", "instances_by_product", "list_of_relations", "df", "table")
     instances = []
+    instances_by_id = {}
+    instances_by_product = {}
     list_of_relations = []
     df = pd.DataFrame(columns=["Connections"])
+    # the indicators and flags of the relations, see Objects/relation_table.py
+    table = RelationTable()
+
+    ct = column_property("ct")
+    ca = column_property("ca")
+    cr = column_property("cr")
+    fc = column_property("fc")
+    is_connection = column_property("is_connection")
+    type = type_property()
+    can_be_detached = flag_property("can_be_detached")
+    is_external = flag_property("is_external")
 
     def __init__(self, t: tuple = (), m: float = 1.0, is_connection: bool = True):
         self.t = t
         self.product1 = self.t[0]
         self.product2 = self.t[1]
-        self.product1object = [
-            p for p in Products.instances if p.id == self.t[0]][0]
-        self.product2object = [
-            p for p in Products.instances if p.id == self.t[1]][0]
+        self.product1object = Products.get_product_by_id(self.t[0])
+        self.product2object = Products.get_product_by_id(self.t[1])
         self.__class__.instances.append(self)
+        self.__class__.instances_by_id.setdefault(self.t, self)
+        self.__class__.add_to_adjacency_index(self)
         self.__class__.list_of_relations.append(self.t)
-        self.ct = m
-        self.ca = m
-        self.cr = m
-        self.fc = m
-        # self.rpc = (self.ca + self.cr + self.fc + self.ct) / 4
-        self.is_connection = is_connection
+        # the indicators (all m) and is_connection are kept in the table of the model
+        self._table = self.__class__.table
+        self._row = self._table.append(self.product1object, self.product2object, m=m, is_connection=is_connection)
 
     def __str__(self) -> str:
         return f"{self.t}"
+
+    def slot(self) -> tuple:
+        '''the table and row of the relation, a relation that still holds its attributes is moved into the table first'''
+        table = self.__dict__.get("_table")
+        if table is None:
+            table = self.__class__.table
+            table.adopt(self)
+        return table, self._row
     
     @property
     def rpc(self):
         return (self.ca + self.cr + self.fc + self.ct) / 4
 
+    @classmethod
+    def rows(cls, relations: list) -> np.ndarray:
+        '''the rows of the relations in the table of the model, relations of another table are moved into it'''
+        table = cls.table
+        rows = np.empty(len(relations), dtype=np.int64)
+        for i, relation in enumerate(relations):
+            if relation.__dict__.get("_table") is not table:
+                table.adopt(relation)
+            rows[i] = relation._row
+        return rows
+
     @classmethod
     def delete_all_instances(cls):
         for instance in cls.instances:
             del instance
         cls.instances = []
+        cls.instances_by_id = {}
+        cls.instances_by_product = {}
+        cls.table = RelationTable()
+
+    @classmethod
+    def attach_table(cls):
+        '''makes the table of relations loaded from a store the table of the model, relations loaded from a pickle of an
+        older version or from another table are moved into it'''
+        tables = {id(instance.__dict__.get("_table")): instance.__dict__.get("_table") for instance in cls.instances}
+        if len(tables) == 1 and len(cls.table) == 0 and None not in tables.values():
+            cls.table = next(iter(tables.values()))
+        cls.table.ensure_writable()
+        cls.rows(cls.instances)
+
+    @classmethod
+    def rebuild_index(cls):
+        '''rebuilds the t index and the adjacency index from the instances list and attaches the relations to the table
+        of the model. As in __init__ the first instance with a given t wins in the t index and every relation is in the
+        adjacency index, also one with the t of another; only an instance listed twice is indexed once'''
+        cls.attach_table()
+        cls.instances_by_id = {}
+        cls.instances_by_product = {}
+        indexed = set()
+        for instance in cls.instances:
+            if id(instance) in indexed:
+                continue
+            indexed.add(id(instance))
+            cls.instances_by_id.setdefault(instance.t, instance)
+            cls.add_to_adjacency_index(instance)
+
+    @classmethod
+    def add_to_adjacency_index(cls, relation):
+        '''buckets the relation under both of its products'''
+        cls.instances_by_product.setdefault(relation.product1, []).append(relation)
+        if relation.product2 != relation.product1:
+            cls.instances_by_product.setdefault(relation.product2, []).append(relation)
+
+    @classmethod
+    def get_relations_by_product_id(cls, id) -> list:
+        '''returns a new list of the relations where the product is either product1 or product2'''
+        return list(cls.instances_by_product.get(id, []))
     
     @classmethod
     def get_relation_by_id(cls, t):
         '''this method will return the relation object by its t value (product1, product2))'''
-        # if product is not found
-        if len([relation for relation in cls.instances if relation.t == t]) == 0:
-            raise Exception(f"the product {id} does not exist")
-        return [relation for relation in cls.instances if relation.t == t][0]
+        relation = cls.indexed(t)
+        # if relation is not found
+        if relation is None:
+            raise Exception(f"the relation {t} does not exist")
+        return relation
 
     def reset_indicators(self):
         self.ct = 1.00
@@ -763,25 +1003,9 @@ class Relations(object):
 
     @classmethod
     def detachment_analysis(cls):
-        for obj in cls.instances:
-            # make sure that relation has is connection atrbute
-            assert hasattr(obj, "is_connection"), 'Relations must have is_connection attribute'
-            # if dependency is structural consider all indicators
-            # print(obj.t, obj.is_connection)
-            if obj.is_connection is True or obj.is_connection == 1:
-                if obj.ct < 0.2 or obj.ca < 0.2 or obj.fc <= 0.1 or obj.cr <= 0.1:
-                    obj.can_be_detached = False
-                else:
-                    obj.can_be_detached = True
-            else:
-                obj.can_be_detached = True
-            # if obj.ct < 0.2 or obj.ca < 0.2 or obj.fc <= 0.1 and obj.cr <= 0.1 and obj.is_connection is True:
-            #     obj.can_be_detached = False
-            # elif obj.is_connection is False or obj.is_connection == 0:
-            #     obj.can_be_detached = True
-            # else:
-            #     print('possible error in is_connection attribute')
-            #     obj.can_be_detached = True
+        '''sets can_be_detached of every relation from its indicators in one pass over the table, see RelationTable.detachable'''
+        rows = cls.rows(cls.instances)
+        cls.table.can_be_detached[rows] = cls.table.detachable()[rows]
 
     @classmethod
     def composite_products(cls):
@@ -838,8 +1062,7 @@ class Relations(object):
     def output_relations_dataframe_to_excel(df: pd.DataFrame, filename: str = "default", write_output=False):
         '''this will write the relations dataframe to excel'''
         pd_to_print = df
-        pd_read = pd.read_excel(
-            filename, sheet_name="Relations", engine="openpyxl")
+        pd_read = read_sheet(filename, "Relations")
         df_toprint = pd.concat([pd_read, pd_to_print])
         df_toprint = df_toprint.drop_duplicates(
             subset=['Relation_id'], keep="last")
@@ -878,52 +1101,55 @@ class Relations(object):
                 "To update connections excel file, close it first {}".format(e))
 
     @classmethod
-    def update_connections_to_relations_objects(cls, filename: str = "default", mode: str = "user input", assembly: Assemblies = None):
+    def update_connections_to_relations_objects(cls, filename: str = "default", mode: str = "user input", assembly: Assemblies = None, seed=None):
         '''this will update the relations objects with the connections based on the excel file
-        mode can be "user input" or "keep"'''
+        mode can be "user input" or "keep", seed (int, SeedSequence or numpy Generator) is used by the random modes'''
+        rng = np.random.default_rng(seed)
         if not mode == "keep":
             ca = [0.1, 0.4, 0.8, 1]
             ct = [0.1, 0.2, 0.6, 0.8, 1]
             cr = [0.1, 0.4, 1]
             fc = [0.1, 0.2, 0.8, 1]
-            df = pd.read_excel(filename, "Relations", engine="openpyxl")
             if mode == "user input":
-                for relation in cls.instances:
-                    try:
-                        relation.ct = float(
-                            df.loc[df["Relation_id_as_tuple"] == str(relation.t)]["Connection_type"])
-                    except (TypeError, ValueError) as e:
-                        print("Error has occurred check log files")
-                        logging.error(
-                            f"input error in connection: {relation.t}")
-                        sys.exit(1)
-                    relation.ca = float(
-                        df.loc[df["Relation_id_as_tuple"] == str(relation.t)]["Connection_access"])
-                    relation.cr = float(
-                        df.loc[df["Relation_id_as_tuple"] == str(relation.t)]["Crossings"])
-                    relation.fc = float(
-                        df.loc[df["Relation_id_as_tuple"] == str(relation.t)]["Form_containment"])
-                    if relation.ca == np.nan or relation.cr == np.nan or relation.fc == np.nan or relation.is_connection == np.nan:
-                        logging.error(
-                            f"Relation: {relation.t} is missing a value, check it")
+                sheet = SheetIndex(read_sheet(filename, "Relations"), "Relation_id_as_tuple")
+                keys = [str(relation.t) for relation in cls.instances]
+                try:
+                    connection_type = sheet.floats(keys, "Connection_type")
+                except (TypeError, ValueError):
+                    print("Error has occurred check log files")
+                    for relation, key in zip(cls.instances, keys):
+                        try:
+                            sheet.float(key, "Connection_type")
+                        except (TypeError, ValueError):
+                            logging.error(
+                                f"input error in connection: {relation.t}")
+                    sys.exit(1)
+                table, rows = cls.table, cls.rows(cls.instances)
+                table.ct[rows] = connection_type
+                table.ca[rows] = sheet.floats(keys, "Connection_access")
+                table.cr[rows] = sheet.floats(keys, "Crossings")
+                table.fc[rows] = sheet.floats(keys, "Form_containment")
+                for position in np.flatnonzero(np.isnan(table.ca[rows]) | np.isnan(table.cr[rows]) | np.isnan(table.fc[rows])):
+                    logging.error(
+                        f"Relation: {cls.instances[position].t} is missing a value, check it")
             if mode == "low_product":
                 for relation in cls.instances:
-                    relation.ct = random.choice(ct[:2])
-                    relation.ca = random.choice(ca[:2])
-                    relation.cr = random.choice(cr[:2])
-                    relation.fc = random.choice(fc[:2])
+                    relation.ct = rng.choice(ct[:2])
+                    relation.ca = rng.choice(ca[:2])
+                    relation.cr = rng.choice(cr[:2])
+                    relation.fc = rng.choice(fc[:2])
             if mode == "high_product":
                 for relation in cls.instances:
-                    relation.ct = random.choice(ct[3:])
-                    relation.ca = random.choice(ca[3:])
-                    relation.cr = random.choice(cr[2:])
-                    relation.fc = random.choice(fc[3:])
+                    relation.ct = rng.choice(ct[3:])
+                    relation.ca = rng.choice(ca[3:])
+                    relation.cr = rng.choice(cr[2:])
+                    relation.fc = rng.choice(fc[3:])
             if mode == "rng_product":
                 for relation in cls.instances:
-                    relation.ct = random.choice(ct)
-                    relation.ca = random.choice(ca)
-                    relation.cr = random.choice(cr)
-                    relation.fc = random.choice(fc)
+                    relation.ct = rng.choice(ct)
+                    relation.ca = rng.choice(ca)
+                    relation.cr = rng.choice(cr)
+                    relation.fc = rng.choice(fc)
             if mode == "lowest_product":
                 for relation in cls.instances:
                     relation.ct = 0.1
@@ -932,17 +1158,22 @@ class Relations(object):
                     relation.fc = 0.1
         cls.relations_add_is_connection(filename)
 
-    def mc_for_assemblies(assemblies: list[str], mode: str):
+    def mc_for_assemblies(assemblies: list[str], mode: str, seed=None):
+        '''sets the indicators of the connections of the given assemblies based on the mode, seed is used by the random modes'''
+        rng = np.random.default_rng(seed)
         ca = [0.1, 0.4, 0.8, 1]
         ct = [0.1, 0.2, 0.6, 0.8, 1]
         cr = [0.1, 0.4, 1]
         fc = [0.1, 0.2, 0.8, 1]
         # find assemblies in Assemblies.instances by matching id
-        my_assemblies = [assembly for assembly in Assemblies.instances if assembly.id in assemblies]
+        assembly_ids = set(assemblies)
+        my_assemblies = [assembly for assembly in Assemblies.instances if assembly.id in assembly_ids]
+        # a relation between two products of the chosen assemblies is only drawn once
+        seen = set()
         for assembly in my_assemblies:
-            my_products = [product for product in Products.instances if product.assembly.id == assembly.id]
-            for product in my_products:
-                my_rel = [relation for relation in Relations.instances if relation.product1object.id == product.id or relation.product2object.id == product.id]
+            for product in assembly.products:
+                my_rel = [relation for relation in Relations.instances_by_product.get(product.id, []) if relation not in seen]
+                seen.update(my_rel)
                 for relation in my_rel:
                     # if relation is not connection skip
                     if relation.is_connection is False:
@@ -958,35 +1189,35 @@ class Relations(object):
                         relation.cr = 1
                         relation.fc = 1
                     elif mode == "low_assembly":
-                        relation.ct = random.choice(ct[:2])
-                        relation.ca = random.choice(ca[:2])
-                        relation.cr = random.choice(cr[:2])
-                        relation.fc = random.choice(fc[:2])
+                        relation.ct = rng.choice(ct[:2])
+                        relation.ca = rng.choice(ca[:2])
+                        relation.cr = rng.choice(cr[:2])
+                        relation.fc = rng.choice(fc[:2])
                     elif mode == "high_assembly":
-                        relation.ct = random.choice(ct[3:])
-                        relation.ca = random.choice(ca[3:])
-                        relation.cr = random.choice(cr[2:])
-                        relation.fc = random.choice(fc[3:])
+                        relation.ct = rng.choice(ct[3:])
+                        relation.ca = rng.choice(ca[3:])
+                        relation.cr = rng.choice(cr[2:])
+                        relation.fc = rng.choice(fc[3:])
                     elif mode == "rng_assembly":
-                        relation.ct = random.choice(ct)
-                        relation.ca = random.choice(ca)
-                        relation.cr = random.choice(cr)
-                        relation.fc = random.choice(fc)
+                        relation.ct = rng.choice(ct)
+                        relation.ca = rng.choice(ca)
+                        relation.cr = rng.choice(cr)
+                        relation.fc = rng.choice(fc)
 
     @classmethod
     def relations_add_is_connection(cls, filename: str = "default"):
-        df = pd.read_excel(filename, "Relations", engine="openpyxl")
-        for relation in cls.instances:
-            relation.is_connection = bool(df.loc[df["Relation_id_as_tuple"] == str(
-                relation.t)]["Is_connection"].values[0])
-            if not relation.is_connection:
-                relation.ct = 1
-                relation.ca = 1
-                relation.cr = 1
-                relation.fc = 1
-
-
-class LCAh:
+        sheet = SheetIndex(read_sheet(filename, "Relations"), "Relation_id_as_tuple")
+        # truth of every value like bool(), a missing (nan) Is_connection is a connection
+        is_connection = sheet.firsts([str(relation.t) for relation in cls.instances], "Is_connection").astype(bool)
+        table, rows = cls.table, cls.rows(cls.instances)
+        table.is_connection[rows] = is_connection
+        # relations that are not connections have all indicators 1
+        other = rows[~is_connection]
+        table.ct[other] = table.ca[other] = table.cr[other] = table.fc[other] = 1
+
+
+class LCAh(metaclass=ModelScoped):
+    model_attributes = ("instances",)
     instances = []
 
     def __init__(self) -> None:
@@ -996,6 +1227,11 @@ class LCAh:
         self.activityLib = {}
         self.method = ""
         self.mclcaLib = {}
+        # Monte Carlo iterations per block, blocks done per activity and the seed and sampling of the blocks
+        self.mc_plan = []
+        self.mc_done = {}
+        self.mc_seed = None
+        self.mc_sampling = "independent"
         self.mainDatabase = bw.Database("ecoi_3.8_cutoff")
         self.sortingDatabase = bw.Database("sorting_eol_sen")
         self.transporta4Database = bw.Database("transport_a4_sen")
@@ -1016,93 +1252,17 @@ class LCAh:
     def get_list_of_units(self):
         return []
 
-    def get_activity(self):
-        not_found_code = []
-        not_found_search = []
-        code_found = {}
-        search_found = {}
-
-        if len(self.codeLib) > 0:
-            for code in self.codeLib.items():
-                # find if code is in code_found keys
-                if code[1] in code_found.keys():
-                    self.activityLib[f"{code[0]}"] = code_found[code[1]]
-                    print(f"code {code[1]} already found")
-                    continue
-                else:
-                    print(f"searching for code {code}")
-                    activity = [
-                        act for act in self.mainDatabase if fr"{str(code[1])}" in act['code']]
-                    if len(activity) == 1:
-                        self.activityLib[f"{code[0]}"] = activity[0]
-                        code_found[code[1]] = activity[0]
-                    elif len(activity) > 1:
-                        self.activityLib[f"{code[0]}"] = activity[0]
-                        logging.error(
-                            f"found more than one activity for code: {code} in the main database")
-                        code_found[code[1]] = activity[0]
-                    if len(activity) == 0:
-                        not_found_code.append(code)
-        if len(self.searchLib) > 0:
-            for search in self.searchLib.items():
-                # find if search is in search_found keys
-                if search[1][0] in search_found.keys():
-                    self.activityLib[f"{search[0]}"] = search_found[search[1][0]]
-                    print(f"search {search[1][0]} already found")
-                    continue
-                else:
-                    print(f"searching for search: {search}")
-                    activity = [
-                        act for act in self.mainDatabase if fr"{str(search[1][0])}" in act['name'] and fr"{str(search[1][1])}" in act['location'] and fr"{str(search[1][2])}" in act['reference product']]
-                    if len(activity) == 1:
-                        self.activityLib[f"{search[0]}"] = activity[0]
-                        search_found[search[1][0]] = activity[0]
-                        if search in not_found_search:
-                            not_found_search.remove(search)
-                    elif len(activity) > 1:
-                        self.activityLib[f"{search[0]}"] = activity[0]
-                        logging.error(
-                            f"found more than one activity for search: {search} in the main database")
-                        search_found[search[1][0]] = activity[0]
-                        if search in not_found_search:
-                            not_found_search.remove(search)
-                    if len(activity) == 0:
-                        not_found_search.append(search)
-
-                    activity = [
-                        act for act in self.transporta4Database if fr"{str(search[1][0])}" in act['name'] and fr"{str(search[1][1])}" in act['location'] and fr"{str(search[1][2])}" in act['reference product']]
-                    if len(activity) == 1:
-                        self.activityLib[f"{search[0]}"] = activity[0]
-                        if search in not_found_search:
-                            not_found_search.remove(search)
-                        search_found[search[1][0]] = activity[0]
-
-                    elif len(activity) > 1:
-                        self.activityLib[f"{search[0]}"] = activity[0]
-                        logging.error(
-                            f"found more than one activity for search: {search} in the main database")
-                        search_found[search[1][0]] = activity[0]
-                        if search in not_found_search:
-                            not_found_search.remove(search)
-                    if len(activity) == 0:
-                        not_found_search.append(search)
-
-                    activity = [
-                        act for act in self.sortingDatabase if fr"{str(search[1][0])}" in act['name'] and fr"{str(search[1][1])}" in act['location'] and fr"{str(search[1][2])}" in act['reference product']]
-                    if len(activity) == 1:
-                        self.activityLib[f"{search[0]}"] = activity[0]
-                        search_found[search[1][0]] = activity[0]
-                        if search in not_found_search:
-                            not_found_search.remove(search)
-                    elif len(activity) > 1:
-                        self.activityLib[f"{search[0]}"] = activity[0]
-                        logging.error(
-                            f"found more than one activity for search: {search} in the main database")
-                        search_found[search[1][0]] = activity[0]
-                        if search in not_found_search:
-                            not_found_search.remove(search)
-                    if len(activity) == 0:
-                        not_found_search.append(search)
+    def get_activity(self, cache_path: str = None, use_cache: bool = True):
+        '''resolves all codeLib entries in the main database and all searchLib entries in the main, transport a4 and sorting
+        databases in one pass over their indexes (see Objects/activity_index.py). The answers are kept in a sqlite file in the
+        brightway project folder (or cache_path) and reused while the databases do not change'''
+        cache = None
+        if use_cache:
+            cache = ResolutionCache(cache_path or os.path.join(bw.projects.dir, "bw4build_activity_cache.sqlite"))
+        resolver = Resolver(self.mainDatabase, [self.mainDatabase, self.transporta4Database, self.sortingDatabase], cache)
+        found, not_found_code, not_found_search = resolve(self.codeLib, self.searchLib, resolver)
+        self.activityLib.update(found)
+        print(f"{len(found)} activities found, {len(not_found_code)} codes and {len(not_found_search)} searches not found")
 
     def get_activityLib(self, product: Products):
         print(f"adding activities for {product}......")
@@ -1168,65 +1328,110 @@ class LCAh:
         self.codeLib["d3_heat"] = "e1131ec939080485eaafc6d75a679490"
         self.codeLib["c2_transport"] = "711532d84a97f77b986aec908783769f"
 
-    def get_lca_lib(self):
-        myDict = {}
-        myMethods = [method for method in bw.methods if str(
-            self.method) in str(method)]
+    def resume(self, checkpoint: LCACheckpoint):
+        '''adds the results kept in the checkpoint folder to the lcaLib and mclcaLib, the activities they hold are then skipped
+        by get_lca_lib(resume=True) and get_multiImpactMonteCarloLCA(extend=True)'''
+        state = checkpoint.read_state()
+        if state is not None:
+            self.mc_plan = state["mc_plan"]
+            self.mc_seed = state["mc_seed"]
+            self.mc_sampling = state["mc_sampling"]
+        self.mc_done = dict(getattr(self, "mc_done", {}))
+        self.lcaLib = dict(self.lcaLib)
+        lca_entries = checkpoint.read("lca")
+        for key, (results, _) in lca_entries.items():
+            self.lcaLib[key] = results
+        self.mclcaLib = dict(self.mclcaLib)
+        mclca_entries = checkpoint.read("mclca")
+        for key, (results, blocks) in mclca_entries.items():
+            if key not in self.mclcaLib or self.mclcaLib[key][0].shape[1] < results.shape[1]:
+                self.mclcaLib[key] = [results]
+                self.mc_done[key] = blocks
+        print(f"{len(lca_entries)} LCA and {len(mclca_entries)} Monte Carlo LCA results found in the checkpoints")
+
+    def get_lca_lib(self, block_size: int = 256, resume: bool = False, checkpoint: LCACheckpoint = None):
+        '''unit impacts of every activity of the activityLib for every method. The technosphere is built and factorised once and
+        block_size activities are solved at a time (see Objects/lca_engine.py) instead of one bw.LCA per activity.
+        resume=True keeps the lcaLib and only computes the activities that are not in it, checkpoint gets the results of
+        every activity as soon as its block is solved'''
+        myMethods = self.get_list_of_methods
         list_of_activities = list(set(self.activityLib.values()))
-        for act in list_of_activities:
-            print("calculating LCA for: " + str(act))
-            impacts = []
-            temp_act_dict = {str(act): []}
-            myDict.update(temp_act_dict)
-            try:
-                myLCA = bw.LCA({act: 1}, myMethods[0])
-            except IndexError:
-                logging.error(
-                    f"no method found for {self.method} in the current bw2 database")
-                sys.exit(1)
-            except KeyError as k:
-                logging.error(
-                    f"something went wrong with the activity {act} LCA calculation {k}")
-                print("something went wrong with an activity LCA calculation")
-                sys.exit(1)
-            myLCA.lci()
-            myLCA.lcia()
-            for category in myMethods:
-                myLCA.switch_method(category)
-                myLCA.lcia()
-                impacts.append(myLCA.score)
-            myDict[str(act)] = np.array(impacts)
-        self.lcaLib = myDict
+        if not myMethods:
+            logging.error(
+                f"no method found for {self.method} in the current bw2 database")
+            sys.exit(1)
+        self.lcaLib = dict(self.lcaLib) if resume else {}
+        if checkpoint is not None and not resume:
+            checkpoint.clear("lca")
+        todo = [act for act in list_of_activities if str(act) not in self.lcaLib]
+        if not todo:
+            print("LCA calculation finished")
+            return
+        print(f"calculating LCA for {len(todo)} activities...")
+        try:
+            engine = BatchLCA(todo, myMethods, block_size=block_size)
+        except KeyError as k:
+            logging.error(
+                f"something went wrong with the activity {k} LCA calculation")
+            print("something went wrong with an activity LCA calculation")
+            sys.exit(1)
+        for start in range(0, len(todo), block_size):
+            block = todo[start:start + block_size]
+            scores = engine.scores(block)
+            for j, act in enumerate(block):
+                self.lcaLib[str(act)] = scores[:, j]
+                if checkpoint is not None:
+                    checkpoint.write("lca", str(act), scores[:, j])
         print("LCA calculation finished")
 
-    def get_multiImpactMonteCarloLCA(self, iterations=20):
-        myMethods = [method for method in bw.methods if str(
-            self.method) in str(method)]
+    def get_multiImpactMonteCarloLCA(self, iterations=20, workers: int = 1, seed=None, sampling: str = "independent",
+                                     extend: bool = False, checkpoint: LCACheckpoint = None):
+        '''(methods, iterations) Monte Carlo impacts of every activity of the activityLib (see Objects/lca_engine.py).
+        sampling "independent" samples the matrices for every activity on its own, workers > 1 runs the activities in a pool
+        of processes. sampling "shared" samples them once per iteration for all activities, the draws of the activities are
+        then correlated. seed makes the draws reproducible.
+        extend=True keeps the mclcaLib and brings every activity to iterations iterations, the missing ones are run as a new
+        block that continues the seed streams of the first run (its seed and sampling are kept). Activities that are not in
+        the mclcaLib yet get all blocks. checkpoint gets the results of every activity as soon as it got its blocks, a run
+        that was stopped is resumed by LCAh.resume and running it again with extend=True'''
+        if sampling not in ("independent", "shared"):
+            raise ValueError(f"sampling has to be independent or shared not {sampling}")
+        if not extend or not self.mclcaLib:
+            self.mclcaLib = {}
+            self.mc_plan = [iterations]
+            self.mc_done = {}
+            self.mc_seed = seed
+            self.mc_sampling = sampling
+            if checkpoint is not None:
+                checkpoint.clear("mclca")
+        else:
+            if not getattr(self, "mc_plan", None):
+                # saved before the blocks were recorded, the iterations it has are the first block
+                self.mc_plan = [max(results[0].shape[1] for results in self.mclcaLib.values())]
+                self.mc_done = {key: 1 for key in self.mclcaLib}
+                self.mc_seed = seed
+                self.mc_sampling = sampling
+            if iterations > sum(self.mc_plan):
+                self.mc_plan.append(iterations - sum(self.mc_plan))
+            print(f"extending the Monte Carlo LCA to {sum(self.mc_plan)} iterations")
+            # a new dict so the impact tables built from the old one are not reused
+            self.mclcaLib = dict(self.mclcaLib)
+        if checkpoint is not None:
+            checkpoint.write_state({"mc_plan": self.mc_plan, "mc_seed": self.mc_seed, "mc_sampling": self.mc_sampling})
+        myMethods = self.get_list_of_methods
         list_of_activities = list(set(self.activityLib.values()))
-        myDict = {}
-        for act in list_of_activities:
-            print("running Monte Carlo LCA for: ", act)
-            temp_act_dict = {str(act): []}
-            myDict.update(temp_act_dict)
-            # Step 1
-            MC_lca = bw.MonteCarloLCA({act: 1})
-            MC_lca.lci()
-            # Step 2
-            C_matrices = {}
-            # Step 3
-            for method in myMethods:
-                MC_lca.switch_method(method)
-                C_matrices[method] = MC_lca.characterization_matrix
-            # Step 4
-            results = np.empty((len(myMethods), iterations))
-            # Step 5
-            for iteration in range(iterations):
-                next(MC_lca)
-                for method_index, method in enumerate(myMethods):
-                    results[method_index, iteration] = (
-                        C_matrices[method]*MC_lca.inventory).sum()
-            myDict[str(act)].append(results)
-        self.mclcaLib = myDict
+        if self.mc_sampling == "shared":
+            runs = shared_monte_carlo_runs(list_of_activities, myMethods, self.mc_plan, self.mc_done, seed=self.mc_seed)
+        else:
+            runs = monte_carlo_runs(list_of_activities, myMethods, self.mc_plan, self.mc_done, workers=workers, seed=self.mc_seed)
+        ends = np.cumsum(self.mc_plan)
+        for act, block, results in runs:
+            if block > 0:
+                results = np.concatenate([self.mclcaLib[str(act)][0], results], axis=1)
+            self.mclcaLib[str(act)] = [results]
+            self.mc_done[str(act)] = int(np.searchsorted(ends, results.shape[1], side="right"))
+            if checkpoint is not None:
+                checkpoint.write("mclca", str(act), results, self.mc_done[str(act)])
         print("Monte Carlo LCA calculation finished")
 
 
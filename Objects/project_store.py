@@ -0,0 +1,214 @@
+'''
+Versioned store of a project (buildings, assemblies, products, relations and their result stores) or of the LCA objects,
+used by run/main.py instead of pickling the registries as one blob. A store is a folder with
+    metadata.json  the format version, the object graph with every scalar attribute and the index of the arrays
+    arrays/        one .npy dataset per class and attribute, the arrays of the same shape (e.g. the mclcaLib of the
+                   activities or the reuse draws of the products) are stacked into one dataset
+Objects refer to each other by (class, position) so the graph is rebuilt without walking it, class attributes that hold
+state of the whole registry (e.g. the reuse matrix of the products) can be saved with them. The datasets can be loaded
+with a numpy mmap_mode, then only the parts of the arrays that are used are read, and read_array loads a single dataset
+without the object graph.
+'''
+
+import base64
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+import brightway2 as bw
+from .objects import Building, Assemblies, Products, Relations, LCAh
+from .impacts import ImpactStore, ImpactTensor
+from .relation_table import RelationTable
+
+# 2: the indicators of the relations are the columns of a RelationTable, stores of version 1 are moved into one when loaded
+FORMAT_VERSION = 2
+CLASSES = {cls.__name__: cls for cls in (Building, Assemblies, Products, Relations, LCAh, ImpactStore, ImpactTensor, RelationTable)}
+# memoised totals are computed again when they are asked for
+SKIPPED_ATTRIBUTES = ("_totals",)
+
+
+class Encoder:
+    '''turns the objects reachable from the registries into tables of json attributes and groups of arrays'''
+
+    def __init__(self):
+        self.tables = {name: [] for name in CLASSES}
+        self.positions = {}
+        self.pending = []
+        self.arrays = {}
+
+    def reference(self, obj) -> dict:
+        if id(obj) not in self.positions:
+            name = type(obj).__name__
+            self.positions[id(obj)] = (name, len(self.tables[name]))
+            self.tables[name].append(None)
+            self.pending.append(obj)
+        return {"__ref__": list(self.positions[id(obj)])}
+
+    def encode_registries(self, registries: dict) -> dict:
+        encoded = {name: [self.reference(obj) for obj in objects] for name, objects in registries.items()}
+        while self.pending:
+            obj = self.pending.pop()
+            name, position = self.positions[id(obj)]
+            self.tables[name][position] = {attribute: self.encode(value, f"{name}.{attribute}")
+                                           for attribute, value in vars(obj).items() if attribute not in SKIPPED_ATTRIBUTES}
+        return encoded
+
+    def encode(self, value, group: str):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if type(value).__name__ in CLASSES:
+            return self.reference(value)
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            arrays = self.arrays.setdefault(group, [])
+            arrays.append(value)
+            return {"__array__": group, "index": len(arrays) - 1}
+        if isinstance(value, np.generic) and not isinstance(value, np.object_):
+            return {"__numpy__": value.dtype.str, "value": value.item()}
+        if isinstance(value, np.random.SeedSequence):
+            return {"__seed__": value.entropy, "spawn_key": list(value.spawn_key)}
+        # brightway databases and activities are kept by name and key and taken from the brightway project when loaded
+        if hasattr(value, "backend") and hasattr(value, "name"):
+            return {"__database__": value.name}
+        if isinstance(getattr(value, "key", None), tuple):
+            return {"__activity__": list(value.key)}
+        if isinstance(value, list):
+            return [self.encode(item, group) for item in value]
+        if isinstance(value, (tuple, set, frozenset)):
+            return {f"__{type(value).__name__}__": [self.encode(item, group) for item in value]}
+        if isinstance(value, dict):
+            if all(isinstance(key, str) and not key.startswith("__") for key in value):
+                return {key: self.encode(item, group) for key, item in value.items()}
+            return {"__items__": [[self.encode(key, group), self.encode(item, group)] for key, item in value.items()]}
+        # anything else is kept as a pickle inside the metadata
+        return {"__pickle__": base64.b64encode(pickle.dumps(value)).decode()}
+
+
+class Decoder:
+    '''rebuilds the objects of the tables, the arrays are loaded one dataset at a time when they are first needed'''
+
+    def __init__(self, folder: str, metadata: dict, mmap_mode: str = None):
+        self.folder = folder
+        self.datasets = metadata["arrays"]
+        self.mmap_mode = mmap_mode
+        self.loaded = {}
+        self.objects = {name: [CLASSES[name].__new__(CLASSES[name]) for _ in table] for name, table in metadata["objects"].items()}
+        for name, table in metadata["objects"].items():
+            for obj, attributes in zip(self.objects[name], table):
+                obj.__dict__.update({attribute: self.decode(value) for attribute, value in attributes.items()})
+
+    def array(self, group: str, index: int) -> np.ndarray:
+        dataset = self.datasets[group]
+        if dataset["stacked"]:
+            if group not in self.loaded:
+                self.loaded[group] = np.load(os.path.join(self.folder, dataset["file"]), mmap_mode=self.mmap_mode)
+            return self.loaded[group][index]
+        return np.load(os.path.join(self.folder, dataset["files"][index]), mmap_mode=self.mmap_mode)
+
+    def decode(self, value):
+        if isinstance(value, float) and np.isnan(value):
+            return np.nan
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if "__ref__" in value:
+            name, position = value["__ref__"]
+            return self.objects[name][position]
+        if "__array__" in value:
+            return self.array(value["__array__"], value["index"])
+        if "__numpy__" in value:
+            return np.dtype(value["__numpy__"]).type(value["value"])
+        for kind, build in (("__tuple__", tuple), ("__set__", set), ("__frozenset__", frozenset)):
+            if kind in value:
+                return build(self.decode(item) for item in value[kind])
+        if "__items__" in value:
+            return {self.decode(key): self.decode(item) for key, item in value["__items__"]}
+        if "__seed__" in value:
+            return np.random.SeedSequence(value["__seed__"], spawn_key=tuple(value["spawn_key"]))
+        if "__database__" in value:
+            return bw.Database(value["__database__"])
+        if "__activity__" in value:
+            return bw.get_activity(tuple(value["__activity__"]))
+        if "__pickle__" in value:
+            return pickle.loads(base64.b64decode(value["__pickle__"]))
+        return {key: self.decode(item) for key, item in value.items()}
+
+
+def write_datasets(folder: str, arrays: dict) -> dict:
+    '''writes the groups of arrays to folder/arrays, a group whose arrays all have the same shape and dtype is one dataset.
+    The dataset is mapped from its file and filled one array at a time, so the group is never copied into memory as a whole'''
+    os.makedirs(os.path.join(folder, "arrays"), exist_ok=True)
+    datasets = {}
+    for group, items in arrays.items():
+        if len({(item.shape, item.dtype.str) for item in items}) == 1:
+            file = os.path.join("arrays", f"{group}.npy")
+            dataset = np.lib.format.open_memmap(os.path.join(folder, file), mode="w+", dtype=items[0].dtype,
+                                                shape=(len(items),) + items[0].shape)
+            for index, item in enumerate(items):
+                dataset[index] = item
+            dataset.flush()
+            del dataset
+            datasets[group] = {"stacked": True, "file": file, "shape": [len(items)] + list(items[0].shape), "dtype": items[0].dtype.str}
+        else:
+            files = [os.path.join("arrays", f"{group}.{index}.npy") for index in range(len(items))]
+            for file, item in zip(files, items):
+                np.save(os.path.join(folder, file), item)
+            datasets[group] = {"stacked": False, "files": files}
+    return datasets
+
+
+def save_store(folder: str, kind: str, registries: dict, class_attributes: dict = None):
+    '''writes the objects of the registries ({class name: list of objects}) and everything they refer to into folder, with
+    the class attributes ({class name: attribute names}). The store is written next to folder and swapped in once it is complete'''
+    encoder = Encoder()
+    encoded = encoder.encode_registries(registries)
+    classes = {name: {attribute: encoder.encode(getattr(CLASSES[name], attribute), f"{name}.class.{attribute}") for attribute in attributes}
+               for name, attributes in (class_attributes or {}).items()}
+    temporary = f"{folder}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    metadata = {"format_version": FORMAT_VERSION, "kind": kind, "registries": encoded, "classes": classes,
+                "objects": {name: table for name, table in encoder.tables.items() if table},
+                "arrays": write_datasets(temporary, encoder.arrays)}
+    with open(os.path.join(temporary, "metadata.json"), "w") as file:
+        json.dump(metadata, file)
+    if os.path.isdir(folder):
+        shutil.rmtree(f"{folder}.old", ignore_errors=True)
+        os.replace(folder, f"{folder}.old")
+        os.replace(temporary, folder)
+        shutil.rmtree(f"{folder}.old")
+    else:
+        os.replace(temporary, folder)
+
+
+def read_metadata(folder: str) -> dict:
+    with open(os.path.join(folder, "metadata.json")) as file:
+        metadata = json.load(file)
+    if metadata.get("format_version", 0) > FORMAT_VERSION:
+        raise ValueError(f"{folder} has format version {metadata['format_version']}, this version reads up to {FORMAT_VERSION}")
+    return metadata
+
+
+def is_store(folder: str) -> bool:
+    return os.path.isfile(os.path.join(folder, "metadata.json"))
+
+
+def load_store(folder: str, mmap_mode: str = None) -> dict:
+    '''{class name: list of objects} of the registries that were saved, the saved class attributes are set on their classes.
+    With mmap_mode ("r" read only, "c" copy on write) the arrays are mapped from their datasets and only read where they are used'''
+    metadata = read_metadata(folder)
+    decoder = Decoder(folder, metadata, mmap_mode=mmap_mode)
+    for name, attributes in metadata.get("classes", {}).items():
+        for attribute, value in attributes.items():
+            setattr(CLASSES[name], attribute, decoder.decode(value))
+    return {name: [decoder.decode(reference) for reference in references] for name, references in metadata["registries"].items()}
+
+
+def read_array(folder: str, group: str, mmap_mode: str = None) -> np.ndarray:
+    '''one dataset (e.g. "LCAh.mclcaLib" or "ImpactTensor.data") without loading the objects, the arrays of a stacked
+    dataset are along the first axis and a dataset that is not stacked is returned as a list of arrays'''
+    dataset = read_metadata(folder)["arrays"][group]
+    if dataset["stacked"]:
+        return np.load(os.path.join(folder, dataset["file"]), mmap_mode=mmap_mode)
+    return [np.load(os.path.join(folder, file), mmap_mode=mmap_mode) for file in dataset["files"]]
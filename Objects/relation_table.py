@@ -0,0 +1,174 @@
+'''
+Structure of arrays behind the Relations objects of a model. The indicators (ct, ca, cr, fc), is_connection, the type,
+the detachability and the external flag of every relation are columns of one RelationTable and the two products of a
+relation are positions in the products of the table. A Relations object only keeps its tuple, its products and its row,
+its attributes read and write the columns, so the detachment analysis, the types and the rpc of all relations are
+computed as array expressions instead of one attribute at a time.
+Relations pickled or saved before the table existed hold their attributes themselves, they are moved into the table of
+the current model the first time they are used.
+'''
+
+import numpy as np
+
+# relation type codes, 0 is a relation whose type was not set yet
+TYPES = ("", "B2B", "A2B", "B2A", "A2A")
+B2B, A2B, B2A, A2A = 1, 2, 3, 4
+# value of the flag columns (can_be_detached, is_external) that were not set yet
+UNSET = -1
+INDICATORS = ("ct", "ca", "cr", "fc")
+COLUMNS = INDICATORS + ("is_connection", "type", "can_be_detached", "is_external", "product1", "product2")
+# the attributes relations kept themselves before the table, in the form they are stored in the columns
+LEGACY_ATTRIBUTES = INDICATORS + ("is_connection", "type", "can_be_detached", "is_external")
+
+
+def empty_columns(capacity: int) -> dict:
+    columns = {indicator: np.ones(capacity) for indicator in INDICATORS}
+    columns["is_connection"] = np.ones(capacity, dtype=bool)
+    columns["type"] = np.zeros(capacity, dtype=np.int8)
+    columns["can_be_detached"] = np.full(capacity, UNSET, dtype=np.int8)
+    columns["is_external"] = np.full(capacity, UNSET, dtype=np.int8)
+    columns["product1"] = np.zeros(capacity, dtype=np.int64)
+    columns["product2"] = np.zeros(capacity, dtype=np.int64)
+    return columns
+
+
+def python_min(values: np.ndarray) -> np.ndarray:
+    '''min along axis 0 with the nan handling of min() over a list: a nan first value wins, later nans are skipped'''
+    first_nan = np.isnan(values[0])
+    if first_nan.all():
+        return values[0].copy()
+    return np.where(first_nan, np.nan, np.nanmin(values, axis=0))
+
+
+class RelationTable:
+    '''the columns of the relations of a model, row i belongs to the relation with _row i'''
+
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self.__dict__.update(empty_columns(capacity))
+        # the products of the relations, product1 and product2 are positions in this list
+        self.products = []
+        self.product_positions = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def product_position(self, product) -> int:
+        position = self.product_positions.get(product.id)
+        if position is None:
+            position = self.product_positions[product.id] = len(self.products)
+            self.products.append(product)
+        return position
+
+    def append(self, product1, product2, m: float = 1.0, is_connection: bool = True) -> int:
+        '''adds a row with all indicators m and returns it'''
+        if self.size == len(self.ct):
+            self.grow()
+        row = self.size
+        self.size += 1
+        for indicator in INDICATORS:
+            getattr(self, indicator)[row] = m
+        self.is_connection[row] = bool(is_connection)
+        self.type[row] = 0
+        self.can_be_detached[row] = UNSET
+        self.is_external[row] = UNSET
+        self.product1[row] = self.product_position(product1)
+        self.product2[row] = self.product_position(product2)
+        return row
+
+    def grow(self):
+        '''doubles the capacity of the columns'''
+        larger = empty_columns(max(2 * len(self.ct), 64))
+        for column in COLUMNS:
+            larger[column][:self.size] = getattr(self, column)[:self.size]
+        self.__dict__.update(larger)
+
+    def ensure_writable(self):
+        '''copies columns that were mapped read only from a store'''
+        for column in COLUMNS:
+            values = getattr(self, column)
+            if not values.flags.writeable:
+                setattr(self, column, np.array(values))
+
+    def adopt(self, relation):
+        '''moves a relation of another table, or one that still holds its attributes itself, into a new row of this table'''
+        state = relation.__dict__
+        source = state.get("_table")
+        row = self.append(relation.product1object, relation.product2object)
+        if source is not None:
+            for column in LEGACY_ATTRIBUTES:
+                getattr(self, column)[row] = getattr(source, column)[state["_row"]]
+        else:
+            for indicator in INDICATORS:
+                getattr(self, indicator)[row] = state.pop(indicator, 1.0)
+            self.is_connection[row] = bool(state.pop("is_connection", True))
+            self.type[row] = TYPES.index(state.pop("type", ""))
+            self.can_be_detached[row] = int(state.pop("can_be_detached")) if "can_be_detached" in state else UNSET
+            self.is_external[row] = int(state.pop("is_external")) if "is_external" in state else UNSET
+        state["_table"] = self
+        state["_row"] = row
+
+    def indicators(self) -> np.ndarray:
+        '''(relations, 4) ca, ct, fc, cr of every row, the column order the rpc of the products is averaged in'''
+        return np.column_stack([self.ca[:self.size], self.ct[:self.size], self.fc[:self.size], self.cr[:self.size]])
+
+    def rpc(self) -> np.ndarray:
+        '''rpc of every row, the same sum as Relations.rpc'''
+        size = self.size
+        return (self.ca[:size] + self.cr[:size] + self.fc[:size] + self.ct[:size]) / 4
+
+    def detachable(self) -> np.ndarray:
+        '''whether every row can be detached: a connection is blocked by a low connection type or access (< 0.2) or a
+        form containment or crossings of 0.1 or less, a relation that is not a connection can always be detached'''
+        size = self.size
+        blocked = (self.ct[:size] < 0.2) | (self.ca[:size] < 0.2) | (self.fc[:size] <= 0.1) | (self.cr[:size] <= 0.1)
+        return ~(self.is_connection[:size] & blocked)
+
+
+def column_property(column: str):
+    '''attribute of a Relations object kept in the column of its table, the indicators are floats and is_connection a bool'''
+    convert = bool if column == "is_connection" else float
+
+    def get(self):
+        table, row = self.slot()
+        return convert(getattr(table, column)[row])
+
+    def set(self, value):
+        table, row = self.slot()
+        getattr(table, column)[row] = value
+
+    return property(get, set)
+
+
+def flag_property(column: str):
+    '''a bool attribute of a Relations object kept in a flag column, it does not exist (AttributeError) until it is set'''
+
+    def get(self):
+        table, row = self.slot()
+        value = getattr(table, column)[row]
+        if value == UNSET:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{column}'")
+        return bool(value)
+
+    def set(self, value):
+        table, row = self.slot()
+        getattr(table, column)[row] = bool(value)
+
+    return property(get, set)
+
+
+def type_property():
+    '''the type of a Relations object ("B2B", "A2B", "B2A" or "A2A"), it does not exist (AttributeError) until it is set'''
+
+    def get(self):
+        table, row = self.slot()
+        code = table.type[row]
+        if code == 0:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute 'type'")
+        return TYPES[code]
+
+    def set(self, value):
+        table, row = self.slot()
+        table.type[row] = TYPES.index(value)
+
+    return property(get, set)
@@ -0,0 +1,164 @@
+'''
+Input workbooks parsed once. The first time a sheet of a workbook (the project workbook, sen/tl.xlsx, sen/sen-eol.xlsx)
+is asked for, every sheet of the file is parsed with one openpyxl pass and kept in memory, the generate methods and the
+relation and end of life stages all read their sheets from it. The parsed sheets are also written to a cache file keyed
+by the sha1 of the workbook, so another run or another process of a sweep over the same workbook does not open it with
+openpyxl at all. A workbook that changes (e.g. the Relations sheet written by output_relations_dataframe_to_excel) has
+another hash and is parsed again.
+'''
+
+import hashlib
+import logging
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from .lca_checkpoint import atomic_write
+
+logging.basicConfig(format='%(asctime)s %(message)s',
+                    datefmt='%m/%d/%Y %I:%M:%S %p',
+                    filename='logs.log', filemode='a',
+                    level=logging.ERROR)
+
+
+def restore_nan(sheets: dict) -> dict:
+    '''empty cells of the object columns are np.nan itself after read_excel and the stages test them with "is np.nan",
+    unpickled frames hold other nan floats so they are put back'''
+    for df in sheets.values():
+        for position in np.flatnonzero(df.dtypes.values == object):
+            df.isetitem(position, df.iloc[:, position].map(lambda value: np.nan if isinstance(value, float) and value != value else value))
+    return sheets
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+class InputWorkbook:
+    '''the parsed sheets of one workbook, {sheet name: DataFrame} in the order of the workbook'''
+    _cache = {}
+    # folder of the parsed workbooks, None keeps them in a .workbook_cache folder next to each workbook
+    cache_folder = None
+
+    def __init__(self, path: str, digest: str, sheets: dict):
+        self.path = path
+        self.digest = digest
+        self.sheets = sheets
+
+    @classmethod
+    def of(cls, path: str):
+        '''the parsed workbook at path, parsed again only when the file changed'''
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                "the file you are trying to read from does not exist or you entered the wrong name")
+        key = os.path.abspath(path)
+        cached = cls._cache.get(key)
+        if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+        digest = file_digest(path)
+        if cached is not None and cached[1].digest == digest:
+            workbook = cached[1]
+        else:
+            workbook = cls.load(path, digest)
+        cls._cache[key] = ((stat.st_mtime_ns, stat.st_size), workbook)
+        return workbook
+
+    @classmethod
+    def cache_path(cls, path: str, digest: str) -> str:
+        folder = cls.cache_folder or os.path.join(os.path.dirname(os.path.abspath(path)), ".workbook_cache")
+        # pickled frames are only read back by the pandas version that wrote them
+        return os.path.join(folder, f"{digest}.pandas-{pd.__version__}.p")
+
+    @classmethod
+    def load(cls, path: str, digest: str):
+        '''the sheets from the cache file of the digest, parsed from the workbook and written to the cache without one'''
+        cache_path = cls.cache_path(path, digest)
+        if os.path.isfile(cache_path):
+            with open(cache_path, "rb") as file:
+                return cls(path, digest, restore_nan(pickle.load(file)))
+        print(f"parsing {path}...")
+        sheets = pd.read_excel(path, sheet_name=None, engine="openpyxl")
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            atomic_write(cache_path, lambda file: pickle.dump(sheets, file))
+        except OSError as e:
+            logging.error(f"could not cache the parsed sheets of {path}: {e}")
+        return cls(path, digest, sheets)
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cache = {}
+
+    def sheet(self, sheet_name=0) -> pd.DataFrame:
+        '''a copy of the sheet sheet_name, an int is the position of the sheet like in pd.read_excel'''
+        if isinstance(sheet_name, int):
+            names = list(self.sheets)
+            if sheet_name >= len(names):
+                raise ValueError(f"Worksheet index {sheet_name} is invalid, {len(names)} worksheets found")
+            sheet_name = names[sheet_name]
+        if sheet_name not in self.sheets:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        return self.sheets[sheet_name].copy()
+
+
+def read_sheet(path: str, sheet_name=0) -> pd.DataFrame:
+    '''pd.read_excel(path, sheet_name) from the parsed workbook'''
+    return InputWorkbook.of(path).sheet(sheet_name)
+
+
+class SheetIndex:
+    '''the rows of a sheet by the value of a key column, built once so a key is found with a dict lookup instead of
+    comparing the whole column with it. The accessors raise what the filters they replace raised'''
+
+    def __init__(self, df: pd.DataFrame, key: str):
+        self.df = df
+        self.rows = {}
+        for position, value in enumerate(df[key].tolist()):
+            self.rows.setdefault(value, []).append(position)
+        self.columns = {}
+
+    def values(self, value, column: str) -> list:
+        '''the values of column in the rows whose key is value, in sheet order'''
+        if column not in self.columns:
+            self.columns[column] = self.df[column].tolist()
+        values = self.columns[column]
+        return [values[position] for position in self.rows.get(value, [])]
+
+    def item(self, value, column: str):
+        '''df.loc[df[key] == value][column].item()'''
+        values = self.values(value, column)
+        if len(values) != 1:
+            raise ValueError("can only convert an array of size 1 to a Python scalar")
+        return values[0]
+
+    def float(self, value, column: str) -> float:
+        '''float(df.loc[df[key] == value][column])'''
+        values = self.values(value, column)
+        if len(values) != 1:
+            raise TypeError("cannot convert the series to <class 'float'>")
+        return float(values[0])
+
+    def first(self, value, column: str):
+        '''df.loc[df[key] == value][column].values[0]'''
+        values = self.values(value, column)
+        if not values:
+            raise IndexError("index 0 is out of bounds for axis 0 with size 0")
+        return values[0]
+
+    def floats(self, values: list, column: str) -> np.ndarray:
+        '''[self.float(value, column) for value in values] as one array, the column is converted once'''
+        positions = [self.rows.get(value, ()) for value in values]
+        if any(len(found) != 1 for found in positions):
+            # raises what the first value that cannot be converted raises
+            return np.array([self.float(value, column) for value in values])
+        return self.df[column].to_numpy()[[found[0] for found in positions]].astype(float)
+
+    def firsts(self, values: list, column: str) -> np.ndarray:
+        '''[self.first(value, column) for value in values] as one array'''
+        positions = [self.rows.get(value) for value in values]
+        if None in positions:
+            raise IndexError("index 0 is out of bounds for axis 0 with size 0")
+        return self.df[column].to_numpy()[[found[0] for found in positions]]
@@ -1,3 +1,5 @@
+from brwy4build.run.sweep import run_sweep, scenario_grid
+
 list_of_arrays = ["total_impactMC_without_d_array", "total_impactMC_with_d_standard_array", "total_impactMC_with_d_rpc_array"]
 list_of_default_values = ["high_product", "low_product", "user input", "keep"]
 
@@ -10,9 +12,12 @@ d1ict = {"a": (1.09186399, 0.44315069, 7.58473472, -0.07522362),
             "f": (1.23640816, 0.59668638, 5.12167984, -0.07709897)}
 
 
-for default_value in list_of_default_values:
-    for sen, value in d1ict.items():
-        initialize(projectname="DSPS case studyv14", data_file_path="/home/haithamth/Documents/xlsx/paper1-sen1.xlsx", path_to_save_folder="/home/haithamth/Documents/My_saved_analysis"
-                ,project_new=True, lca_new=False, mc_pick=80, MCiterations=150, mode=default_value, default_rel=1, material_flow_mcs=80, save=False, constants=value,
-                save_attribute=(list_of_arrays,f"{default_value}",f"{sen}", "/home/haithamth/Documents/results_building_level_sen2"))
-        analyze.Analysis.reset()
+if __name__ == "__main__":
+    # every relation mode with every set of sigmoid constants, the lca is loaded once per worker
+    for labels in run_sweep(scenario_grid(mode=list_of_default_values, constants=d1ict),
+                            lca_folder="/home/haithamth/Documents/My_saved_analysis/DSPS case studyv14_lca_save_folder", workers=4,
+                            save_attribute=(list_of_arrays, "None", "/home/haithamth/Documents/results_building_level_sen2"),
+                            projectname="DSPS case studyv14", data_file_path="/home/haithamth/Documents/xlsx/paper1-sen1.xlsx",
+                            path_to_save_folder="/home/haithamth/Documents/My_saved_analysis", mc_pick=80, MCiterations=150,
+                            default_rel=1, material_flow_mcs=80):
+        print(f"scenario {labels} done")
@@ -1,6 +1,10 @@
 from brwy4build.Objects.objects import Products, Assemblies, Relations, LCAh, Building
 from brwy4build.Analysis.analyze import Analysis
+from brwy4build.Objects.lca_checkpoint import LCACheckpoint
+from brwy4build.Objects.project_store import save_store, load_store, is_store
+from brwy4build.Objects.model import in_model
 from ..utils.processing import save_attributes_to_numpy
+from ..utils.helper import seed_sequence, child_seed
 import warnings
 import pickle
 import os
@@ -21,62 +25,84 @@ logging.basicConfig(format='%(asctime)s %(message)s',
 # Some methods will pop a warning because a newer method is available, this is just to avoid printing it
 warnings.filterwarnings("ignore")
 
-products_object: Products = None
-lca_object: LCAh = None
+def __getattr__(name):
+    '''products_object and lca_object are the products and the lca of the current model (see Objects/model.py)'''
+    if name == "products_object":
+        return Products.instances
+    if name == "lca_object":
+        return LCAh.instances[0] if LCAh.instances else None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def save_project(projectname: str = "default", save_folder: str = ""):
-    '''This uses pickle to save the project'''
-    if not os.path.isdir(f"{save_folder}/{projectname}_save_folder"):
-        os.makedirs(f"{save_folder}/{projectname}_save_folder")
-    pickle.dump(Building.instances, open(
-        f"{save_folder}/{projectname}_save_folder/save_project.p", "wb"))
+    '''This saves the project as a versioned store (see Objects/project_store.py)'''
+    save_store(f"{save_folder}/{projectname}_save_folder/project_store", "project",
+               {"Building": Building.instances, "Assemblies": Assemblies.instances, "Products": Products.instances, "Relations": Relations.instances},
+               class_attributes={"Products": ("reuse_matrix", "reuse_matrix_settings")})
     print("project saved!")
 
-def load_project(projectname: str = "default", save_folder: str = ""):
-    '''This uses pickle to load the project'''
-    Building.instances = pickle.load(
-        open(f"{save_folder}/{projectname}_save_folder/save_project.p", "rb"))
-    for building in Building.instances:
-        for assembly in building.assemblies:
-            Assemblies.instances.append(assembly)
-            for product in assembly.products:
-                Products.instances.append(product)
-                for relation in product.relations:
-                    Relations.instances.append(relation)
+def load_project(projectname: str = "default", save_folder: str = "", mmap_mode: str = None):
+    '''This loads the project from its store, projects saved as a pickle by older versions are still loaded.
+    mmap_mode ("r" or "c") maps the arrays from the store instead of reading them, use it to look at a few results of a large project'''
+    folder = f"{save_folder}/{projectname}_save_folder"
+    if is_store(f"{folder}/project_store"):
+        registries = load_store(f"{folder}/project_store", mmap_mode=mmap_mode)
+        Building.instances = registries["Building"]
+        Assemblies.instances.extend(registries["Assemblies"])
+        Products.instances.extend(registries["Products"])
+        Relations.instances.extend(registries["Relations"])
+    else:
+        Building.instances = pickle.load(
+            open(f"{folder}/save_project.p", "rb"))
+        for building in Building.instances:
+            for assembly in building.assemblies:
+                Assemblies.instances.append(assembly)
+                for product in assembly.products:
+                    Products.instances.append(product)
+                    for relation in product.relations:
+                        Relations.instances.append(relation)
+    Assemblies.rebuild_index()
+    Products.rebuild_index()
+    Relations.rebuild_index()
     print("project loaded!")
 
 def save_lca(projectname: str = "default", save_folder: str = ""):
-    '''This uses pickle to save the lca'''
-    if not os.path.isdir(f"{save_folder}/{projectname}_lca_save_folder"):
-        os.makedirs(f"{save_folder}/{projectname}_lca_save_folder")
-    pickle.dump(LCAh.instances, open(
-        f"{save_folder}/{projectname}_lca_save_folder/save_lca.p", "wb"))
+    '''This saves the lca as a versioned store (see Objects/project_store.py)'''
+    save_store(f"{save_folder}/{projectname}_lca_save_folder/lca_store", "lca", {"LCAh": LCAh.instances})
     print("lca saved!")
 
 
 def load_lca(projectname: str = "default", save_folder: str = ""):
-    '''This uses pickle to load the lca'''
-    LCAh.instances = pickle.load(
-        open(f"{save_folder}/{projectname}_lca_save_folder/save_lca.p", "rb"))
+    '''This loads the lca from its store or from the pickle of older versions'''
+    load_lca_static(save_folder=f"{save_folder}/{projectname}_lca_save_folder")
+
+def load_lca_static(save_folder: str = "", mmap_mode: str = None):
+    '''This loads the lca saved in save_folder, from its store or from the pickle of older versions.
+    mmap_mode ("r") maps the Monte Carlo arrays of a store read only, processes that map the same store share its pages'''
+    if is_store(f"{save_folder}/lca_store"):
+        LCAh.instances = load_store(f"{save_folder}/lca_store", mmap_mode=mmap_mode)["LCAh"]
+    else:
+        LCAh.instances = pickle.load(
+            open(f"{save_folder}/save_lca.p", "rb"))
     print("lca loaded!")
 
-def load_lca_static(save_folder: str = ""):
-    '''This uses pickle to load the lca'''
-    LCAh.instances = pickle.load(
-        open(f"{save_folder}/save_lca.p", "rb"))
-    print("lca loaded!")
+def lca_checkpoint(projectname: str = "default", save_folder: str = "") -> LCACheckpoint:
+    '''the per activity checkpoints of the lca, kept in the lca save folder'''
+    return LCACheckpoint(f"{save_folder}/{projectname}_lca_save_folder/checkpoints")
 
 #########################################################################################################################################
 
 ###########################################################################################################################################
 
 
+@in_model
 def initialize(projectname: str = "default", data_file_path: str = "default", project_new: bool = False, lca_new: bool = False, path_to_save_folder: str = "", mc_pick: int = 50, include_circularity: bool = True,
                MCiterations: int = 150, connections_input: bool = True, export_excel: bool = False, mode: str = "keep", default_rel: float = 1, assembly: Assemblies = None, save: bool = True,
                brightway_project_name: str = "circularLCA", brightway_bg_db_name: str = "ecoinvent", brightway_method_name: str = "EN15804", load_static_lca_folder_path: str = None,
                material_flow_mcs: int = 100, save_attribute: tuple[str | list, str, str] = None, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362),
                assembly_list: list[Assemblies]=None, mode_assembly: str = None,
-               tl_mode: str = None):
+               tl_mode: str = None, seed=None, aggregation: str = "memory", chunk_size: int = 500, spill_folder: str = None,
+               lca_workers: int = 1, mc_sampling: str = "independent", mc_extend: bool = False,
+               resume_lca: bool = False, lca_loaded: bool = False):
     bw.projects.set_current(brightway_project_name)
     '''This function initializes the program
     projectname: name of the project it will also be used as the name of the folder where the project will be saved
@@ -97,16 +123,25 @@ def initialize(projectname: str = "default", data_file_path: str = "default", pr
     brightway_bg_db_name: name of the brightway background database
     brightway_method_name: name of the LCA brightway method
     load_static_lca_folder_path: path to the folder where the lca will be loaded from, if None it will load the lca from the save folder, use this if you want to load a static lca while running multiple analysis
-    save_attribute: saves a result of a building, it should be inputed as a tuple of (building, attribute, name of the sen, path to save)'''
-    global lca_object
-    global products_object
-    if not lca_new and not load_static_lca_folder_path:
+    save_attribute: saves a result of a building, it should be inputed as a tuple of (building, attribute, name of the sen, path to save)
+    seed: None, an int, a numpy SeedSequence or Generator, the same seed gives the same results, None gives a fresh random run
+    aggregation: "memory" keeps the results of all products, "stream" runs the LCA chunk by chunk of assemblies and only keeps the assembly and building results, use it for large buildings
+    chunk_size: number of products per chunk when aggregation is "stream"
+    spill_folder: if given with aggregation "stream" the product results are written to this folder instead of being dropped
+    lca_workers: number of processes the Monte Carlo LCA of the activities is spread over when lca_new is True
+    mc_sampling: "independent" samples the background for every activity on its own, "shared" samples it once per Monte Carlo iteration for all activities so their draws are correlated
+    mc_extend: if True and lca_new is False the loaded lca is brought to MCiterations Monte Carlo iterations per activity, only the missing iterations and activities are run,
+    a stopped extension is resumed by running it again
+    resume_lca: if True with lca_new the LCA and Monte Carlo LCA results kept in the checkpoints of the lca save folder are reused and only the missing activities are computed,
+    every activity is checkpointed as soon as its results are computed
+    lca_loaded: if True the lca already in LCAh.instances is used and nothing is loaded, run/sweep.py loads it once per process
+    model: the Model (see Objects/model.py) the project and the lca are built in, the current model when None'''
+    seed = seed_sequence(seed)
+    if not lca_new and not load_static_lca_folder_path and not lca_loaded:
         load_lca(projectname=projectname, save_folder=path_to_save_folder)
-        lca_object = LCAh.instances[0]
     
-    if load_static_lca_folder_path:
+    if load_static_lca_folder_path and not lca_loaded:
         load_lca_static(save_folder=load_static_lca_folder_path)
-        lca_object = LCAh.instances[0]
 
     if project_new:
         # run_first_step(filename=data_file_path)
@@ -114,16 +149,15 @@ def initialize(projectname: str = "default", data_file_path: str = "default", pr
             filename=data_file_path, default_rel=default_rel)
         Analysis.setup_analysis(
             filename=data_file_path, reset_objects=False, update_connection=connections_input, export_excel=export_excel, mode=mode, assemblyMC=assembly, mf_mcs=material_flow_mcs,
-            constants=constants, assembly_list=assembly_list, mode_assembly=mode_assembly, tl_mode=tl_mode)
-        products_object = Products.instances
+            constants=constants, assembly_list=assembly_list, mode_assembly=mode_assembly, tl_mode=tl_mode, seed=child_seed(seed, "setup"))
         if save:
             save_project(projectname=projectname, save_folder=path_to_save_folder)
 
     if not project_new:
         load_project(projectname=projectname, save_folder=path_to_save_folder)
-        products_object = Products.instances
 
     if lca_new:
+        checkpoint = lca_checkpoint(projectname=projectname, save_folder=path_to_save_folder)
         lcah = LCAh()
         for product in Products.instances:
             lcah.get_activityLib(product)
@@ -131,19 +165,35 @@ def initialize(projectname: str = "default", data_file_path: str = "default", pr
         print(f"LCA method is set to {lcah.method}")
         print("searching for activities in Database...")
         lcah.get_activity()
+        if resume_lca:
+            lcah.resume(checkpoint)
         save_lca(projectname=projectname, save_folder=path_to_save_folder)
         print("getting LCA library...")
-        lcah.get_lca_lib()
+        lcah.get_lca_lib(resume=resume_lca, checkpoint=checkpoint)
         save_lca(projectname=projectname, save_folder=path_to_save_folder)
         print("getting Monte Carlo LCA...")
-        lcah.get_multiImpactMonteCarloLCA(iterations=MCiterations)
-        lca_object = lcah
+        lcah.get_multiImpactMonteCarloLCA(iterations=MCiterations, workers=lca_workers, seed=child_seed(seed, "mclca"), sampling=mc_sampling,
+                                          extend=resume_lca, checkpoint=checkpoint)
+        save_lca(projectname=projectname, save_folder=path_to_save_folder)
+
+    if mc_extend and not lca_new:
+        print("extending Monte Carlo LCA...")
+        checkpoint = lca_checkpoint(projectname=projectname, save_folder=path_to_save_folder)
+        LCAh.instances[0].resume(checkpoint)
+        LCAh.instances[0].get_multiImpactMonteCarloLCA(iterations=MCiterations, workers=lca_workers, seed=child_seed(seed, "mclca"), sampling=mc_sampling,
+                                                extend=True, checkpoint=checkpoint)
         save_lca(projectname=projectname, save_folder=path_to_save_folder)
 
     if project_new and connections_input:
-        Analysis.product_lca(include_circularity = include_circularity, mc_simulations = mc_pick, mf_mcs=material_flow_mcs)
-        Analysis.generate_scenarios(mfa_mcs=material_flow_mcs, constants=constants)
-        Analysis.generate_results(building=Building.instances[0])
+        if aggregation == "stream":
+            Analysis.streamed_lca(building=Building.instances[0], include_circularity=include_circularity, mc_simulations=mc_pick, mf_mcs=material_flow_mcs,
+                                  constants=constants, seed=child_seed(seed, "lca"), chunk_size=chunk_size, spill_folder=spill_folder)
+        elif aggregation == "memory":
+            Analysis.product_lca(include_circularity = include_circularity, mc_simulations = mc_pick, mf_mcs=material_flow_mcs, seed=child_seed(seed, "lca"))
+            Analysis.generate_scenarios(mfa_mcs=material_flow_mcs, constants=constants, seed=child_seed(seed, "lca", "scenarios"))
+            Analysis.generate_results(building=Building.instances[0])
+        else:
+            raise ValueError(f"aggregation has to be memory or stream not {aggregation}")
         if save:
             save_project(projectname=projectname, save_folder=path_to_save_folder)
         if save_attribute:
@@ -0,0 +1,86 @@
+'''
+Sweeps of initialize over a grid of its parameters, e.g. the relation modes and the sigmoid constants of the sensitivity
+analysis. Every scenario builds its project from the workbook like the serial loops did, but the lca is loaded once per
+process from its store instead of once per scenario. Its Monte Carlo library is mapped read only and the activity table
+of the stages is a view of it (see Analysis/kernels.py), so the processes share its pages instead of each holding a
+copy. Every scenario is built in its own Model (see Objects/model.py) that shares the lca of its process, so nothing has
+to be reset between scenarios. The scenarios run on a pool of processes and every scenario saves its attributes to the
+output folder as soon as it is done.
+'''
+
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import brightway2 as bw
+from brwy4build.Objects.objects import LCAh
+from brwy4build.Objects.model import Model
+from .main import initialize, load_lca_static
+from ..utils.helper import child_seed
+
+logging.basicConfig(format='%(asctime)s %(message)s',
+                    datefmt='%m/%d/%Y %I:%M:%S %p',
+                    filename='logs.log', filemode='a',
+                    level=logging.ERROR)
+
+
+def scenario_grid(**axes) -> dict:
+    '''{labels: parameters} of every combination of the axes, an axis is a parameter of initialize with a list of values,
+    labelled by str(value), or a {label: value} dict. labels is the tuple of the labels of the values in the order of the axes'''
+    labelled = [list(values.items()) if isinstance(values, dict) else [(str(value), value) for value in values] for values in axes.values()]
+    return {tuple(label for label, _ in combination): {name: value for name, (_, value) in zip(axes, combination)}
+            for combination in itertools.product(*labelled)}
+
+
+def scenario_parameters(labels: tuple, scenario: dict, parameters: dict, seed, save_attribute: tuple) -> dict:
+    '''the initialize parameters of one scenario, its seed is the child stream of seed named by its labels'''
+    run = dict(parameters, **scenario)
+    run.setdefault("project_new", True)
+    run.setdefault("save", False)
+    if seed is not None:
+        run["seed"] = child_seed(seed, "sweep", *labels)
+    if save_attribute:
+        attributes, other, path_to_save_folder = save_attribute
+        run["save_attribute"] = (attributes, labels[0], "_".join(labels[1:]), other, path_to_save_folder)
+    return run
+
+
+def load_worker(brightway_project_name: str, lca_folder: str):
+    '''loads the lca once into the registries of this process'''
+    bw.projects.set_current(brightway_project_name)
+    load_lca_static(save_folder=lca_folder, mmap_mode="r")
+
+
+def run_scenario(labels: tuple, parameters: dict, lcas: list = None) -> tuple:
+    '''runs one scenario in a new model on lcas, the lca loaded by load_worker when None'''
+    print(f"running scenario {labels}")
+    lcas = LCAh.instances if lcas is None else lcas
+    initialize(lca_loaded=True, model=Model(" ".join(labels), lcas=lcas), **parameters)
+    return labels
+
+
+def run_sweep(scenarios: dict, lca_folder: str, workers: int = 1, seed=None, save_attribute: tuple = None, **parameters):
+    '''runs initialize for every scenario of scenarios ({labels: parameters}, see scenario_grid) with the common parameters
+    on the lca saved in lca_folder, in this process with workers=1 or on a pool of workers processes. Yields the labels of
+    every scenario as soon as it is done, in the order they finish.
+    seed: every scenario gets the child stream of seed named by its labels, the results do not depend on the number of workers
+    save_attribute: (attribute names, other, path to save) saves the attributes of the building of every scenario as
+    save_attribute of initialize does, with the first label as the scenario name and the other labels as the sensitivity name'''
+    if parameters.get("lca_new") or any(scenario.get("lca_new") for scenario in scenarios.values()):
+        raise ValueError("a sweep runs on a saved lca, compute it with initialize(lca_new=True) first")
+    brightway_project_name = parameters.get("brightway_project_name", "circularLCA")
+    runs = [(labels, scenario_parameters(labels, scenario, parameters, seed, save_attribute)) for labels, scenario in scenarios.items()]
+    if workers > 1 and len(runs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=load_worker, initargs=(brightway_project_name, lca_folder)) as executor:
+            futures = {executor.submit(run_scenario, labels, run): labels for labels, run in runs}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception:
+                    logging.error(f"scenario {futures[future]} failed", exc_info=True)
+                    raise
+        return
+    # the lca gets its own model so the registries of the caller are left as they are
+    lca_model = Model("sweep lca")
+    lca_model.run(load_worker, brightway_project_name, lca_folder)
+    for labels, run in runs:
+        yield run_scenario(labels, run, lca_model.lcas)
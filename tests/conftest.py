@@ -0,0 +1,16 @@
+import pytest
+from brwy4build.Objects.model import Model
+from .synthetic import make_workbook
+
+
+@pytest.fixture
+def model():
+    '''a new model that is current for the test, so the registries of the tests do not leak into each other'''
+    with Model("test").active() as current:
+        yield current
+
+
+@pytest.fixture(scope="session")
+def workbook(tmp_path_factory) -> str:
+    '''path of the synthetic project workbook, see tests/synthetic.py'''
+    return make_workbook(str(tmp_path_factory.mktemp("workbook") / "project.xlsx"))
@@ -0,0 +1,77 @@
+'''
+A synthetic project for the tests: a workbook with one building, its assemblies, products with random disassembly
+sequences and technical lives and the relations between them, and an LCA library with random results for the activities
+of its products, so the analysis runs without a brightway project.
+'''
+
+import os
+import random
+import numpy as np
+import pandas as pd
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ELEMENT_TYPES = ("wall element", "floor element", "roof element", "technical element", "door element", "window element")
+TECHNICAL_LIVES = (10, 15, 20, 25, 30, 70, "C 1", "C 2")
+
+
+def make_workbook(path: str, n_assemblies: int = 6, products_per_assembly: int = 8, seed: int = 1) -> str:
+    '''writes the project workbook (Buildings, Assemblies, Products and Relations sheets) to path and returns path'''
+    rnd = random.Random(seed)
+    eol_types = pd.read_excel(os.path.join(PACKAGE_DIR, "sen", "sen-eol.xlsx"))["Name"].tolist()[1:10]
+    buildings = pd.DataFrame([["B1", "residential", "BLD1", 120, 60, 2000, "NL"]],
+                             columns=["name", "type", "id", "area", "life", "year", "loc"])
+    assemblies = pd.DataFrame([[f"A{i}", ELEMENT_TYPES[i % len(ELEMENT_TYPES)], f"AS{i}", rnd.randint(1, 5), "p", "BLD1"]
+                               for i in range(n_assemblies)],
+                              columns=["name", "type", "id", "amount", "unit", "part_of"])
+    ids = [f"P{i}" for i in range(n_assemblies * products_per_assembly)]
+    products = []
+    for i, product_id in enumerate(ids):
+        later = ids[i + 1:i + 6]
+        sequence = ";".join(rnd.sample(later, k=min(len(later), rnd.randint(0, 2)))) or np.nan
+        products.append([f"prod{i}", f"lci{i}", f"code{i % 7}", "GLO", product_id, f"AS{i // products_per_assembly}", sequence,
+                         rnd.choice(TECHNICAL_LIVES), rnd.uniform(1, 10), "kg", rnd.choice([0, 0.1]), rnd.random() < 0.3,
+                         rnd.choice(eol_types), rnd.choice(["lorry", "train"])])
+    products_df = pd.DataFrame(products, columns=["name", "name_in_lci", "lci_code", "location", "id", "part_of", "ds", "tl",
+                                                  "amount", "fu", "rc", "base", "eol", "transport"])
+    relations = []
+    for product in products:
+        if isinstance(product[6], str):
+            for other in product[6].split(";"):
+                relations.append([str((product[4], other)), product[4] + other, "x", rnd.random() < 0.8,
+                                  rnd.choice([0.1, 0.2, 0.6, 0.8, 1]), rnd.choice([0.1, 0.4, 0.8, 1]),
+                                  rnd.choice([0.1, 0.2, 0.8, 1]), rnd.choice([0.1, 0.4, 1])])
+    relations_df = pd.DataFrame(relations, columns=["Relation_id_as_tuple", "Relation_id", "Explained", "Is_connection",
+                                                    "Connection_type", "Connection_access", "Form_containment", "Crossings"])
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        buildings.to_excel(writer, sheet_name="Buildings", index=False)
+        assemblies.to_excel(writer, sheet_name="Assemblies", index=False)
+        products_df.to_excel(writer, sheet_name="Products", index=False)
+        relations_df.to_excel(writer, sheet_name="Relations", index=False)
+    return path
+
+
+def synthetic_lca(iterations: int = 30, n_methods: int = 6, seed: int = 42):
+    '''an LCAh of the products of the current model whose activities have random static and Monte Carlo results, it is
+    built without LCAh.__init__ so no brightway project or database is opened'''
+    from brwy4build.Objects.objects import LCAh, Products
+    lcah = LCAh.__new__(LCAh)
+    lcah.__dict__.update(codeLib={}, searchLib={}, lcaLib={}, activityLib={}, mclcaLib={}, method="EN15804",
+                         mc_plan=[], mc_done={}, mc_seed=None, mc_sampling="independent")
+    LCAh.instances.append(lcah)
+    for product in Products.instances:
+        lcah.get_activityLib(product)
+    rng = np.random.RandomState(seed)
+    for key in list(lcah.codeLib) + list(lcah.searchLib):
+        lcah.activityLib[key] = f"activity<{lcah.codeLib.get(key) or lcah.searchLib[key][0]}>"
+    for activity in sorted(set(lcah.activityLib.values())):
+        static = rng.uniform(-1, 3, n_methods)
+        lcah.lcaLib[activity] = static
+        lcah.mclcaLib[activity] = [static[:, None] * rng.uniform(0.5, 1.5, (n_methods, iterations))]
+    return lcah
+
+
+def setup_project(path: str, mf_mcs: int = 20, seed: int = 123, **setup):
+    '''generates the objects of the workbook at path in the current model and runs setup_analysis on them'''
+    from brwy4build.Analysis.analyze import Analysis
+    Analysis.generate_objects(filename=path, default_rel=1)
+    Analysis.setup_analysis(filename=path, mf_mcs=mf_mcs, seed=seed, **setup)
@@ -0,0 +1,138 @@
+'''
+A small synthetic technosphere that stands in for brightway in the LCA tests. LCA and MonteCarloLCA implement the part
+of the bw2calc interface Objects/lca_engine.py uses, on fixed technosphere, biosphere and characterization matrices, and
+install puts them on the brightway module with the activities and methods of the technosphere.
+'''
+
+import numpy as np
+import scipy.sparse as sparse
+from scipy.sparse.linalg import spsolve
+
+N_PRODUCTS, N_FLOWS = 12, 5
+METHODS = [("EN15804", f"category {i}", "total") for i in range(3)]
+# samplings of the technosphere, the Monte Carlo runs of this process count here
+SAMPLINGS = {"technosphere": 0}
+
+
+class Activity:
+    '''an activity of the synthetic database, equal to another with the same key like a brightway activity'''
+
+    def __init__(self, code: str):
+        self.key = ("synthetic", code)
+
+    def __str__(self) -> str:
+        return f"'{self.key[1]}' (kilogram, GLO, None)"
+
+    __repr__ = __str__
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __eq__(self, other) -> bool:
+        return getattr(other, "key", None) == self.key
+
+
+ACTIVITIES = [Activity(f"a{i}") for i in range(N_PRODUCTS)]
+_rng = np.random.RandomState(5)
+_inputs = sparse.random(N_PRODUCTS, N_PRODUCTS, density=0.2, random_state=_rng, data_rvs=lambda k: _rng.uniform(0, 0.2, k))
+_inputs.setdiag(0)
+TECHNOSPHERE = (sparse.identity(N_PRODUCTS) - _inputs).tocsr()
+BIOSPHERE = sparse.random(N_FLOWS, N_PRODUCTS, density=0.5, random_state=_rng).tocsr()
+# full matrices, so the column sums of characterization_stack differ from the diagonal
+CHARACTERIZATION = {method: sparse.csr_matrix(_rng.uniform(-1, 2, (N_FLOWS, N_FLOWS))) for method in METHODS}
+
+
+class LCA:
+    def __init__(self, demand: dict, method=None, seed=None, **kwargs):
+        self.demand = demand
+        self.method = method
+        self.seed = seed
+        self.product_dict = {activity.key: i for i, activity in enumerate(ACTIVITIES)}
+
+    def load_lci_data(self):
+        self.technosphere_matrix = TECHNOSPHERE.copy()
+        self.biosphere_matrix = BIOSPHERE.copy()
+
+    def build_demand_array(self, demand: dict = None):
+        self.demand_array = np.zeros(N_PRODUCTS)
+        for activity, amount in (demand or self.demand).items():
+            self.demand_array[self.product_dict[activity.key]] = amount
+
+    def switch_method(self, method):
+        self.method = method
+        self.characterization_matrix = CHARACTERIZATION[method]
+
+
+class Sampler:
+    '''lognormal draws around the values of a matrix'''
+
+    def __init__(self, matrix, seed, counter: str = None):
+        self.matrix = matrix
+        self.random = np.random.RandomState(seed)
+        self.counter = counter
+
+    def next(self) -> np.ndarray:
+        if self.counter:
+            SAMPLINGS[self.counter] += 1
+        return self.matrix.data * self.random.lognormal(0, 0.1, len(self.matrix.data))
+
+
+class MonteCarloLCA(LCA):
+    def load_data(self):
+        self.load_lci_data()
+        self.tech_rng = Sampler(TECHNOSPHERE, self.seed, "technosphere")
+        self.bio_rng = Sampler(BIOSPHERE, None if self.seed is None else self.seed + 1)
+
+    def lci(self):
+        self.load_data()
+        self.build_demand_array()
+
+    def rebuild_technosphere_matrix(self, vector: np.ndarray):
+        self.technosphere_matrix = sparse.csr_matrix((vector, TECHNOSPHERE.indices, TECHNOSPHERE.indptr), shape=TECHNOSPHERE.shape)
+
+    def rebuild_biosphere_matrix(self, vector: np.ndarray):
+        self.biosphere_matrix = sparse.csr_matrix((vector, BIOSPHERE.indices, BIOSPHERE.indptr), shape=BIOSPHERE.shape)
+
+    def __next__(self) -> np.ndarray:
+        self.rebuild_technosphere_matrix(self.tech_rng.next())
+        self.rebuild_biosphere_matrix(self.bio_rng.next())
+        self.supply_array = spsolve(self.technosphere_matrix.tocsc(), self.demand_array)
+        return self.supply_array
+
+
+class Projects:
+    current = "synthetic"
+
+    def set_current(self, name: str):
+        self.current = name
+
+
+def install(monkeypatch):
+    '''makes the brightway module of the package compute on the synthetic technosphere'''
+    import brightway2 as bw
+    activities = {activity.key: activity for activity in ACTIVITIES}
+    monkeypatch.setattr(bw, "LCA", LCA, raising=False)
+    monkeypatch.setattr(bw, "MonteCarloLCA", MonteCarloLCA, raising=False)
+    monkeypatch.setattr(bw, "methods", METHODS, raising=False)
+    monkeypatch.setattr(bw, "projects", Projects(), raising=False)
+    monkeypatch.setattr(bw, "get_activity", lambda key: activities[tuple(key)], raising=False)
+    monkeypatch.setitem(SAMPLINGS, "technosphere", 0)
+
+
+def score(activity: Activity, method, technosphere=TECHNOSPHERE, biosphere=BIOSPHERE) -> float:
+    '''the score of one unit of activity the way a bw.LCA of it alone computes it'''
+    demand = np.zeros(N_PRODUCTS)
+    demand[ACTIVITIES.index(activity)] = 1
+    supply = spsolve(technosphere.tocsc(), demand)
+    inventory = biosphere @ sparse.diags(supply)
+    return (CHARACTERIZATION[method] @ inventory).sum()
+
+
+def lcah(activities: list = ACTIVITIES):
+    '''an LCAh whose activityLib holds the activities, built without LCAh.__init__ so no brightway database is opened'''
+    from brwy4build.Objects.objects import LCAh
+    lcah = LCAh.__new__(LCAh)
+    lcah.__dict__.update(codeLib={}, searchLib={}, lcaLib={}, mclcaLib={}, method="EN15804", mc_plan=[], mc_done={},
+                         mc_seed=None, mc_sampling="independent",
+                         activityLib={f"P{i}": activity for i, activity in enumerate(activities)})
+    return lcah
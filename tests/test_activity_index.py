@@ -0,0 +1,115 @@
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects import activity_index
+from brwy4build.Objects.activity_index import ActivityIndex, ResolutionCache, Resolver, resolve
+
+
+class Database(list):
+    '''a list of activities with the name of a brightway database'''
+
+    def __init__(self, name: str, activities: list):
+        super().__init__(activities)
+        self.name = name
+
+
+class Activity(dict):
+    '''the fields of an activity and its brightway key'''
+
+    @property
+    def key(self) -> tuple:
+        return (self["database"], self["code"])
+
+
+def activity(code: str, name: str, database: str = "db") -> Activity:
+    return Activity(code=code, name=name, location="GLO", database=database, **{"reference product": name})
+
+
+@pytest.fixture
+def databases(monkeypatch) -> dict:
+    '''the brightway metadata of the databases, {name: {"modified": ...}}'''
+    metadata = {}
+    monkeypatch.setattr(activity_index.bw, "databases", metadata)
+    ActivityIndex.clear_cache()
+    yield metadata
+    ActivityIndex.clear_cache()
+
+
+def test_index_is_reused_while_the_database_is_unchanged(databases):
+    database = Database("db", [activity("a1", "brick"), activity("a2", "timber")])
+    databases["db"] = {"modified": "2024-01-01T00:00:00"}
+    assert ActivityIndex.of(database) is ActivityIndex.of(database)
+
+
+def test_edited_database_with_the_same_number_of_activities_is_indexed_again(databases):
+    database = Database("db", [activity("a1", "brick"), activity("a2", "timber")])
+    databases["db"] = {"modified": "2024-01-01T00:00:00"}
+    assert [found["code"] for found in ActivityIndex.of(database).find_search(("timber",))] == ["a2"]
+    database[1] = activity("a2", "steel")
+    databases["db"] = {"modified": "2024-01-02T00:00:00"}
+    index = ActivityIndex.of(database)
+    assert index.find_search(("timber",)) == []
+    assert [found["code"] for found in index.find_search(("steel",))] == ["a2"]
+
+
+def test_database_with_another_number_of_activities_is_indexed_again(databases):
+    database = Database("db", [activity("a1", "brick")])
+    first = ActivityIndex.of(database)
+    database.append(activity("a2", "timber"))
+    assert ActivityIndex.of(database) is not first
+    assert len(ActivityIndex.of(database).activities) == 2
+
+
+@pytest.fixture
+def lookups(databases, monkeypatch) -> list:
+    '''the (kind, query) every index is asked for, the activities of the cached answers are found by their key'''
+    asked = []
+    find_code, find_search = ActivityIndex.find_code, ActivityIndex.find_search
+    monkeypatch.setattr(ActivityIndex, "find_code", lambda index, code: asked.append(("code", code)) or find_code(index, code))
+    monkeypatch.setattr(ActivityIndex, "find_search",
+                        lambda index, search: asked.append(("search", search)) or find_search(index, search))
+    return asked
+
+
+def resolved(main: Database, search: Database, cache: ResolutionCache, monkeypatch) -> dict:
+    activities = {found.key: found for found in list(main) + list(search)}
+    monkeypatch.setattr(activity_index.bw, "get_activity", lambda key: activities[key])
+    codeLib = {"p1": "a1", "p2": "a2", "p3": "a9"}
+    searchLib = {"p4": ["steel", "GLO", "steel"], "p5": ["glass"]}
+    activityLib, not_found_code, not_found_search = resolve(codeLib, searchLib, Resolver(main, [search], cache=cache))
+    return {key: found.key for key, found in activityLib.items()}, not_found_code, not_found_search
+
+
+def test_second_resolve_is_answered_from_the_cache(lookups, databases, tmp_path, monkeypatch):
+    main = Database("db", [activity("a1", "brick"), activity("a2", "timber")])
+    search = Database("search", [activity("s1", "steel", "search"), activity("s2", "stainless steel", "search")])
+    databases.update(db={"modified": "2024-01-01T00:00:00"}, search={"modified": "2024-01-01T00:00:00"})
+    cache = ResolutionCache(str(tmp_path / "cache" / "resolutions.sqlite"))
+    first = resolved(main, search, cache, monkeypatch)
+    assert first[0] == {"p1": ("db", "a1"), "p2": ("db", "a2"), "p4": ("search", "s1")}
+    assert first[1] == [("p3", "a9")] and first[2] == [("p5", ["glass"])]
+    assert len(lookups) == 5
+    lookups.clear()
+    ActivityIndex.clear_cache()
+    assert resolved(main, search, ResolutionCache(cache.path), monkeypatch) == first
+    assert lookups == []
+    assert ActivityIndex._cache == {}
+
+
+def test_changed_database_is_looked_up_again(lookups, databases, tmp_path, monkeypatch):
+    main = Database("db", [activity("a1", "brick"), activity("a2", "timber")])
+    search = Database("search", [activity("s1", "steel", "search")])
+    databases.update(db={"modified": "2024-01-01T00:00:00"}, search={"modified": "2024-01-01T00:00:00"})
+    cache = ResolutionCache(str(tmp_path / "resolutions.sqlite"))
+    resolved(main, search, cache, monkeypatch)
+    lookups.clear()
+    # only the search database changed, so only the searches go back to the index
+    search.append(activity("s2", "glass", "search"))
+    databases["search"] = {"modified": "2024-01-02T00:00:00"}
+    activityLib, not_found_code, not_found_search = resolved(main, search, cache, monkeypatch)
+    assert sorted(kind for kind, _ in lookups) == ["search", "search"]
+    assert activityLib["p5"] == ("search", "s2") and not_found_search == []
+    lookups.clear()
+    databases["db"] = {"modified": "2024-01-02T00:00:00"}
+    resolved(main, search, cache, monkeypatch)
+    assert sorted(kind for kind, _ in lookups) == ["code", "code", "code"]
@@ -0,0 +1,85 @@
+'''
+Incremental aggregation (impacts.aggregate with previous) compared with summing the source store again from scratch.
+'''
+
+import numpy as np
+import pytest
+from brwy4build.Objects.impacts import ImpactStore, aggregate, RESULT_SCALAR_MODULES, RESULT_ARRAY_MODULES
+
+N_OBJECTS, MF_MCS, N_METHODS, MC_PICK = 12, 4, 3, 5
+# consecutive groups are summed as segments, the others slot by slot
+CONSECUTIVE = [[0, 1, 2], [3, 4], [5], [6, 7, 8, 9, 10, 11]]
+SCATTERED = [[4, 0], [1, 2, 3], [0, 11], [], [7, 5, 9]]
+
+
+def random_store(rng: np.random.Generator) -> ImpactStore:
+    store = ImpactStore(N_OBJECTS, MF_MCS, N_METHODS, MC_PICK)
+    for tensor in store.tensors.values():
+        tensor.data[...] = rng.uniform(-1, 1, tensor.data.shape)
+    return store
+
+
+def write(store: ImpactStore, rng: np.random.Generator, modules: list):
+    '''writes new results into some modules the way the stages do, through module_views'''
+    for module in modules:
+        for view in store.module_views(module).values():
+            view[...] = rng.uniform(-1, 1, view.shape)
+
+
+def assert_same_store(actual: ImpactStore, expected: ImpactStore):
+    for kind, tensor in expected.tensors.items():
+        assert actual.tensors[kind].modules == tensor.modules
+        np.testing.assert_allclose(actual.tensors[kind].data, tensor.data, rtol=1e-12, atol=1e-12, err_msg=kind)
+
+
+@pytest.mark.parametrize("groups", [CONSECUTIVE, SCATTERED])
+def test_incremental_matches_full(groups):
+    rng = np.random.default_rng(0)
+    source = random_store(rng)
+    previous = aggregate(source, groups)
+    for modules in (["c4_sen1", "c4_sen3", "d_standard", "d_rpc"], ["a1a3"], ["b4", "c3", "d1"], list(RESULT_SCALAR_MODULES)):
+        write(source, rng, modules)
+        incremental = aggregate(source, groups, previous=previous)
+        assert incremental is previous
+        assert_same_store(incremental, aggregate(source, groups))
+
+
+@pytest.mark.parametrize("groups", [CONSECUTIVE, SCATTERED])
+def test_only_written_modules_are_summed(groups):
+    rng = np.random.default_rng(1)
+    source = random_store(rng)
+    previous = aggregate(source, groups)
+    versions = dict(previous.versions)
+    write(source, rng, ["d_rpc"])
+    aggregate(source, groups, previous=previous)
+    assert {module for module, version in previous.versions.items() if version != versions[module]} == {"d_rpc"}
+
+
+def test_nothing_written_returns_previous_as_is():
+    rng = np.random.default_rng(2)
+    source = random_store(rng)
+    previous = aggregate(source, CONSECUTIVE)
+    versions = dict(previous.versions)
+    # modules that are not summed do not matter
+    write(source, rng, ["b4_materials", "d2_rec"])
+    assert aggregate(source, CONSECUTIVE, previous=previous) is previous
+    assert previous.versions == versions
+
+
+def test_other_source_or_groups_are_summed_again():
+    rng = np.random.default_rng(3)
+    source = random_store(rng)
+    previous = aggregate(source, CONSECUTIVE)
+    other_groups = aggregate(source, SCATTERED, previous=previous)
+    assert other_groups is not previous
+    assert_same_store(other_groups, aggregate(source, SCATTERED))
+    other_source = random_store(rng)
+    again = aggregate(other_source, CONSECUTIVE, previous=previous)
+    assert again is not previous
+    assert_same_store(again, aggregate(other_source, CONSECUTIVE))
+
+
+def test_summed_modules():
+    store = aggregate(random_store(np.random.default_rng(4)), CONSECUTIVE)
+    assert store.tensors["impacts"].modules == RESULT_SCALAR_MODULES
+    assert store.tensors["impactsMC_array"].modules == RESULT_ARRAY_MODULES
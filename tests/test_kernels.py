@@ -0,0 +1,244 @@
+'''
+The batched stage kernels of Analysis (add_a1a3_a4 to add_d3) compared with the per product loops they replaced. The
+loops are kept here as the reference: every stage is run on the synthetic project and each product must get the results
+the loop computes for it from the same LCA library and the same random streams. Products with a missing activity must
+keep the results they had before the stage, as the loops skipped them.
+'''
+
+import gc
+import weakref
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects.objects import Products, LCAh
+from brwy4build.Objects.impacts import ATTRIBUTES
+from brwy4build.Analysis.analyze import Analysis
+from brwy4build.Analysis.kernels import ActivityTable
+from brwy4build.utils.helper import randomChoiceArray, child_rng, seed_sequence
+from .synthetic import setup_project, synthetic_lca
+
+MC_PICK = 10
+MF_MCS = 20
+# activities removed from the library so the stages have products without them
+MISSING = [(1, "_a4"), (2, "_d2_rec"), (3, "_c4"), (4, "_Incineration"), (5, "_d2_rep"), (6, "_c3"), (7, "")]
+
+
+def library(key: str):
+    '''the static and Monte Carlo results of an activityLib key, None for a missing activity'''
+    lcah = LCAh.instances[0]
+    activity = lcah.activityLib.get(key)
+    if activity is None:
+        return None
+    return lcah.lcaLib.get(str(activity)), lcah.mclcaLib.get(str(activity))
+
+
+def scalar_a1a3_a4(product, rng, use_updated):
+    results = {}
+    a1a3 = library(f"{product.id}")
+    if a1a3 is None:
+        return results
+    impactsMC = randomChoiceArray(a1a3[1], MC_PICK, rng)
+    results["impacts_a1a3"] = np.multiply(a1a3[0], product.total_starting_amount*(1-product.recycled_content))
+    results["impactsMC_a1a3"] = np.multiply(impactsMC, product.total_starting_amount*(1-product.recycled_content))
+    a4 = library(f"{product.id}_a4")
+    if a4 is None:
+        return results
+    impactsMC = randomChoiceArray(a4[1], MC_PICK, rng)
+    results["impacts_a4"] = np.multiply(a4[0], product.total_starting_amount)
+    results["impactsMC_a4"] = np.multiply(impactsMC, product.total_starting_amount)
+    return results
+
+
+def scalar_b4(product, rng, use_updated):
+    n_methods = len(next(iter(LCAh.instances[0].lcaLib.values())))
+    if product.number_of_reuses == 0 and product.number_of_replacements == 0 and product.number_of_replacements_updated == 0:
+        return {"impacts_b4": np.zeros(n_methods), "impactsMC_b4": np.zeros((1, n_methods, MC_PICK)),
+                "impacts_b4_array": np.zeros((MF_MCS, n_methods)), "impactsMC_b4_array": np.zeros((MF_MCS, n_methods, MC_PICK))}
+    results = {}
+    amount = product.replaced_amount_updated if use_updated else product.replaced_amount
+    amount_array = product.replaced_amount_updated_array
+    material = library(f"{product.id}")
+    if material is None:
+        return results
+    impactsMC = randomChoiceArray(material[1], MC_PICK, rng)
+    results["impacts_b4_materials"] = np.multiply(material[0], amount*(1-product.recycled_content))
+    results["impactsMC_b4_materials"] = np.multiply(impactsMC, amount*(1-product.recycled_content))
+    results["impacts_b4_materials_array"] = np.multiply(material[0].reshape(1, -1), amount_array.reshape(-1, 1)*(1-product.recycled_content))
+    results["impactsMC_b4_materials_array"] = np.multiply(impactsMC, amount_array.reshape(-1, 1, 1)*(1-product.recycled_content))
+    transport = library(f"{product.id}_a4")
+    if transport is None:
+        return results
+    impactsMC = randomChoiceArray(transport[1], MC_PICK, rng)
+    results["impacts_b4_transport"] = np.multiply(transport[0], amount)
+    results["impactsMC_b4_transport"] = np.multiply(impactsMC, amount)
+    results["impacts_b4_transport_array"] = np.multiply(transport[0].reshape(1, -1), amount_array.reshape(-1, 1))
+    results["impactsMC_b4_transport_array"] = np.multiply(impactsMC, amount_array.reshape(-1, 1, 1))
+    for kind in ("impacts_b4", "impactsMC_b4", "impacts_b4_array", "impactsMC_b4_array"):
+        results[kind] = np.add(results[kind.replace("b4", "b4_materials")], results[kind.replace("b4", "b4_transport")])
+    return results
+
+
+def scalar_c2(product, rng, use_updated):
+    amount = product.total_amount_with_replacements_updated if use_updated else product.total_amount_with_replacements
+    c2 = library("c2_transport")
+    if c2 is None:
+        return {}
+    amount_array = product.total_amount_with_replacements_array_updated
+    impactsMC = randomChoiceArray(c2[1], MC_PICK, rng)
+    return {"impacts_c2": np.multiply(c2[0], (amount*product.eol_transport_distance)/1000),
+            "impactsMC_c2": np.multiply(impactsMC, (amount*product.eol_transport_distance)/1000),
+            "impacts_c2_array": np.multiply(c2[0].reshape(1, -1), (amount_array.reshape(-1, 1)*product.eol_transport_distance)/1000),
+            "impactsMC_c2_array": np.multiply(impactsMC, (amount_array.reshape(-1, 1, 1)*product.eol_transport_distance)/1000)}
+
+
+def scalar_c3(product, rng, use_updated):
+    if use_updated:
+        amount = product.total_amount_with_replacements_updated
+        number_of_replacements = product.number_of_replacements_updated
+    else:
+        amount = product.total_amount_with_replacements
+        number_of_replacements = product.number_of_replacements
+    amount_array = product.total_amount_with_replacements_array_updated
+    c3 = library(f"{product.id}_c3")
+    if c3 is None:
+        return {}
+    impactsMC = randomChoiceArray(c3[1], MC_PICK, rng)
+    results = {"impacts_c3": np.multiply(c3[0], amount), "impactsMC_c3": np.multiply(impactsMC, amount),
+               "impacts_c3_array": np.multiply(c3[0].reshape(1, -1), amount_array.reshape(-1, 1)),
+               "impactsMC_c3_array": np.multiply(impactsMC, amount_array.reshape(-1, 1, 1))}
+    # the biogenic content at a1a3 is taken off categories 1 and 2 when it is not positive
+    biogenic_content = product.impacts_a1a3[2] * (number_of_replacements+1)
+    biogenic_contentMC = np.multiply(product.impactsMC_a1a3[0][2], number_of_replacements)
+    if not biogenic_content > 0:
+        for category in (1, 2):
+            results["impacts_c3"][category] = np.subtract(results["impacts_c3"][category], biogenic_content)
+            results["impactsMC_c3"][0][category] = np.subtract(results["impactsMC_c3"][0][category], biogenic_contentMC)
+    return results
+
+
+def scalar_c4(product, rng, use_updated):
+    amount = product.total_amount_with_replacements_updated if use_updated else product.total_amount_with_replacements
+    amount_array = product.total_amount_with_replacements_array_updated
+    landfill = library(f"{product.id}_c4")
+    incineration = library(f"{product.id}_Incineration")
+    if landfill is None or incineration is None:
+        return {}
+    results = {}
+    for name, (impacts, impactsMC) in (("landfill", landfill), ("incineration", incineration)):
+        impactsMC = randomChoiceArray(impactsMC, MC_PICK, rng)
+        results[f"impacts_c4_{name}"] = np.multiply(impacts, amount * -1)
+        results[f"impactsMC_c4_{name}"] = np.multiply(impactsMC, amount * -1)
+        results[f"impacts_c4_array_{name}"] = np.multiply(impacts.reshape(1, -1), amount_array.reshape(-1, 1) * -1)
+        results[f"impactsMC_c4_array_{name}"] = np.multiply(impactsMC, amount_array.reshape(-1, 1, 1) * -1)
+    return results
+
+
+def scalar_d2(product, rng, use_updated):
+    amount = product.total_amount_with_replacements_updated if use_updated else product.total_amount_with_replacements
+    amount_array = product.total_amount_with_replacements_array_updated
+    results = {}
+    replacement = library(f"{product.id}_d2_rep")
+    if replacement is None:
+        return results
+    impactsMC_rep = randomChoiceArray(replacement[1], MC_PICK, rng)
+    results["impacts_d2_rep"] = np.multiply(replacement[0], amount * -1)
+    results["impactsMC_d2_rep"] = np.multiply(impactsMC_rep, amount * -1)
+    recycling = library(f"{product.id}_d2_rec")
+    if recycling is None:
+        return results
+    impactsMC_rec = randomChoiceArray(recycling[1], MC_PICK, rng)
+    results["impacts_d2_rec"] = np.multiply(recycling[0], amount)
+    results["impactsMC_d2_rec"] = np.multiply(impactsMC_rec, amount)
+    results["impacts_d2"] = np.add(results["impacts_d2_rec"], results["impacts_d2_rep"])
+    results["impactsMC_d2"] = np.add(results["impactsMC_d2_rec"], results["impactsMC_d2_rep"])
+    results["impacts_d2_array"] = np.add(np.multiply(recycling[0].reshape(1, -1), amount_array.reshape(-1, 1)),
+                                         np.multiply(replacement[0].reshape(1, -1), amount_array.reshape(-1, 1) * -1))
+    results["impactsMC_d2_array"] = np.add(np.multiply(impactsMC_rec, amount_array.reshape(-1, 1, 1)),
+                                           np.multiply(impactsMC_rep, amount_array.reshape(-1, 1, 1) * -1))
+    return results
+
+
+def scalar_d3(products, seed, use_updated):
+    '''add_d3 draws the heat and electricity iterations once for all products, {product id: results}'''
+    rng = np.random.default_rng(seed_sequence(seed))
+    # the heat activity was always looked up under d3_elec and the electricity activity under d3_heat
+    heat_impacts, heat_impactsMC = library("d3_elec")
+    heat_impactsMC = randomChoiceArray(heat_impactsMC, MC_PICK, rng)
+    elec_impacts, elec_impactsMC = library("d3_heat")
+    elec_impactsMC = randomChoiceArray(elec_impactsMC, MC_PICK, rng)
+    out = {}
+    for product in products:
+        amount = product.total_amount_with_replacements_updated if use_updated else product.total_amount_with_replacements
+        amount_array = product.total_amount_with_replacements_array_updated
+        results = {"impacts_d3_heat": np.multiply(heat_impacts, amount * -1 * 0.2*product.lhv),
+                   "impactsMC_d3_heat": np.multiply(heat_impactsMC, amount * -1 * 0.2*product.lhv),
+                   "impacts_d3_elec": np.multiply(elec_impacts, amount * -1 * 0.1*product.lhv),
+                   "impactsMC_d3_elec": np.multiply(elec_impactsMC, amount * -1 * 0.1*product.lhv)}
+        results["impacts_d3"] = np.add(results["impacts_d3_elec"], results["impacts_d3_heat"])
+        results["impactsMC_d3"] = np.add(results["impactsMC_d3_elec"], results["impactsMC_d3_heat"])
+        results["impacts_d3_array"] = np.add(np.multiply(elec_impacts.reshape(1, -1), amount_array.reshape(-1, 1) * -1 * 0.1*product.lhv),
+                                             np.multiply(heat_impacts.reshape(1, -1), amount_array.reshape(-1, 1) * -1 * 0.2*product.lhv))
+        results["impactsMC_d3_array"] = np.add(np.multiply(elec_impactsMC, amount_array.reshape(-1, 1, 1) * -1 * 0.1*product.lhv),
+                                               np.multiply(heat_impactsMC, amount_array.reshape(-1, 1, 1) * -1 * 0.2*product.lhv))
+        out[product.id] = results
+    return out
+
+
+def per_product(scalar):
+    def stage(products, seed, use_updated):
+        return {product.id: scalar(product, child_rng(seed, product.id), use_updated) for product in products}
+    return stage
+
+
+STAGES = [
+    ("a1a3_a4", lambda use_updated, seed: Analysis.add_a1a3_a4(mc_pick=MC_PICK, seed=seed), per_product(scalar_a1a3_a4)),
+    ("b4", lambda use_updated, seed: Analysis.add_b4(use_updated=use_updated, mc_pick=MC_PICK, mf_mcs=MF_MCS, seed=seed), per_product(scalar_b4)),
+    ("c2", lambda use_updated, seed: Analysis.add_c2(use_updated=use_updated, mc_pick=MC_PICK, seed=seed), per_product(scalar_c2)),
+    ("c3", lambda use_updated, seed: Analysis.add_c3(use_updated=use_updated, mc_pick=MC_PICK, seed=seed), per_product(scalar_c3)),
+    ("c4", lambda use_updated, seed: Analysis.add_c4(use_updated=use_updated, mc_pick=MC_PICK, seed=seed), per_product(scalar_c4)),
+    ("d2", lambda use_updated, seed: Analysis.add_d2(use_updated=use_updated, mc_pick=MC_PICK, seed=seed), per_product(scalar_d2)),
+    ("d3", lambda use_updated, seed: Analysis.add_d3(use_updated=use_updated, mc_pick=MC_PICK, seed=seed), scalar_d3),
+]
+
+
+def snapshot(products) -> dict:
+    return {product.id: {attribute: np.array(getattr(product, attribute)) for attribute in ATTRIBUTES} for product in products}
+
+
+@pytest.mark.parametrize("use_updated", [True, False])
+def test_kernels_match_the_product_loops(model, workbook, use_updated):
+    setup_project(workbook, mf_mcs=MF_MCS)
+    lcah = synthetic_lca()
+    ids = [product.id for product in Products.instances]
+    for position, suffix in MISSING:
+        lcah.activityLib.pop(ids[position] + suffix)
+    Analysis.allocate_results(mc_pick=MC_PICK, mf_mcs=MF_MCS)
+    products = Analysis.product_store.objects
+    for k, (name, kernel, scalar) in enumerate(STAGES):
+        seed = 1000 + k
+        before = snapshot(products)
+        expected = scalar(products, seed, use_updated)
+        kernel(use_updated, seed)
+        for product in products:
+            for attribute in ATTRIBUTES:
+                want = expected[product.id].get(attribute, before[product.id][attribute])
+                np.testing.assert_allclose(getattr(product, attribute), want, rtol=1e-12, atol=1e-12,
+                                           err_msg=f"{name}: {attribute} of {product.id}")
+
+
+def test_every_lca_keeps_its_activity_table(model, workbook):
+    setup_project(workbook, mf_mcs=MF_MCS)
+    first, second = synthetic_lca(seed=1), synthetic_lca(seed=2)
+    tables = ActivityTable.of(first), ActivityTable.of(second)
+    assert ActivityTable.of(first) is tables[0] and ActivityTable.of(second) is tables[1]
+    assert not np.array_equal(tables[0].impactsMC, tables[1].impactsMC)
+    # replaced libraries are stacked again, the table of the other lca is kept
+    first.mclcaLib = dict(first.mclcaLib)
+    assert ActivityTable.of(first) is not tables[0] and ActivityTable.of(second) is tables[1]
+    # the table does not keep its lca alive
+    LCAh.instances.remove(first)
+    dropped = weakref.ref(first)
+    del first, tables
+    gc.collect()
+    assert dropped() is None and second in ActivityTable._tables
@@ -0,0 +1,117 @@
+'''
+Checkpoints of the LCA libraries: a build stopped partway is resumed from the files it wrote, and only the activities
+without results are computed again. The batched LCA and the Monte Carlo LCA of a block are stubbed.
+'''
+
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects import lca_engine, objects
+from brwy4build.Objects.lca_checkpoint import LCACheckpoint, atomic_write
+from brwy4build.Objects.lca_engine import activity_seed
+from .technosphere import ACTIVITIES, METHODS, install, lcah
+
+
+class Interrupted(Exception):
+    '''stands for a run that was stopped'''
+
+
+def unit_scores(act) -> np.ndarray:
+    return np.arange(len(METHODS)) + 10.0 * ACTIVITIES.index(act)
+
+
+def block(act, iterations: int, seed: int) -> np.ndarray:
+    return np.random.RandomState(seed).uniform(size=(len(METHODS), iterations))
+
+
+@pytest.fixture
+def computed(monkeypatch) -> dict:
+    '''the activities the stubs computed, {"lca": [...], "mclca": [...]}, and how many they compute before they stop'''
+    install(monkeypatch)
+    state = {"lca": [], "mclca": [], "stop after": None}
+
+    def stop(library: str):
+        if state["stop after"] is not None and len(state[library]) >= state["stop after"]:
+            raise Interrupted()
+
+    class BatchLCA:
+        def __init__(self, activities, methods, block_size=256):
+            self.methods = methods
+
+        def scores(self, activities):
+            stop("lca")
+            state["lca"].extend(str(act) for act in activities)
+            return np.column_stack([unit_scores(act) for act in activities])
+
+    def monte_carlo_scores(act, methods, iterations, seed=None):
+        stop("mclca")
+        state["mclca"].append(str(act))
+        return block(act, iterations, seed)
+
+    monkeypatch.setattr(objects, "BatchLCA", BatchLCA)
+    monkeypatch.setattr(lca_engine, "monte_carlo_scores", monte_carlo_scores)
+    return state
+
+
+def stopped_write(path: str):
+    '''a write that was stopped before it was renamed, it leaves a .tmp file'''
+    def write(file):
+        file.write(b"partial")
+        raise Interrupted()
+    with pytest.raises(Interrupted):
+        atomic_write(path, write)
+    assert os.path.isfile(f"{path}.tmp") and not os.path.exists(path)
+
+
+def test_resume_lca(computed, tmp_path):
+    checkpoint = LCACheckpoint(str(tmp_path / "checkpoint"))
+    computed["stop after"] = 6
+    with pytest.raises(Interrupted):
+        lcah().get_lca_lib(block_size=3, checkpoint=checkpoint)
+    written = list(computed["lca"])
+    missing = [act for act in ACTIVITIES if str(act) not in written]
+    assert len(written) == 6
+    stopped_write(checkpoint.path("lca", str(missing[0])))
+    lca = lcah()
+    lca.resume(checkpoint)
+    assert sorted(lca.lcaLib) == sorted(written)
+    computed["lca"].clear()
+    computed["stop after"] = None
+    lca.get_lca_lib(block_size=3, resume=True, checkpoint=checkpoint)
+    assert sorted(computed["lca"]) == sorted(str(act) for act in missing)
+    assert sorted(lca.lcaLib) == sorted(str(act) for act in ACTIVITIES)
+    for act in ACTIVITIES:
+        np.testing.assert_array_equal(lca.lcaLib[str(act)], unit_scores(act))
+    assert sorted(checkpoint.read("lca")) == sorted(lca.lcaLib)
+
+
+def test_resume_monte_carlo(computed, tmp_path):
+    checkpoint = LCACheckpoint(str(tmp_path / "checkpoint"))
+    computed["stop after"] = 5
+    with pytest.raises(Interrupted):
+        lcah().get_multiImpactMonteCarloLCA(iterations=4, seed=9, checkpoint=checkpoint)
+    written = list(computed["mclca"])
+    missing = [act for act in ACTIVITIES if str(act) not in written]
+    stopped_write(checkpoint.path("mclca", str(missing[0])))
+    lca = lcah()
+    lca.resume(checkpoint)
+    assert sorted(lca.mclcaLib) == sorted(written)
+    assert lca.mc_plan == [4] and lca.mc_seed == 9 and lca.mc_sampling == "independent"
+    assert lca.mc_done == {key: 1 for key in written}
+    computed["mclca"].clear()
+    computed["stop after"] = None
+    lca.get_multiImpactMonteCarloLCA(iterations=4, seed=9, extend=True, checkpoint=checkpoint)
+    assert sorted(computed["mclca"]) == sorted(str(act) for act in missing)
+    for act in ACTIVITIES:
+        np.testing.assert_array_equal(lca.mclcaLib[str(act)][0], block(act, 4, activity_seed(9, act)))
+    assert sorted(checkpoint.read("mclca")) == sorted(str(act) for act in ACTIVITIES)
+
+
+def test_new_run_clears_the_checkpoint(computed, tmp_path):
+    checkpoint = LCACheckpoint(str(tmp_path / "checkpoint"))
+    lcah(ACTIVITIES[:4]).get_multiImpactMonteCarloLCA(iterations=4, seed=9, checkpoint=checkpoint)
+    lcah(ACTIVITIES[4:6]).get_multiImpactMonteCarloLCA(iterations=2, seed=3, checkpoint=checkpoint)
+    assert sorted(checkpoint.read("mclca")) == sorted(str(act) for act in ACTIVITIES[4:6])
+    assert checkpoint.read_state()["mc_plan"] == [2]
@@ -0,0 +1,92 @@
+'''
+The batched LCA engine on the synthetic technosphere of tests/technosphere.py, compared with one solve per activity, and
+the seeds of its Monte Carlo runs.
+'''
+
+import multiprocessing
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects.lca_engine import (BatchLCA, characterization_stack, monte_carlo_scores, activity_seed,
+                                           shared_monte_carlo_runs, shared_seed)
+from .technosphere import (ACTIVITIES, METHODS, CHARACTERIZATION, BIOSPHERE, SAMPLINGS, LCA, MonteCarloLCA, install, score,
+                           lcah)
+
+
+@pytest.fixture
+def technosphere(monkeypatch):
+    install(monkeypatch)
+
+
+def test_characterization_stack_sums_the_columns(technosphere):
+    stack = characterization_stack(LCA({}), METHODS)
+    assert stack.shape == (len(METHODS), BIOSPHERE.shape[0])
+    for m, method in enumerate(METHODS):
+        np.testing.assert_allclose(stack[m].toarray()[0], CHARACTERIZATION[method].toarray().sum(axis=0))
+
+
+@pytest.mark.parametrize("block_size", [1, 5, 256])
+def test_batch_scores_match_one_lca_per_activity(technosphere, block_size):
+    activities = ACTIVITIES[::-1][:10]
+    scores = BatchLCA(activities, METHODS, block_size=block_size).scores(activities)
+    expected = np.array([[score(activity, method) for activity in activities] for method in METHODS])
+    assert scores.shape == (len(METHODS), len(activities))
+    np.testing.assert_allclose(scores, expected, rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the workers only see the synthetic technosphere when they are forked")
+def test_monte_carlo_draws_do_not_depend_on_the_workers(technosphere):
+    libraries = []
+    for workers in (1, 2):
+        lca = lcah()
+        lca.get_multiImpactMonteCarloLCA(iterations=4, workers=workers, seed=11)
+        libraries.append(lca.mclcaLib)
+    serial, pooled = libraries
+    assert sorted(serial) == sorted(pooled) == sorted(str(activity) for activity in ACTIVITIES)
+    for activity in ACTIVITIES:
+        (results,) = pooled[str(activity)]
+        assert results.shape == (len(METHODS), 4)
+        np.testing.assert_array_equal(results, serial[str(activity)][0])
+        np.testing.assert_array_equal(results, monte_carlo_scores(activity, METHODS, 4, activity_seed(11, activity)))
+
+
+def shared_runs(plan: list, done: dict, seed) -> dict:
+    '''{(str(act), block): scores} of shared_monte_carlo_runs'''
+    return {(str(act), block): results for act, block, results in shared_monte_carlo_runs(ACTIVITIES, METHODS, plan, done, seed=seed)}
+
+
+def test_shared_sampling_samples_once_per_iteration(technosphere):
+    runs = shared_runs([5], {}, seed=3)
+    assert SAMPLINGS["technosphere"] == 5
+    assert sorted(runs) == sorted((str(activity), 0) for activity in ACTIVITIES)
+    assert all(results.shape == (len(METHODS), 5) for results in runs.values())
+    # a new block is sampled once for all the activities that miss it, activities that have it are not solved again
+    SAMPLINGS["technosphere"] = 0
+    extended = shared_runs([5, 3], {str(ACTIVITIES[0]): 1, str(ACTIVITIES[1]): 1}, seed=3)
+    assert SAMPLINGS["technosphere"] == 5 + 3
+    assert (str(ACTIVITIES[0]), 0) not in extended and (str(ACTIVITIES[0]), 1) in extended
+    for activity in ACTIVITIES[2:]:
+        np.testing.assert_array_equal(extended[str(activity), 0], runs[str(activity), 0])
+
+
+def test_shared_sampling_is_reproducible(technosphere):
+    first = shared_runs([4], {}, seed=3)
+    again = shared_runs([4], {}, seed=3)
+    other = shared_runs([4], {}, seed=4)
+    for key, results in first.items():
+        np.testing.assert_array_equal(results, again[key])
+        assert not np.array_equal(results, other[key])
+
+
+def test_shared_sampling_solves_every_activity_on_the_same_sample(technosphere):
+    '''with one iteration the scores are those of one sampled technosphere and biosphere for all activities'''
+    runs = shared_runs([1], {}, seed=3)
+    sample = MonteCarloLCA({}, seed=shared_seed(3))
+    sample.load_data()
+    sample.rebuild_technosphere_matrix(sample.tech_rng.next())
+    sample.rebuild_biosphere_matrix(sample.bio_rng.next())
+    for activity in ACTIVITIES:
+        expected = [score(activity, method, sample.technosphere_matrix, sample.biosphere_matrix) for method in METHODS]
+        np.testing.assert_allclose(runs[str(activity), 0][:, 0], expected, rtol=1e-10, atol=1e-12)
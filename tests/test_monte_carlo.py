@@ -0,0 +1,92 @@
+'''
+The Monte Carlo blocks of LCAh.get_multiImpactMonteCarloLCA: extending a run keeps the iterations it has and continues
+the seed streams of its activities. The Monte Carlo LCA of a block is stubbed by draws from the seed of the block.
+'''
+
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects import lca_engine
+from brwy4build.Objects.lca_engine import activity_seed
+from .technosphere import ACTIVITIES, METHODS, install, lcah
+
+
+def block(act, iterations: int, seed: int) -> np.ndarray:
+    '''the stubbed (methods, iterations) scores of a block of act'''
+    return np.random.RandomState(seed).uniform(size=(len(METHODS), iterations))
+
+
+@pytest.fixture
+def runs(monkeypatch) -> list:
+    '''the (str(act), iterations, seed) of every block that is run'''
+    install(monkeypatch)
+    calls = []
+
+    def monte_carlo_scores(act, methods, iterations, seed=None):
+        calls.append((str(act), iterations, seed))
+        return block(act, iterations, seed)
+
+    monkeypatch.setattr(lca_engine, "monte_carlo_scores", monte_carlo_scores)
+    return calls
+
+
+def test_extend_keeps_the_first_iterations(runs):
+    lca = lcah(ACTIVITIES[:5])
+    lca.get_multiImpactMonteCarloLCA(iterations=4, seed=9)
+    first = {key: results[0].copy() for key, results in lca.mclcaLib.items()}
+    runs.clear()
+    # an activity new to the library gets every block, the seed of the first run is kept
+    lca.activityLib["P5"] = ACTIVITIES[5]
+    lca.get_multiImpactMonteCarloLCA(iterations=7, seed=1234, extend=True)
+    assert lca.mc_plan == [4, 3] and lca.mc_seed == 9
+    assert lca.mc_done == {str(act): 2 for act in ACTIVITIES[:6]}
+    for act in ACTIVITIES[:5]:
+        (results,) = lca.mclcaLib[str(act)]
+        assert results.shape == (len(METHODS), 7)
+        np.testing.assert_array_equal(results[:, :4], first[str(act)])
+        np.testing.assert_array_equal(results[:, 4:], block(act, 3, activity_seed(9, act, 1)))
+    new = ACTIVITIES[5]
+    np.testing.assert_array_equal(lca.mclcaLib[str(new)][0],
+                                  np.concatenate([block(new, 4, activity_seed(9, new)), block(new, 3, activity_seed(9, new, 1))], axis=1))
+    assert sorted(runs) == sorted([(str(act), 3, activity_seed(9, act, 1)) for act in ACTIVITIES[:6]]
+                                  + [(str(new), 4, activity_seed(9, new))])
+
+
+def test_extend_to_as_many_iterations_runs_nothing(runs):
+    lca = lcah(ACTIVITIES[:3])
+    lca.get_multiImpactMonteCarloLCA(iterations=4, seed=9)
+    runs.clear()
+    lca.get_multiImpactMonteCarloLCA(iterations=4, seed=9, extend=True)
+    lca.get_multiImpactMonteCarloLCA(iterations=2, seed=9, extend=True)
+    assert runs == [] and lca.mc_plan == [4]
+    assert all(results[0].shape == (len(METHODS), 4) for results in lca.mclcaLib.values())
+
+
+def test_blocks_done_follow_the_plan(runs):
+    lca = lcah(ACTIVITIES[:3])
+    lca.get_multiImpactMonteCarloLCA(iterations=2, seed=9)
+    lca.get_multiImpactMonteCarloLCA(iterations=5, seed=9, extend=True)
+    lca.get_multiImpactMonteCarloLCA(iterations=6, seed=9, extend=True)
+    assert lca.mc_plan == [2, 3, 1]
+    assert lca.mc_done == {str(act): 3 for act in ACTIVITIES[:3]}
+    for act in ACTIVITIES[:3]:
+        expected = [block(act, iterations, activity_seed(9, act, b)) for b, iterations in enumerate(lca.mc_plan)]
+        np.testing.assert_array_equal(lca.mclcaLib[str(act)][0], np.concatenate(expected, axis=1))
+
+
+def test_extend_a_library_saved_without_blocks(runs):
+    '''a library of an older version has no mc_plan, the iterations it holds are its first block'''
+    lca = lcah(ACTIVITIES[:3])
+    rng = np.random.RandomState(0)
+    saved = {str(act): [rng.uniform(size=(len(METHODS), 4))] for act in ACTIVITIES[:3]}
+    lca.mclcaLib = dict(saved)
+    del lca.mc_plan, lca.mc_done, lca.mc_seed, lca.mc_sampling
+    lca.get_multiImpactMonteCarloLCA(iterations=6, seed=9, extend=True)
+    assert lca.mc_plan == [4, 2] and lca.mc_seed == 9 and lca.mc_sampling == "independent"
+    assert lca.mc_done == {str(act): 2 for act in ACTIVITIES[:3]}
+    for act in ACTIVITIES[:3]:
+        (results,) = lca.mclcaLib[str(act)]
+        np.testing.assert_array_equal(results[:, :4], saved[str(act)][0])
+        np.testing.assert_array_equal(results[:, 4:], block(act, 2, activity_seed(9, act, 1)))
+    assert sorted(runs) == sorted((str(act), 2, activity_seed(9, act, 1)) for act in ACTIVITIES[:3])
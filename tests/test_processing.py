@@ -0,0 +1,76 @@
+'''
+The summaries of utils/processing.py compared with the statistics the exports computed before, one np.mean, np.median,
+np.std, np.min, np.max and np.percentile call per array and impact category, on arrays in memory and memory mapped.
+'''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("brightway2")
+pytest.importorskip("matplotlib")
+from brwy4build.utils import processing
+from brwy4build.utils.processing import STATISTICS, summarise, summary_table, load_all_arrays
+
+CATEGORIES = ["climate change", "ozone depletion", "acidification", "eutrophication"]
+# (scenarios, impact categories, iterations) with an odd and an even number of values per category, and more categories
+# than the lca has
+SHAPES = {"A_odd": (3, 4, 7), "B_even": (4, 4, 5), "C_single": (1, 4, 1), "D_more": (2, 6, 9)}
+
+
+def per_slice(arr, i: int) -> dict:
+    '''the statistics of impact category i the way the exports computed them'''
+    arr_1d = arr[:, i, :].flatten()
+    return {"mean": np.mean(arr_1d), "median": np.median(arr_1d), "std_dev": np.std(arr_1d), "min": np.min(arr_1d),
+            "decile1": np.percentile(arr_1d, 10), "quartile1": np.percentile(arr_1d, 25),
+            "quartile3": np.percentile(arr_1d, 75), "decile3": np.percentile(arr_1d, 30), "max": np.max(arr_1d)}
+
+
+@pytest.fixture
+def folder(tmp_path) -> str:
+    rng = np.random.default_rng(0)
+    for name, shape in SHAPES.items():
+        values = rng.lognormal(0, 1, shape) - 1
+        # ties, so the order statistics are read from equal neighbours too
+        values[..., ::3] = np.round(values[..., ::3], 1)
+        np.save(tmp_path / f"{name}.npy", values)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("mmap_mode", [None, "r"])
+def test_summarise_matches_the_per_slice_statistics(folder, mmap_mode):
+    for name, arr in load_all_arrays(folder, mmap_mode=mmap_mode).items():
+        summary = summarise(arr, len(CATEGORIES))
+        assert set(summary) == set(STATISTICS)
+        for i in range(len(CATEGORIES)):
+            expected = per_slice(np.asarray(arr), i)
+            for statistic in STATISTICS:
+                np.testing.assert_allclose(summary[statistic][i], expected[statistic], rtol=1e-12, atol=1e-12,
+                                           err_msg=f"{statistic} of category {i} of {name}")
+
+
+@pytest.mark.parametrize("mmap_mode", [None, "r"])
+def test_summary_table_matches_the_per_slice_statistics(folder, mmap_mode):
+    table = summary_table(load_all_arrays(folder, mmap_mode=mmap_mode), CATEGORIES)
+    assert list(table.columns) == ["array", "impact_category"] + list(STATISTICS)
+    assert len(table) == len(SHAPES) * len(CATEGORIES)
+    arrays = load_all_arrays(folder)
+    for row in table.itertuples(index=False):
+        expected = per_slice(arrays[row.array], CATEGORIES.index(row.impact_category))
+        np.testing.assert_allclose([getattr(row, statistic) for statistic in STATISTICS],
+                                   [expected[statistic] for statistic in STATISTICS], rtol=1e-12, atol=1e-12)
+
+
+def test_csv_export(folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(processing, "impact_categories", lambda: CATEGORIES)
+    path = str(tmp_path / "summary.csv")
+    processing.export_to_csv(folder, filename=path, mmap_mode="r")
+    pd.testing.assert_frame_equal(pd.read_csv(path), summary_table(load_all_arrays(folder), CATEGORIES))
+
+
+def test_parquet_export(folder, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(processing, "impact_categories", lambda: CATEGORIES)
+    path = str(tmp_path / "summary.parquet")
+    processing.export_to_parquet(folder, filename=path)
+    pd.testing.assert_frame_equal(pd.read_parquet(path), summary_table(load_all_arrays(folder), CATEGORIES))
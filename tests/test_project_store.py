@@ -0,0 +1,147 @@
+'''
+The project store: the datasets are written item by item and read back unchanged, and a synthetic project saved by
+save_project and save_lca is loaded with the same results, from its store or from the pickle of older versions.
+'''
+
+import json
+import os
+import pickle
+import tracemalloc
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects.objects import Products, Assemblies, Building, Relations, LCAh
+from brwy4build.Objects.impacts import ATTRIBUTES
+from brwy4build.Objects.model import Model
+from brwy4build.Objects.project_store import write_datasets, FORMAT_VERSION
+from brwy4build.Analysis.analyze import Analysis
+from brwy4build.run import main
+from brwy4build.utils.helper import child_seed
+from .synthetic import setup_project, synthetic_lca
+from .test_streaming import results, assert_same
+
+MC_PICK, MF_MCS, SEED = 10, 20, 321
+
+
+def test_datasets_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    arrays = {"same": [rng.uniform(size=(3, 4)) for _ in range(5)],
+              "single": [np.arange(6).reshape(2, 3)],
+              "empty": [np.zeros((3, 0)) for _ in range(2)],
+              "strings": [np.array(["a", "bc", "def"]) for _ in range(3)],
+              "mixed": [np.zeros(3), np.ones((2, 2)), np.arange(4, dtype=np.int32)]}
+    datasets = write_datasets(str(tmp_path), arrays)
+    for group, items in arrays.items():
+        dataset = datasets[group]
+        assert dataset["stacked"] == (group != "mixed")
+        if dataset["stacked"]:
+            stored = np.load(os.path.join(tmp_path, dataset["file"]))
+            assert list(stored.shape) == dataset["shape"] and stored.dtype.str == dataset["dtype"]
+            for index, item in enumerate(items):
+                np.testing.assert_array_equal(stored[index], item)
+        else:
+            for file, item in zip(dataset["files"], items):
+                stored = np.load(os.path.join(tmp_path, file))
+                assert stored.dtype == item.dtype
+                np.testing.assert_array_equal(stored, item)
+
+
+def test_stacked_dataset_is_not_copied_into_memory(tmp_path):
+    # the items are mapped from a file, so only a copy of the whole group would show in the traced allocations
+    n_items, shape = 20, (256, 256)
+    source = np.lib.format.open_memmap(str(tmp_path / "source.npy"), mode="w+", dtype=np.float64, shape=(n_items,) + shape)
+    source[...] = 1.5
+    source.flush()
+    items = list(np.load(str(tmp_path / "source.npy"), mmap_mode="r"))
+    tracemalloc.start()
+    try:
+        datasets = write_datasets(str(tmp_path / "store"), {"group": items})
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < source.nbytes / 4
+    stored = np.load(os.path.join(tmp_path, "store", datasets["group"]["file"]), mmap_mode="r")
+    assert stored.shape == source.shape and np.all(stored == 1.5)
+
+
+def project() -> dict:
+    '''the results of every product, assembly and building, the relations and the lca of the current model'''
+    lca = LCAh.instances[0]
+    return {"products": results(Products.instances, list(ATTRIBUTES)), "assemblies": results(Assemblies.instances),
+            "building": results(Building.instances),
+            "relations": {relation.t: (relation.ct, relation.ca, relation.cr, relation.fc, relation.is_connection,
+                                       getattr(relation, "type", None), getattr(relation, "can_be_detached", None))
+                          for relation in Relations.instances},
+            "replacements": {product.id: (list(product.years_of_replacements_updated), list(product.disassembly_years))
+                             for product in Products.instances},
+            "reuse_matrix": np.array(Products.reuse_matrix), "lcaLib": dict(lca.lcaLib),
+            "mclcaLib": {key: results[0] for key, results in lca.mclcaLib.items()}}
+
+
+def assert_same_project(actual: dict, expected: dict, reuse_matrix: bool = True):
+    for part in ("products", "assemblies", "building"):
+        assert_same(actual[part], expected[part])
+    assert actual["relations"] == expected["relations"]
+    assert actual["replacements"] == expected["replacements"]
+    if reuse_matrix:
+        np.testing.assert_array_equal(actual["reuse_matrix"], expected["reuse_matrix"])
+    for library in ("lcaLib", "mclcaLib"):
+        assert actual[library].keys() == expected[library].keys()
+        for key, value in expected[library].items():
+            np.testing.assert_array_equal(actual[library][key], value)
+
+
+@pytest.fixture(scope="module")
+def saved(workbook, tmp_path_factory) -> tuple:
+    '''the folder the synthetic project and its lca are saved in and their results'''
+    folder = str(tmp_path_factory.mktemp("saved"))
+    with Model("saved").active():
+        setup_project(workbook, mf_mcs=MF_MCS)
+        synthetic_lca()
+        Analysis.product_lca(mc_simulations=MC_PICK, mf_mcs=MF_MCS, seed=SEED)
+        Analysis.generate_scenarios(mfa_mcs=MF_MCS, seed=child_seed(SEED, "scenarios"))
+        Analysis.generate_results(building=Building.instances[0])
+        main.save_project("synthetic", folder)
+        main.save_lca("synthetic", folder)
+        # the pickles of the versions before the store
+        os.makedirs(f"{folder}/pickled_save_folder")
+        os.makedirs(f"{folder}/pickled_lca_save_folder")
+        with open(f"{folder}/pickled_save_folder/save_project.p", "wb") as file:
+            pickle.dump(Building.instances, file)
+        with open(f"{folder}/pickled_lca_save_folder/save_lca.p", "wb") as file:
+            pickle.dump(LCAh.instances, file)
+        return folder, project()
+
+
+@pytest.mark.parametrize("mmap_mode", [None, "c"])
+def test_store_round_trip(model, saved, mmap_mode):
+    folder, expected = saved
+    main.load_project("synthetic", folder, mmap_mode=mmap_mode)
+    main.load_lca("synthetic", folder)
+    assert [len(registry) for registry in (Building.instances, Assemblies.instances, Products.instances, Relations.instances)] \
+        == [1, len(expected["assemblies"]), len(expected["products"]), len(expected["relations"])]
+    assert_same_project(project(), expected)
+    assert Products.get_product_by_id(Products.instances[0].id) is Products.instances[0]
+
+
+def test_pickle_round_trip(model, saved):
+    folder, expected = saved
+    main.load_project("pickled", folder)
+    main.load_lca("pickled", folder)
+    # the pickles only held the objects, not the reuse matrix of the class
+    assert_same_project(project(), expected, reuse_matrix=False)
+    assert Relations.get_relation_by_id(Relations.instances[0].t) is Relations.instances[0]
+
+
+def test_newer_format_version_is_refused(model, saved, tmp_path):
+    folder, _ = saved
+    store = f"{folder}/synthetic_save_folder/project_store"
+    with open(os.path.join(store, "metadata.json")) as file:
+        metadata = json.load(file)
+    metadata["format_version"] = FORMAT_VERSION + 1
+    os.makedirs(f"{tmp_path}/newer_save_folder/project_store")
+    with open(f"{tmp_path}/newer_save_folder/project_store/metadata.json", "w") as file:
+        json.dump(metadata, file)
+    with pytest.raises(ValueError, match="format version"):
+        main.load_project("newer", str(tmp_path))
@@ -0,0 +1,50 @@
+'''
+The indicators and is_connection the relations get from the Relations sheet, compared with reading the sheet one
+relation at a time with the pandas filters. They are checked right after the update, the detachment analysis of
+setup_analysis changes the indicators afterwards.
+'''
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects.objects import Relations
+from brwy4build.Analysis.analyze import Analysis
+
+INDICATOR_COLUMNS = {"ct": "Connection_type", "ca": "Connection_access", "cr": "Crossings", "fc": "Form_containment"}
+
+
+def test_user_input_matches_the_sheet(model, workbook):
+    Analysis.generate_objects(filename=workbook, default_rel=1)
+    Relations.update_connections_to_relations_objects(filename=workbook, mode="user input")
+    df = pd.read_excel(workbook, sheet_name="Relations")
+    assert len(Relations.instances) == len(df)
+    for relation in Relations.instances:
+        found = df.loc[df["Relation_id_as_tuple"] == str(relation.t)]
+        is_connection = bool(found["Is_connection"].values[0])
+        assert relation.is_connection is is_connection
+        for attribute, column in INDICATOR_COLUMNS.items():
+            assert getattr(relation, attribute) == (float(found[column]) if is_connection else 1)
+
+
+def test_not_connections_have_all_indicators_1(model, workbook):
+    Analysis.generate_objects(filename=workbook, default_rel=1)
+    Relations.update_connections_to_relations_objects(filename=workbook, mode="lowest_product")
+    assert any(not relation.is_connection for relation in Relations.instances)
+    for relation in Relations.instances:
+        expected = 0.1 if relation.is_connection else 1
+        assert (relation.ct, relation.ca, relation.cr, relation.fc) == (expected,) * 4
+
+
+def test_relation_missing_from_the_sheet(model, workbook, tmp_path):
+    Analysis.generate_objects(filename=workbook, default_rel=1)
+    sheets = pd.read_excel(workbook, sheet_name=None)
+    sheets["Relations"] = sheets["Relations"].iloc[1:]
+    path = str(tmp_path / "missing.xlsx")
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    with pytest.raises(SystemExit):
+        Relations.update_connections_to_relations_objects(filename=path, mode="user input")
+    with pytest.raises(IndexError):
+        Relations.relations_add_is_connection(filename=path)
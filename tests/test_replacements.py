@@ -0,0 +1,65 @@
+'''
+The topological engine of update_years_of_replacements_based_on_detachability compared with the bfs engine it replaced,
+on random disassembly sequence graphs.
+'''
+
+import random
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects.objects import Products
+
+TECHNICAL_LIVES = (0, 10, 15, 20, 25, 30)
+
+
+def build_products(rnd: random.Random, n: int, shuffle: bool = False, cycles: bool = False):
+    '''n products whose disassembly sequences only point to later products (a DAG listed in a topological order), in a
+    random order with shuffle and with some edges back to earlier products with cycles'''
+    Products.delete_all_instances()
+    ids = [f"P{i}" for i in range(n)]
+    order = list(range(n))
+    if shuffle:
+        rnd.shuffle(order)
+    for i in order:
+        later = ids[i + 1:]
+        sequence = rnd.sample(later, k=min(len(later), rnd.randint(0, 3)))
+        if cycles and i > 0 and rnd.random() < 0.1:
+            sequence.append(ids[rnd.randint(0, i)])
+        product = Products(product_id=ids[i], disassembly_sequence=";".join(sequence) if sequence else np.nan)
+        technical_life = rnd.choice(TECHNICAL_LIVES)
+        product.years_of_replacements = list(range(technical_life, 55, technical_life)) if technical_life else []
+        product.can_be_detached = rnd.random() < 0.5
+
+
+def propagate(engine: str) -> dict:
+    Products.update_years_of_replacements_based_on_detachability(engine=engine)
+    return {product.id: (list(product.years_of_replacements_updated), list(product.disassembly_years),
+                         list(product.disassembly_years_log)) for product in Products.instances}
+
+
+@pytest.mark.parametrize("trial", range(300))
+def test_topological_matches_bfs_on_dags(model, trial):
+    rnd = random.Random(trial)
+    build_products(rnd, rnd.randint(1, 40))
+    assert propagate("topological") == propagate("bfs")
+
+
+@pytest.mark.parametrize("shuffle, cycles", [(True, False), (False, True), (True, True)])
+def test_topological_matches_bfs_years_in_any_order(model, shuffle, cycles):
+    '''with the products in any order or with cycles the bfs engine depends on the order of the products, the sets of
+    years and the disassembly years are still the same'''
+    for trial in range(100):
+        rnd = random.Random(trial)
+        build_products(rnd, rnd.randint(1, 40), shuffle=shuffle, cycles=cycles)
+        bfs = propagate("bfs")
+        topological = propagate("topological")
+        for product_id, (years, disassembly_years, _) in bfs.items():
+            assert sorted(topological[product_id][0]) == sorted(years)
+            assert topological[product_id][1] == disassembly_years
+
+
+def test_unknown_engine(model):
+    build_products(random.Random(0), 3)
+    with pytest.raises(ValueError):
+        Products.update_years_of_replacements_based_on_detachability(engine="dfs")
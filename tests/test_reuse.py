@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects.objects import Products
+from .synthetic import setup_project
+
+CONSTANTS = (1.09186399, 0.44315069, 7.58473472, -0.07522362)
+OTHER_CONSTANTS = (1.00000049e+00, 3.54228982e-01, 5.72162691e+01, -4.81510058e-07)
+
+
+def test_reuse_matrix_of_the_material_flow(model, workbook):
+    setup_project(workbook, mf_mcs=20)
+    assert Products.get_reuse_matrix(mf_mcs=20, constants=CONSTANTS) is Products.reuse_matrix
+    for i, product in enumerate(Products.instances):
+        assert np.shares_memory(product.reuse_draws, Products.reuse_matrix[i])
+
+
+def test_reuse_matrix_with_other_settings(model, workbook):
+    '''another matrix is drawn from the seed, the draws of the material flow are kept'''
+    setup_project(workbook, mf_mcs=20)
+    material_flow = Products.reuse_matrix.copy()
+    first = Products.get_reuse_matrix(mf_mcs=20, constants=OTHER_CONSTANTS, seed=7)
+    second = Products.get_reuse_matrix(mf_mcs=20, constants=OTHER_CONSTANTS, seed=7)
+    assert first.shape == material_flow.shape
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_array_equal(Products.reuse_matrix, material_flow)
+    for i, product in enumerate(Products.instances):
+        np.testing.assert_array_equal(product.reuse_draws, material_flow[i])
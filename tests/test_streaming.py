@@ -0,0 +1,78 @@
+'''
+The streaming aggregation of initialize(aggregation="stream") compared with the in memory run on the synthetic project.
+'''
+
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+from brwy4build.Objects.objects import Products, Assemblies, Building
+from brwy4build.Objects.impacts import ATTRIBUTES, TOTALS, RESULT_SCALAR_MODULES, RESULT_ARRAY_MODULES
+from brwy4build.Objects.model import Model
+from brwy4build.Analysis.analyze import Analysis
+from brwy4build.utils.helper import child_seed
+from .synthetic import setup_project, synthetic_lca
+
+MC_PICK = 10
+MF_MCS = 20
+SEED = 321
+# the results that are summed to the assemblies and the building
+RESULTS = [attribute for attribute, (kind, module) in ATTRIBUTES.items()
+           if module in (RESULT_ARRAY_MODULES if kind.endswith("_array") else RESULT_SCALAR_MODULES)] + list(TOTALS)
+
+
+def results(objects: list, attributes: list = RESULTS) -> dict:
+    return {obj.id: {attribute: np.array(getattr(obj, attribute)) for attribute in attributes} for obj in objects}
+
+
+def assert_same(actual: dict, expected: dict):
+    assert actual.keys() == expected.keys()
+    for key, attributes in expected.items():
+        for attribute, value in attributes.items():
+            np.testing.assert_allclose(actual[key][attribute], value, rtol=1e-10, atol=1e-10, err_msg=f"{attribute} of {key}")
+
+
+@pytest.fixture(scope="module")
+def in_memory(workbook) -> dict:
+    '''the product, assembly and building results of the in memory run'''
+    with Model("in memory").active():
+        setup_project(workbook, mf_mcs=MF_MCS)
+        synthetic_lca()
+        Analysis.product_lca(mc_simulations=MC_PICK, mf_mcs=MF_MCS, seed=SEED)
+        Analysis.generate_scenarios(mfa_mcs=MF_MCS, seed=child_seed(SEED, "scenarios"))
+        Analysis.generate_results(building=Building.instances[0])
+        return {"products": results(Products.instances, list(ATTRIBUTES)), "assemblies": results(Assemblies.instances),
+                "building": results(Building.instances)}
+
+
+def streamed(workbook, chunk_size: int, spill_folder: str = None):
+    setup_project(workbook, mf_mcs=MF_MCS)
+    synthetic_lca()
+    Analysis.streamed_lca(building=Building.instances[0], mc_simulations=MC_PICK, mf_mcs=MF_MCS, seed=SEED,
+                          chunk_size=chunk_size, spill_folder=spill_folder)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_streaming_matches_in_memory(model, workbook, in_memory, chunk_size):
+    streamed(workbook, chunk_size)
+    assert_same(results(Assemblies.instances), in_memory["assemblies"])
+    assert_same(results(Building.instances), in_memory["building"])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7])
+def test_spilled_results_are_aggregated_again(model, workbook, in_memory, tmp_path, chunk_size):
+    '''aggregating the spilled chunks again (generate_results after the streamed run) gives the same results'''
+    streamed(workbook, chunk_size, spill_folder=str(tmp_path))
+    assert_same(results(Products.instances, list(ATTRIBUTES)), in_memory["products"])
+    Analysis.generate_results(building=Building.instances[0])
+    assert_same(results(Products.instances, list(ATTRIBUTES)), in_memory["products"])
+    assert_same(results(Assemblies.instances), in_memory["assemblies"])
+    assert_same(results(Building.instances), in_memory["building"])
+
+
+def test_dropped_results_are_not_aggregated_again(model, workbook, in_memory):
+    streamed(workbook, 7)
+    with pytest.raises(ValueError):
+        Analysis.generate_results(building=Building.instances[0])
+    assert_same(results(Assemblies.instances), in_memory["assemblies"])
+    assert_same(results(Building.instances), in_memory["building"])
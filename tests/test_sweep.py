@@ -0,0 +1,73 @@
+'''
+Sweeps on the synthetic project: the saved attributes of a grid of scenarios do not depend on the number of workers, and
+the activity table of an lca mapped from its store is a view of the store, not a copy.
+'''
+
+import multiprocessing
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip("brightway2")
+import brightway2 as bw
+from brwy4build.Objects.objects import LCAh
+from brwy4build.Objects.model import Model
+from brwy4build.Analysis.kernels import ActivityTable
+from brwy4build.run import main
+from brwy4build.run.sweep import scenario_grid, run_sweep
+from .synthetic import setup_project, synthetic_lca
+from .technosphere import Projects
+
+ATTRIBUTES = ["total_impactMC_without_d_array", "total_impactMC_with_d_rpc_array", "impactsMC_b4_array"]
+
+
+@pytest.fixture(scope="module")
+def lca_folder(workbook, tmp_path_factory) -> str:
+    '''the folder of the synthetic lca saved as a store'''
+    folder = str(tmp_path_factory.mktemp("lca"))
+    with Model("lca").active():
+        setup_project(workbook, mf_mcs=10)
+        synthetic_lca()
+        main.save_lca("synthetic", folder)
+    return f"{folder}/synthetic_lca_save_folder"
+
+
+@pytest.fixture
+def projects(monkeypatch):
+    monkeypatch.setattr(bw, "projects", Projects(), raising=False)
+
+
+def saved_attributes(folder: str) -> dict:
+    return {name: np.load(os.path.join(folder, name)) for name in sorted(os.listdir(folder))}
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the workers only see the stubbed brightway project when they are forked")
+def test_sweep_does_not_depend_on_the_workers(model, projects, workbook, lca_folder, tmp_path):
+    scenarios = scenario_grid(mode=["user input", "lowest_product"],
+                              constants={"base": (1.09186399, 0.44315069, 7.58473472, -0.07522362),
+                                         "other": (1.00000049e+00, 3.54228982e-01, 5.72162691e+01, -4.81510058e-07)})
+    saved = []
+    for workers in (1, 2):
+        output = tmp_path / f"workers {workers}"
+        output.mkdir()
+        done = list(run_sweep(scenarios, lca_folder, workers=workers, seed=5, data_file_path=workbook, mc_pick=5,
+                              material_flow_mcs=10, save_attribute=(ATTRIBUTES, "None", str(output))))
+        assert sorted(done) == sorted(scenarios)
+        saved.append(saved_attributes(str(output)))
+    serial, pooled = saved
+    assert len(serial) == len(scenarios) * len(ATTRIBUTES)
+    assert serial.keys() == pooled.keys()
+    for name, values in serial.items():
+        np.testing.assert_array_equal(pooled[name], values, err_msg=name)
+
+
+def test_activity_table_of_a_mapped_lca_is_a_view(model, projects, lca_folder):
+    main.load_lca_static(save_folder=lca_folder, mmap_mode="r")
+    lcah = LCAh.instances[0]
+    table = ActivityTable.of(lcah)
+    mapped = np.load(os.path.join(lca_folder, "lca_store", "arrays", "LCAh.mclcaLib.npy"), mmap_mode="r")
+    assert table.impactsMC.shape == mapped.shape and not table.impactsMC.flags.owndata
+    assert np.shares_memory(table.impactsMC, lcah.mclcaLib[next(iter(lcah.mclcaLib))][0])
+    for key, i in table.index.items():
+        np.testing.assert_array_equal(table.impactsMC[i], lcah.mclcaLib[key][0])
@@ -0,0 +1,134 @@
+'''
+SheetIndex compared with the pandas filters it replaces, for keys with one row, several rows and no row, and the cache of
+the parsed workbooks in the process and in the .workbook_cache folder.
+'''
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from brwy4build.Objects import workbook as workbook_module
+from brwy4build.Objects.workbook import SheetIndex, InputWorkbook, read_sheet
+from .synthetic import make_workbook
+
+DF = pd.DataFrame({"key": ["a", "b", "b", "c", "d", 3],
+                   "number": [1.5, 2.0, 3.0, np.nan, 4, 5],
+                   "text": ["x", "y", "z", "0.25", "w", "v"],
+                   "flag": [True, False, True, np.nan, False, True]})
+KEYS = ["a", "b", "c", "d", 3, "missing", "3"]
+
+
+def outcome(function):
+    '''the value of function() or the type of what it raised'''
+    try:
+        return function()
+    except Exception as e:
+        return type(e)
+
+
+def assert_same(actual, expected):
+    '''equal values (python or numpy scalars) or the same exception type, nan equals nan'''
+    if isinstance(expected, list):
+        assert isinstance(actual, list) and len(actual) == len(expected)
+        for actual_item, expected_item in zip(actual, expected):
+            assert_same(actual_item, expected_item)
+    elif isinstance(expected, type):
+        assert actual is expected
+    elif isinstance(expected, float) and np.isnan(expected):
+        assert isinstance(actual, float) and np.isnan(actual)
+    else:
+        assert actual == expected and not isinstance(actual, type)
+
+
+@pytest.mark.parametrize("column", ["number", "text", "flag"])
+@pytest.mark.parametrize("key", KEYS)
+def test_accessors_match_the_filters(key, column):
+    index = SheetIndex(DF, "key")
+    found = DF.loc[DF["key"] == key][column]
+    assert_same(outcome(lambda: index.values(key, column)), found.tolist())
+    assert_same(outcome(lambda: index.item(key, column)), outcome(lambda: found.item()))
+    assert_same(outcome(lambda: index.float(key, column)), outcome(lambda: float(found)))
+    assert_same(outcome(lambda: index.first(key, column)), outcome(lambda: found.values[0]))
+
+
+@pytest.mark.parametrize("column", ["number", "text", "flag"])
+@pytest.mark.parametrize("keys", [["a", "c", 3, "a"], ["d"], [], ["a", "b"], ["a", "missing"]])
+def test_batches_match_the_accessors(keys, column):
+    index = SheetIndex(DF, "key")
+    floats = outcome(lambda: [index.float(key, column) for key in keys])
+    assert_same(outcome(lambda: index.floats(keys, column).tolist()), floats)
+    firsts = outcome(lambda: [index.first(key, column) for key in keys])
+    assert_same(outcome(lambda: index.firsts(keys, column).tolist()), firsts)
+    if isinstance(firsts, list):
+        # relations_add_is_connection takes the truth of the values like bool() did
+        assert index.firsts(keys, column).astype(bool).tolist() == [bool(value) for value in firsts]
+
+
+@pytest.fixture
+def parses(monkeypatch) -> dict:
+    '''the paths the workbooks are parsed from and hashed, with an empty cache in this process'''
+    calls = {"parsed": [], "hashed": []}
+    read_excel, file_digest = pd.read_excel, workbook_module.file_digest
+
+    def parse(path, *args, **kwargs):
+        calls["parsed"].append(str(path))
+        return read_excel(path, *args, **kwargs)
+
+    def digest(path):
+        calls["hashed"].append(path)
+        return file_digest(path)
+
+    monkeypatch.setattr(workbook_module.pd, "read_excel", parse)
+    monkeypatch.setattr(workbook_module, "file_digest", digest)
+    monkeypatch.setattr(InputWorkbook, "_cache", {})
+    monkeypatch.setattr(InputWorkbook, "cache_folder", None)
+    return calls
+
+
+def test_second_read_hits_the_cache(workbook, tmp_path, parses):
+    path = str(shutil.copy(workbook, tmp_path / "project.xlsx"))
+    products = read_sheet(path, "Products")
+    assert parses["parsed"] == [path]
+    pd.testing.assert_frame_equal(products, pd.read_excel(workbook, sheet_name="Products"))
+    assert len(os.listdir(tmp_path / ".workbook_cache")) == 1
+    parses["parsed"].clear()
+    parses["hashed"].clear()
+    assert InputWorkbook.of(path) is InputWorkbook.of(path)
+    pd.testing.assert_frame_equal(read_sheet(path, "Products"), products)
+    # the size and modified time are unchanged, so the file is not even hashed
+    assert parses == {"parsed": [], "hashed": []}
+
+
+def test_touched_workbook_hits_the_cache(workbook, tmp_path, parses):
+    path = str(shutil.copy(workbook, tmp_path / "project.xlsx"))
+    first = InputWorkbook.of(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10 ** 9))
+    assert InputWorkbook.of(path) is first
+    assert parses["parsed"] == [path] and parses["hashed"] == [path, path]
+
+
+def test_cache_file_is_read_by_another_process(workbook, tmp_path, parses, monkeypatch):
+    path = str(shutil.copy(workbook, tmp_path / "project.xlsx"))
+    products = read_sheet(path, "Products")
+    # a new process only has the cache file
+    monkeypatch.setattr(InputWorkbook, "_cache", {})
+    cached = read_sheet(path, "Products")
+    assert parses["parsed"] == [path]
+    pd.testing.assert_frame_equal(cached, products)
+    # empty cells of the object columns are np.nan itself, the stages test them with "is np.nan"
+    empty = [value for value in cached["ds"] if isinstance(value, float)]
+    assert empty and all(value is np.nan for value in empty)
+
+
+def test_changed_workbook_is_parsed_again(workbook, tmp_path, parses):
+    path = str(shutil.copy(workbook, tmp_path / "project.xlsx"))
+    before = read_sheet(path, "Products")
+    make_workbook(path, seed=2)
+    parses["parsed"].clear()
+    after = read_sheet(path, "Products")
+    assert parses["parsed"] == [path]
+    assert not before.equals(after)
+    pd.testing.assert_frame_equal(after, pd.read_excel(path, sheet_name="Products"))
+    assert len(os.listdir(tmp_path / ".workbook_cache")) == 2
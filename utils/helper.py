@@ -3,6 +3,7 @@ import numpy as np
 from copy import deepcopy
 import random
 import os
+import zlib
 from collections import OrderedDict
 from scipy.stats import lognorm
 
@@ -21,6 +22,16 @@ def networkx_path_list(data: nx.DiGraph, node: str = "") -> list:
     return path
 
 
+def merge_frozensets(sets) -> frozenset:
+    '''union of frozensets, returns one of the inputs as is when the others do not add anything to it'''
+    merged = frozenset()
+    for other in sets:
+        if other <= merged:
+            continue
+        merged = other if merged <= other else merged | other
+    return merged
+
+
 def yearsRemain(product, year, use_updated: bool = False) -> int:
     '''This function will return the amount of years remaining for a product based on the year of replacement'''
     if use_updated:
@@ -38,11 +49,12 @@ def yearsRemain(product, year, use_updated: bool = False) -> int:
         return var - year + product.technical_life
 
 
-def randomChoiceArray(array: np.array, pick:int = 50):
+def randomChoiceArray(array: np.array, pick:int = 50, rng: np.random.Generator = None):
     '''This function will return a random choice from a given array
-    the default picks 50 change if needed'''
+    the default picks 50 change if needed, without a rng the global numpy random state is used'''
     copied = np.array(array)
-    choice = copied[:, :, np.random.choice(copied.shape[2], pick, replace=False)]
+    choose = np.random.choice if rng is None else rng.choice
+    choice = copied[:, :, choose(copied.shape[2], pick, replace=False)]
     return choice
 
 def sigmoid(x, a=1.09186399, b=0.44315069, c=7.58473472, d=-0.07522362):
@@ -76,3 +88,33 @@ def mc_por_impact(product, num_simulations=100, constants: tuple = (1.09186399,
     return np.array(results)
 
 
+def mc_por_matrix(rpc, n_years: int = 1, num_simulations: int = 100, constants: tuple = (1.09186399, 0.44315069, 7.58473472, -0.07522362), seed=None):
+    '''batched version of mc_por, draws one (products x n_years x num_simulations) matrix for a vector of rpc values
+    where 1 means reused and 0 not reused (1 - matrix gives what mc_por_impact returns), seed can be an int or a numpy Generator'''
+    rng = np.random.default_rng(seed)
+    sigmoid_prob = 1 - sigmoid(np.asarray(rpc, dtype=float), *constants)
+    draws = rng.random((len(sigmoid_prob), n_years, num_simulations))
+    return (draws < sigmoid_prob[:, None, None]).astype(np.int8)
+
+
+def seed_sequence(seed=None) -> np.random.SeedSequence:
+    '''turns a seed (None, an int, a SeedSequence or a numpy Generator) into the SeedSequence that all the streams of a run are spawned from,
+    None gives a fresh random run like before'''
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(int(seed.integers(2**63)))
+    return np.random.SeedSequence(seed)
+
+
+def child_seed(seed, *keys) -> np.random.SeedSequence:
+    '''returns the child stream of seed named by keys (e.g. a stage name and a product id), the same keys always give the same
+    stream no matter in which order the stages or the products are run'''
+    parent = seed_sequence(seed)
+    spawn_key = tuple(key if isinstance(key, int) else zlib.crc32(str(key).encode()) for key in keys)
+    return np.random.SeedSequence(parent.entropy, spawn_key=parent.spawn_key + spawn_key)
+
+
+def child_rng(seed, *keys) -> np.random.Generator:
+    '''numpy Generator of the child stream of seed named by keys, see child_seed'''
+    return np.random.default_rng(child_seed(seed, *keys))
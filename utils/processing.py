@@ -103,67 +103,129 @@ def save_attributes_to_numpy(obj, attr_names, scenario_name, constant_sen: str =
 
 
 
-def load_all_arrays(path_to_folder):
+def load_all_arrays(path_to_folder, mmap_mode: str = None):
+    '''loads every .npy file of the folder sorted by name, with mmap_mode ("r" or "c") the arrays are memory mapped so
+    arr[:, i, :] only reads the bytes of impact category i'''
     arrays = {}
     for filename in os.listdir(path_to_folder):
         if filename.endswith('.npy'):
             # Remove the .npy extension to get the array name
             array_name = filename[:-4]
-            arrays[array_name] = np.load(os.path.join(path_to_folder, filename))
+            arrays[array_name] = np.load(os.path.join(path_to_folder, filename), mmap_mode=mmap_mode)
     return OrderedDict(sorted(arrays.items()))
 
 
+class StackedArrays:
+    '''arrays of the same shape stacked along a new first axis without copying them. Indexing selects from every array first
+    and only stacks the selection, so with memory mapped arrays stacked[:, :, i, :] only reads impact category i. Basic
+    indexing and a single index array are supported, np.asarray(stacked) gives the whole stacked array'''
 
+    def __init__(self, arrays: list):
+        if not arrays:
+            raise ValueError("need at least one array to stack")
+        if len({np.shape(array) for array in arrays}) != 1:
+            raise ValueError("all input arrays must have the same shape")
+        self.arrays = list(arrays)
+        self.shape = (len(self.arrays),) + np.shape(self.arrays[0])
+        self.ndim = len(self.shape)
+        self.dtype = np.result_type(*self.arrays)
 
-def export_to_excel(path_to_folder):
-    list_of_arrays = load_all_arrays(path_to_folder)
-
-    # Initialize a dictionary to hold the dataframes
-    df_dict = {}
-
-    # Iterate over all arrays in the OrderedDict
-    for array_name, arr in list_of_arrays.items():
-        for i, impact_category in enumerate([method[1].replace(":", "-").replace("/", "-")[:31] for method in LCAh.instances[0].get_list_of_methods]):
-            # Select the data for the i-th impact category
-            arr_1d = arr[:, i, :].flatten()
-
-            # Apply desired operations
-            mean = np.mean(arr_1d)
-            median = np.median(arr_1d)
-            std_dev = np.std(arr_1d)
-            min_val = np.min(arr_1d)
-            decile1 = np.percentile(arr_1d, 10)
-            quartile1 = np.percentile(arr_1d, 25)
-            quartile3 = np.percentile(arr_1d, 75)
-            decile3 = np.percentile(arr_1d, 30)
-            max_val = np.max(arr_1d)
-
-            # Collect the results in a DataFrame
-            if f'{impact_category}' not in df_dict:
-                df_dict[f'{impact_category}'] = {}
-            df_dict[f'{impact_category}'][array_name] = {
-                'mean': mean,
-                'median': median,
-                'std_dev': std_dev,
-                'min': min_val,
-                'decile1': decile1,
-                'quartile1': quartile1,
-                'quartile3': quartile3,
-                'decile3': decile3,
-                'max': max_val,
-            }
+    def __len__(self) -> int:
+        return len(self.arrays)
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        first, rest = key[0], key[1:]
+        if first is Ellipsis:
+            # the ellipsis also covers the stacking axis
+            first, rest = slice(None), key
+        selected = np.arange(len(self.arrays))[first]
+        if np.ndim(selected) == 0:
+            return np.asarray(self.arrays[int(selected)][rest])
+        return np.stack([np.asarray(self.arrays[i][rest]) for i in selected])
+
+    def __array__(self, dtype=None):
+        stacked = np.stack(self.arrays)
+        return stacked if dtype is None else stacked.astype(dtype)
+
+
+# the statistics of the summaries in their column order, decile3 is the 30th percentile
+STATISTICS = ("mean", "median", "std_dev", "min", "decile1", "quartile1", "quartile3", "decile3", "max")
+PERCENTILES = {"decile1": 10, "quartile1": 25, "quartile3": 75, "decile3": 30}
+
+
+def impact_categories() -> list:
+    '''names of the impact categories of the lca that can be used as excel sheet names'''
+    return [method[1].replace(":", "-").replace("/", "-")[:31] for method in LCAh.instances[0].get_list_of_methods]
+
+
+def summarise(arr, n_categories: int = None) -> dict:
+    '''every statistic of STATISTICS for every impact category (axis 1) of arr over all its other axes, as
+    {statistic: (categories,)}. The values of a category are sorted once and the order statistics are read from the sorted
+    rows with the same interpolation as np.percentile and np.median'''
+    arr = np.asarray(arr)
+    n_categories = arr.shape[1] if n_categories is None else n_categories
+    values = np.moveaxis(arr[:, :n_categories], 1, 0).reshape(n_categories, -1)
+    ordered = np.sort(values, axis=1)
+    n = ordered.shape[1]
+    summary = {"mean": values.mean(axis=1), "std_dev": values.std(axis=1), "min": ordered[:, 0], "max": ordered[:, -1]}
+    if n % 2:
+        summary["median"] = ordered[:, n // 2]
+    else:
+        summary["median"] = (ordered[:, n // 2 - 1] + ordered[:, n // 2]) / 2
+    for name, q in PERCENTILES.items():
+        position = q / 100 * (n - 1)
+        low = int(np.floor(position))
+        high = min(low + 1, n - 1)
+        t = position - low
+        below, above = ordered[:, low], ordered[:, high]
+        difference = above - below
+        # np.percentile's linear interpolation, taken from the upper value past the middle
+        summary[name] = below + difference * t if t < 0.5 else above - difference * (1 - t)
+    return summary
+
+
+def summary_table(arrays: dict, categories: list) -> pd.DataFrame:
+    '''tidy table with one row per array and impact category and one column per statistic, shared by the writers'''
+    rows = []
+    for array_name, arr in arrays.items():
+        summary = summarise(arr, len(categories))
+        for i, impact_category in enumerate(categories):
+            rows.append([array_name, impact_category] + [summary[statistic][i] for statistic in STATISTICS])
+    return pd.DataFrame(rows, columns=["array", "impact_category"] + list(STATISTICS))
+
+
+def export_to_excel(path_to_folder, filename: str = 'full_building_sen.xlsx', mmap_mode: str = None):
+    '''one sheet per impact category with the statistics of every array of the folder'''
+    table = summary_table(load_all_arrays(path_to_folder, mmap_mode=mmap_mode), impact_categories())
+    # an impact category whose name is cut to the same sheet name keeps the last one like before
+    table = table.drop_duplicates(["array", "impact_category"], keep="last")
 
     # Convert the dictionaries to dataframes and save to excel
-    with pd.ExcelWriter('full_building_sen.xlsx', engine='xlsxwriter') as writer:
+    with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
         # Write each dataframe to a different worksheet.
-        for impact_category, data in df_dict.items():
-            df = pd.DataFrame(data).T
+        for impact_category, data in table.groupby("impact_category", sort=False):
+            df = data.set_index("array")[list(STATISTICS)].rename_axis(None)
             df.to_excel(writer, sheet_name=impact_category)
 
     print("Excel file with multiple sheets created successfully.")
 
 
-def load_all_sen_arrays(path_to_folder, system_boundary):
+def export_to_csv(path_to_folder, filename: str = 'full_building_sen.csv', mmap_mode: str = None):
+    '''the statistics of every array of the folder as one tidy csv table'''
+    summary_table(load_all_arrays(path_to_folder, mmap_mode=mmap_mode), impact_categories()).to_csv(filename, index=False)
+    print("csv file created successfully.")
+
+
+def export_to_parquet(path_to_folder, filename: str = 'full_building_sen.parquet', mmap_mode: str = None):
+    '''the statistics of every array of the folder as one tidy parquet table (pyarrow, see requirements.txt)'''
+    summary_table(load_all_arrays(path_to_folder, mmap_mode=mmap_mode), impact_categories()).to_parquet(filename, index=False)
+    print("parquet file created successfully.")
+
+
+def load_all_sen_arrays(path_to_folder, system_boundary, mmap_mode: str = None):
+    '''the arrays of a system boundary stacked into one 4D array per building scenario. With mmap_mode ("r" or "c") the
+    files are memory mapped and every scenario is a StackedArrays, then selecting one impact category only reads that one'''
     # A dictionary to store the arrays for a specific system boundary
     scenarios = {'LD': [], 'HD': [], 'RW': [], 'ND': []}
     
@@ -175,13 +237,13 @@ def load_all_sen_arrays(path_to_folder, system_boundary):
             # Only load the array if the system boundary matches the one specified
             if file_system_boundary == system_boundary:
                 # Load the array
-                array = np.load(os.path.join(path_to_folder, filename))
+                array = np.load(os.path.join(path_to_folder, filename), mmap_mode=mmap_mode)
                 # Append the array to the corresponding list in the dictionary
                 scenarios[building_scenario[:-4]].append(array)  # remove .npy from building_scenario
 
     # Convert lists of arrays into single 4D arrays for each scenario
     for scenario, arrays in scenarios.items():
-        scenarios[scenario] = np.stack(arrays)
+        scenarios[scenario] = np.stack(arrays) if mmap_mode is None else StackedArrays(arrays)
 
     return scenarios
 